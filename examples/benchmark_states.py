@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+import argparse
+import random
+import retro
+import time
+
+parser = argparse.ArgumentParser(
+    description='compare savestate throughput of get_state/set_state and StatePool'
+)
+parser.add_argument('game', help='the name of the game to run')
+parser.add_argument(
+    'state',
+    nargs='?',
+    help='the initial state file to load, minus the extension')
+parser.add_argument(
+    '--slots',
+    '-n',
+    type=int,
+    default=1000,
+    help='number of distinct states to keep (default: 1000)')
+parser.add_argument(
+    '--restores',
+    '-r',
+    type=int,
+    default=10000,
+    help='number of random restores to time (default: 10000)')
+args = parser.parse_args()
+
+env = retro.make(args.game, args.state or retro.State.DEFAULT)
+env.reset()
+
+
+def run(save, restore):
+    start = time.time()
+    for key in range(args.slots):
+        env.step(env.action_space.sample())
+        save(key)
+    saved = time.time() - start
+
+    keys = [random.randrange(args.slots) for _ in range(args.restores)]
+    start = time.time()
+    for key in keys:
+        restore(key)
+    restored = time.time() - start
+    return args.slots / saved, args.restores / restored
+
+
+states = {}
+
+
+def save_bytes(key):
+    states[key] = env.em.get_state()
+
+
+def restore_bytes(key):
+    env.em.set_state(states[key])
+
+
+pool = retro.StatePool(env.em, slots=args.slots)
+
+for name, save, restore in (('get_state/set_state', save_bytes, restore_bytes),
+                            ('StatePool', pool.save, pool.restore)):
+    saves, restores = run(save, restore)
+    print('%s: %.1f saves/s, %.1f restores/s' % (name, saves, restores))
+
+env.close()
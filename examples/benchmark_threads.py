@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+import argparse
+import numpy as np
+import queue
+import retro
+import threading
+import time
+
+parser = argparse.ArgumentParser(
+    description='measure env throughput with actor threads feeding a learner')
+parser.add_argument('game', help='the name of the game to run')
+parser.add_argument(
+    'state',
+    nargs='?',
+    help='the initial state file to load, minus the extension')
+parser.add_argument(
+    '--actors',
+    '-a',
+    type=int,
+    nargs='+',
+    default=[1, 2, 4],
+    help='numbers of actor threads to try (default: 1 2 4)')
+parser.add_argument(
+    '--seconds',
+    '-s',
+    type=float,
+    default=10,
+    help='how long to run each configuration (default: 10)')
+parser.add_argument(
+    '--batch',
+    '-b',
+    type=int,
+    default=32,
+    help='observations per learner update (default: 32)')
+args = parser.parse_args()
+
+
+def actor(env, obs_queue, stop):
+    env.reset()
+    while not stop.is_set():
+        ob, _, done, _ = env.step(env.action_space.sample())
+        if done:
+            ob = env.reset()
+        obs_queue.put(ob)
+
+
+def run(n_actors):
+    envs = [
+        retro.make(args.game, args.state or retro.State.DEFAULT)
+        for _ in range(n_actors)
+    ]
+    obs_queue = queue.Queue(maxsize=args.batch * n_actors * 2)
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=actor, args=(env, obs_queue, stop))
+        for env in envs
+    ]
+    for thread in threads:
+        thread.start()
+
+    frames = 0
+    updates = 0
+    start = time.time()
+    while time.time() - start < args.seconds:
+        batch = np.stack([obs_queue.get() for _ in range(args.batch)])
+        # Stand-in for a learner update: normalize the batch and reduce it
+        batch = batch.astype(np.float32) / 255
+        batch.mean(axis=0)
+        frames += len(batch)
+        updates += 1
+    elapsed = time.time() - start
+
+    stop.set()
+    for thread in threads:
+        while thread.is_alive():
+            try:
+                obs_queue.get_nowait()
+            except queue.Empty:
+                pass
+            thread.join(0.01)
+    for env in envs:
+        env.close()
+    return frames / elapsed, updates / elapsed
+
+
+for n_actors in args.actors:
+    fps, ups = run(n_actors)
+    print('%i actor(s): %.1f frames/s, %.1f learner updates/s' % (n_actors, fps,
+                                                                  ups))
@@ -3,7 +3,7 @@ import retro.data
 import sys
 
 from enum import Enum
-from retro._retro import Movie, RetroEmulator, core_path
+from retro._retro import FrameStack, Movie, RetroEmulator, RetroEmulatorBatch, StatePool, core_path
 
 ROOT_DIR = os.path.abspath(os.path.dirname(__file__))
 core_path(os.path.join(os.path.dirname(__file__), 'cores'))
@@ -17,8 +17,10 @@ for path in ('VERSION.txt', '../VERSION'):
         pass
 
 __all__ = [
-    'Movie', 'RetroEmulator', 'Actions', 'State', 'get_core_path',
-    'get_romfile_system', 'get_system_info', 'make'
+    'FrameStack', 'Movie', 'RetroEmulator', 'RetroEmulatorBatch',
+    'StateArchive', 'StatePool', 'VecRetroEnv', 'Actions', 'State',
+    'get_core_path', 'get_romfile_system', 'get_system_info', 'make',
+    'make_vec'
 ]
 
 retro.data.init_core_info(core_path())
@@ -34,6 +36,7 @@ class Actions(Enum):
 class State(Enum):
     DEFAULT = -1
     NONE = 0
+    RANDOM = -2
 
 
 def get_core_path(corename):
@@ -70,3 +73,17 @@ def make(game,
                 'Game not found: %s. Did you make sure to import the ROM?' %
                 game)
     return RetroEnv(game, state, inttype=inttype, **kwargs)
+
+
+def make_vec(game,
+             num_envs,
+             state=State.DEFAULT,
+             inttype=retro.data.Integrations.DEFAULT,
+             **kwargs):
+    return VecRetroEnv([
+        make(game, state, inttype=inttype, **kwargs) for _ in range(num_envs)
+    ])
+
+
+from retro.vec_env import VecRetroEnv
+from retro.state_archive import StateArchive
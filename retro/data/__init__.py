@@ -1,9 +1,15 @@
-from retro._retro import GameDataGlue, RetroEmulator, data_path as _data_path
+from retro._retro import GameDataGlue, InfoLookup, RetroEmulator, data_path as _data_path
+import collections
+import collections.abc
 import glob
+import gzip
 import hashlib
 import json
+import mmap
 import os
 import sys
+import threading
+import time
 
 try:
     import enum
@@ -27,9 +33,9 @@ except ImportError:
 
 
 __all__ = [
-    'GameData', 'Integrations', 'add_integrations', 'add_custom_integration',
-    'path', 'get_file_path', 'get_romfile_path', 'list_games', 'list_states',
-    'merge'
+    'GameData', 'InfoLookup', 'LazyInfo', 'Integrations', 'add_integrations',
+    'add_custom_integration', 'path', 'get_file_path', 'get_romfile_path',
+    'list_games', 'list_states', 'load_state', 'set_state_cache', 'merge'
 ]
 
 if sys.platform.startswith('linux'):
@@ -47,6 +53,21 @@ EMU_CORES = {}
 EMU_INFO = {}
 EMU_EXTENSIONS = {}
 
+_state_cache = collections.OrderedDict()
+_state_cache_bytes = 0
+_state_cache_max_bytes = int(
+    os.environ.get('RETRO_STATE_CACHE_BYTES', 256 * 1024 * 1024))
+_state_cache_dir = os.environ.get('RETRO_STATE_CACHE_DIR')
+_state_cache_lock = threading.Lock()
+
+_dir_index = {}
+_root_games = {}
+_dir_index_lock = threading.Lock()
+# Listings of directories modified more recently than this many seconds ago
+# aren't kept, since filesystems with coarse timestamps could see another
+# change without the mtime moving
+_DIR_INDEX_SETTLE_TIME = 2
+
 
 class DefaultIntegrations:
     @classmethod
@@ -200,6 +221,27 @@ class Variables(object):
         return name in variables
 
 
+class LazyInfo(collections.abc.Mapping):
+    """
+    Read-only mapping of variable names to their values that reads RAM only
+    when a name is looked up. Values always reflect the current frame, not
+    the frame on which the mapping was returned. Iterating over it reads
+    every variable, so that ones set by scripts since it was made are listed.
+    """
+
+    def __init__(self, data):
+        self._data = data
+
+    def __getitem__(self, name):
+        return self._data.lookup_value(name)
+
+    def __iter__(self):
+        return iter(self._data.lookup_all())
+
+    def __len__(self):
+        return len(self._data.lookup_all())
+
+
 class SearchListHandle(object):
     def __init__(self, data):
         self._data = data
@@ -273,6 +315,55 @@ def path(hint=DATA_PATH):
     return _data_path(hint)
 
 
+def _list_dir(directory):
+    """
+    Return the names of the entries in a directory, which are only read again
+    once the directory's mtime changes. Missing directories are empty
+    """
+    try:
+        mtime = os.stat(directory).st_mtime_ns
+    except OSError:
+        return frozenset()
+    with _dir_index_lock:
+        cached = _dir_index.get(directory)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    try:
+        names = frozenset(entry.name for entry in os.scandir(directory))
+    except OSError:
+        names = frozenset()
+    if time.time() - mtime / 1e9 > _DIR_INDEX_SETTLE_TIME:
+        with _dir_index_lock:
+            _dir_index[directory] = (mtime, names)
+    return names
+
+
+def _list_root_games(root):
+    """
+    Return the games in an integration root. The result is cached on the
+    root's mtime, so a warm lookup only checks the root. A rom.sha coming or
+    going inside a game directory doesn't touch the root, so the game
+    directories are checked again once the cached result is older than the
+    settle time
+    """
+    try:
+        mtime = os.stat(root).st_mtime_ns
+    except OSError:
+        return frozenset()
+    now = time.time()
+    with _dir_index_lock:
+        cached = _root_games.get(root)
+    if cached and cached[0] == mtime and \
+            now - cached[1] < _DIR_INDEX_SETTLE_TIME:
+        return cached[2]
+    games = frozenset(game for game in _list_dir(root)
+                      if "rom.sha" in _list_dir(os.path.join(root, game)))
+    if now - mtime / 1e9 > _DIR_INDEX_SETTLE_TIME:
+        with _dir_index_lock:
+            _root_games[root] = (mtime, now, games)
+    return games
+
+
 def get_file_path(game, file, inttype=Integrations.DEFAULT):
     """
     Return the path to a given game's directory
@@ -280,7 +371,8 @@ def get_file_path(game, file, inttype=Integrations.DEFAULT):
     base = path()
     for t in inttype.paths:
         possible_path = os.path.join(base, t, game, file)
-        if os.path.exists(possible_path):
+        directory, name = os.path.split(possible_path)
+        if name in _list_dir(directory):
             return possible_path
 
     return None
@@ -290,39 +382,127 @@ def get_romfile_path(game, inttype=Integrations.DEFAULT):
     """
     Return the path to a given game's romfile
     """
+    base = path()
+    directories = [os.path.join(base, t, game) for t in inttype.paths]
+    listings = [_list_dir(directory) for directory in directories]
     for extension in EMU_EXTENSIONS.keys():
-        possible_path = get_file_path(game, "rom" + extension, inttype)
-        if possible_path:
-            return possible_path
+        for directory, names in zip(directories, listings):
+            if "rom" + extension in names:
+                return os.path.join(directory, "rom" + extension)
 
     raise FileNotFoundError("No romfiles found for game: %s" % game)
 
 
 def list_games(inttype=Integrations.DEFAULT):
-    files = []
+    games = set()
     for curpath in inttype.paths:
-        files.extend(os.listdir(os.path.join(path(), curpath)))
-    possible_games = []
-    for file in files:
-        if get_file_path(file, "rom.sha", inttype):
-            possible_games.append(file)
-    return sorted(set(possible_games))
+        games.update(_list_root_games(os.path.join(path(), curpath)))
+    return sorted(games)
 
 
 def list_states(game, inttype=Integrations.DEFAULT):
-    paths = []
-    for curpath in inttype.paths:
-        paths.append(os.path.join(path(), curpath, game))
     states = []
-    for curpath in paths:
-        local_states = glob.glob(os.path.join(curpath, "*.state"))
-        states.extend(
-            os.path.split(local_state)[-1][:-len(".state")]
-            for local_state in local_states
-            if not os.path.split(local_state)[-1].startswith("_"))
+    for curpath in inttype.paths:
+        names = _list_dir(os.path.join(path(), curpath, game))
+        states.extend(name[:-len(".state")] for name in names
+                      if name.endswith(".state") and not name.startswith("_"))
     return sorted(set(states))
 
 
+def set_state_cache(max_bytes=None, directory=None):
+    """
+    Configure the process-wide cache of decompressed states used by
+    load_state. max_bytes caps the in-memory cache (0 disables it) and
+    directory, if set, keeps uncompressed copies on disk that other
+    processes can map instead of decompressing the state again.
+    """
+    global _state_cache_max_bytes, _state_cache_dir
+    with _state_cache_lock:
+        if max_bytes is not None:
+            _state_cache_max_bytes = max_bytes
+            _evict_states()
+        if directory is not None:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            _state_cache_dir = directory or None
+
+
+def _evict_states():
+    global _state_cache_bytes
+    while _state_cache and _state_cache_bytes > _state_cache_max_bytes:
+        _, (_, state) = _state_cache.popitem(last=False)
+        _state_cache_bytes -= len(state)
+
+
+def _read_state(path, mtime):
+    if not _state_cache_dir:
+        with gzip.open(path, 'rb') as f:
+            return f.read()
+
+    key = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()
+    cache_path = os.path.join(_state_cache_dir, '%s-%d.state' % (key, mtime))
+    try:
+        # The copy is mapped so it comes straight out of the page cache that
+        # every process using the directory shares. It's still copied out,
+        # since set_state needs bytes
+        with open(cache_path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                return m[:]
+    except (IOError, ValueError):
+        pass
+
+    with gzip.open(path, 'rb') as f:
+        state = f.read()
+    tmp_path = '%s.%d.tmp' % (cache_path, os.getpid())
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(state)
+        os.replace(tmp_path, cache_path)
+    except IOError:
+        return state
+    # Copies of older versions of the state won't be read again
+    for stale in glob.glob(os.path.join(_state_cache_dir, key + '-*.state')):
+        if stale != cache_path:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+    return state
+
+
+def load_state(game, state, inttype=Integrations.DEFAULT):
+    """
+    Return the decompressed contents of a game's .state file, reusing a
+    cached copy if the file hasn't changed since it was last read
+    """
+    global _state_cache_bytes
+    if not state.endswith('.state'):
+        state += '.state'
+    state_path = get_file_path(game, state, inttype)
+    if not state_path:
+        raise FileNotFoundError('No state %s found for game: %s' % (state,
+                                                                   game))
+    mtime = os.stat(state_path).st_mtime_ns
+    key = (game, state, inttype)
+
+    with _state_cache_lock:
+        cached = _state_cache.get(key)
+        if cached and cached[0] == mtime:
+            _state_cache.move_to_end(key)
+            return cached[1]
+
+    data = _read_state(state_path, mtime)
+
+    with _state_cache_lock:
+        if key in _state_cache:
+            _state_cache_bytes -= len(_state_cache.pop(key)[1])
+        if len(data) <= _state_cache_max_bytes:
+            _state_cache[key] = (mtime, data)
+            _state_cache_bytes += len(data)
+            _evict_states()
+    return data
+
+
 def list_scenarios(game, inttype=Integrations.DEFAULT):
     paths = []
     for curpath in inttype.paths:
@@ -1,6 +1,4 @@
-import gc
 import gym
-import gzip
 import gym.spaces
 import json
 import numpy as np
@@ -28,18 +26,31 @@ class RetroEnv(gym.Env):
         else:
             reward = self.data.current_reward()
         done = self.data.is_done()
-        return reward, done, self.data.lookup_all()
-
-    def record_movie(self, path):
-        self.movie = retro.Movie(path, True, self.players)
+        return reward, done, self.lookup_info()
+
+    def lookup_info(self):
+        if self.info_mode == 'dict':
+            return self.data.lookup_all()
+        elif self.info_mode == 'none':
+            return {}
+        elif self.info_mode == 'lazy':
+            return self._lazy_info
+        return self._info_lookup()
+
+    def record_movie(self, path, keyframe_interval=0):
+        self.movie = retro.Movie(path, True, self.players, keyframe_interval)
         self.movie.configure(self.gamename, self.em)
         if self.initial_state:
             self.movie.set_state(self.initial_state)
+        # The emulator writes its button mask into the movie on every frame
+        # it runs
+        self.em.set_movie(self.movie)
 
     def stop_record(self):
         self.movie_path = None
         self.movie_id = 0
         if self.movie:
+            self.em.set_movie(None)
             self.movie.close()
             self.movie = None
 
@@ -56,7 +67,15 @@ class RetroEnv(gym.Env):
                  use_restricted_actions=retro.Actions.FILTERED,
                  record=False,
                  players=1,
-                 inttype=retro.data.Integrations.STABLE):
+                 inttype=retro.data.Integrations.STABLE,
+                 frameskip=1,
+                 reuse_obs_buffer=False,
+                 obs_mode='rgb',
+                 downscale=1,
+                 crop=None,
+                 frame_stack=1,
+                 max_pool=False,
+                 info_mode='dict'):
         if not hasattr(self, 'spec'):
             self.spec = None
         self.img = None
@@ -64,14 +83,50 @@ class RetroEnv(gym.Env):
         self.gamename = game
         self.statename = state
         self.initial_state = None
+        self.statenames = None
+        self.initial_states = None
         self.players = players
+        if frameskip < 1:
+            raise ValueError('frameskip must be at least 1')
+        self.frameskip = frameskip
+        self.reuse_obs_buffer = reuse_obs_buffer
+        self._screen_buffer = None
+        if obs_mode not in ('rgb', 'gray'):
+            raise ValueError("obs_mode must be 'rgb' or 'gray'")
+        if downscale not in (1, 2, 4):
+            raise ValueError('downscale must be 1, 2 or 4')
+        if downscale != 1 and obs_mode != 'gray':
+            raise ValueError("downscale requires obs_mode='gray'")
+        self.obs_mode = obs_mode
+        self.downscale = downscale
+        self.crop = crop
+        if frame_stack < 1:
+            raise ValueError('frame_stack must be at least 1')
+        self.frame_stack = frame_stack
+        self.max_pool = max_pool
+        self.frames = None
 
         metadata = {}
         rom_path = retro.data.get_romfile_path(game, inttype)
         metadata_path = retro.data.get_file_path(game, 'metadata.json',
                                                  inttype)
 
-        if state == retro.State.NONE:
+        if state == retro.State.RANDOM:
+            state = retro.data.list_states(game, inttype)
+            if not state:
+                raise ValueError('No states found for game: %s' % game)
+        if isinstance(state, (list, tuple)):
+            if not state:
+                raise ValueError('Need at least one state to sample from')
+            # Every candidate is read once up front, so picking one on
+            # reset doesn't touch the disk
+            self.statenames = list(state)
+            self.initial_states = [
+                retro.data.load_state(game, statename, inttype)
+                for statename in self.statenames
+            ]
+            self.statename = None
+        elif state == retro.State.NONE:
             self.statename = None
         elif state == retro.State.DEFAULT:
             self.statename = None
@@ -93,6 +148,8 @@ class RetroEnv(gym.Env):
             self.load_state(self.statename, inttype)
 
         self.data = retro.data.GameData()
+        # Only the bytes behind data.json variables are needed for deltas
+        self.data.sparse_snapshots = True
 
         if info is None:
             info = 'data'
@@ -115,9 +172,6 @@ class RetroEnv(gym.Env):
 
         self.system = retro.get_romfile_system(rom_path)
 
-        # We can't have more than one emulator per process. Before creating an
-        # emulator, ensure that unused ones are garbage-collected
-        gc.collect()
         self.em = retro.RetroEmulator(rom_path)
         self.em.configure_data(self.data)
         self.em.step()
@@ -137,6 +191,19 @@ class RetroEnv(gym.Env):
             raise
 
         img = [self.get_screen(p) for p in range(players)]
+        if frame_stack > 1 or max_pool:
+            # A native ring buffer holds the last frame_stack frames.
+            # Observations are copied out of it unless reuse_obs_buffer is
+            # set, in which case they are read-only views that the next step
+            # or reset overwrites
+            self.frames = retro.FrameStack(
+                [self.em],
+                frame_stack,
+                max_pool=max_pool,
+                crop=self.get_crop(),
+                gray=obs_mode == 'gray',
+                downscale=downscale)
+            img = [self._stacked(self.frames.view()[0])]
 
         if use_restricted_actions == retro.Actions.DISCRETE:
             combos = 1
@@ -158,7 +225,23 @@ class RetroEnv(gym.Env):
         self.observation_space = gym.spaces.Box(
             low=0, high=255, shape=img[0].shape, **kwargs)
 
+        self.info_mode = info_mode
+        if isinstance(info_mode, str):
+            if info_mode not in ('dict', 'lazy', 'none'):
+                raise ValueError(
+                    "info_mode must be 'dict', 'lazy', 'none' or a list of variables"
+                )
+            if info_mode == 'lazy':
+                self._lazy_info = retro.data.LazyInfo(self.data)
+        else:
+            # A fixed list of variables is resolved to addresses once and
+            # returned as a NumPy structured array
+            self.info_mode = list(info_mode)
+            self._info_lookup = retro.data.InfoLookup(self.data,
+                                                      self.info_mode)
+
         self.use_restricted_actions = use_restricted_actions
+        self._build_action_tables()
         self.movie = None
         self.movie_id = 0
         self.movie_path = None
@@ -174,56 +257,112 @@ class RetroEnv(gym.Env):
             self._render = self.render
             self._close = self.close
 
+    def _build_action_tables(self):
+        # Every action space maps to button masks through a lookup table
+        # built once here, so decoding an action is a single gather
+        self._button_shifts = np.arange(self.num_buttons, dtype=np.int64)
+        if self.use_restricted_actions == retro.Actions.DISCRETE:
+            # Each player's part of a discrete action is a mixed-radix
+            # number with one digit per combo
+            self._discrete_actions = 1
+            for combo in self.button_combos:
+                self._discrete_actions *= len(combo)
+            index = np.arange(self._discrete_actions, dtype=np.int64)
+            table = np.zeros(self._discrete_actions, np.int64)
+            for combo in self.button_combos:
+                table |= np.asarray(combo, np.int64)[index % len(combo)]
+                index //= len(combo)
+            self._action_table = table
+        elif self.use_restricted_actions == retro.Actions.MULTI_DISCRETE:
+            width = max((len(combo) for combo in self.button_combos),
+                        default=1)
+            table = np.zeros([len(self.button_combos), width], np.int64)
+            for i, combo in enumerate(self.button_combos):
+                table[i, :len(combo)] = combo
+            self._action_table = table
+        elif self.use_restricted_actions == retro.Actions.FILTERED:
+            self._action_table = self.data.filter_actions(
+                np.arange(1 << self.num_buttons, dtype=np.int64))
+        else:
+            self._action_table = None
+
+    def _action_masks(self, actions):
+        actions = np.asarray(actions)
+        if self.use_restricted_actions == retro.Actions.DISCRETE:
+            actions = actions.astype(np.int64).reshape(-1, 1)
+            digits = actions // self._discrete_actions**np.arange(
+                self.players, dtype=np.int64) % self._discrete_actions
+            return self._action_table[digits]
+        elif self.use_restricted_actions == retro.Actions.MULTI_DISCRETE:
+            combos = len(self.button_combos)
+            actions = actions.astype(np.int64).reshape(-1, self.players,
+                                                       combos)
+            return np.bitwise_or.reduce(
+                self._action_table[np.arange(combos), actions], axis=-1)
+        actions = actions.astype(np.int64).reshape(-1, self.players,
+                                                   self.num_buttons)
+        masks = np.bitwise_or.reduce(actions << self._button_shifts, axis=-1)
+        if self._action_table is not None:
+            masks = self._action_table[masks]
+        return masks
+
     def action_to_array(self, a):
-        actions = []
-        for p in range(self.players):
-            action = 0
-            if self.use_restricted_actions == retro.Actions.DISCRETE:
-                for combo in self.button_combos:
-                    current = a % len(combo)
-                    a //= len(combo)
-                    action |= combo[current]
-            elif self.use_restricted_actions == retro.Actions.MULTI_DISCRETE:
-                ap = a[self.num_buttons * p:self.num_buttons * (p + 1)]
-                for i in range(len(ap)):
-                    buttons = self.button_combos[i]
-                    action |= buttons[ap[i]]
-            else:
-                ap = a[self.num_buttons * p:self.num_buttons * (p + 1)]
-                for i in range(len(ap)):
-                    action |= int(ap[i]) << i
-                if self.use_restricted_actions == retro.Actions.FILTERED:
-                    action = self.data.filter_action(action)
-            ap = np.zeros([self.num_buttons], np.uint8)
-            for i in range(self.num_buttons):
-                ap[i] = (action >> i) & 1
-            actions.append(ap)
-        return actions
+        masks = self._action_masks(a)[0]
+        return list((masks[:, None] >> self._button_shifts & 1).astype(
+            np.uint8))
+
+    def batch_action_to_array(self, actions):
+        """
+        Decode a batch of actions, shaped (N,) for Actions.DISCRETE and
+        (N, k) otherwise, into an (N, players * num_buttons) array of
+        button presses
+        """
+        masks = self._action_masks(actions)
+        buttons = masks[..., None] >> self._button_shifts & 1
+        return buttons.astype(np.uint8).reshape(len(masks), -1)
 
     def step(self, a):
         if self.img is None:
             raise RuntimeError('Please call env.reset() before env.step()')
 
-        for p, ap in enumerate(self.action_to_array(a)):
-            if self.movie:
-                for i in range(self.num_buttons):
-                    self.movie.set_key(i, ap[i], p)
+        actions = self.action_to_array(a)
+        for p, ap in enumerate(actions):
             self.em.set_button_mask(ap, p)
 
-        if self.movie:
-            self.movie.step()
-        self.em.step()
-        self.img = ob = self.get_screen()
-        self.data.update_ram()
+        # Runs up to frameskip frames with the same buttons held, summing the
+        # rewards and stopping early if the episode ends
+        self.em.step_n(self.frameskip, self.data)
+        if self.frames:
+            self.img = ob = self._stacked(self.frames.push()[0])
+        else:
+            self.img = ob = self.get_screen()
         rew, done, info = self.compute_step()
-        return ob, rew, bool(done), dict(info)
+        return ob, rew, bool(done), info
 
     def reset(self):
-        if self.initial_state:
-            self.em.set_state(self.initial_state)
-        for p in range(self.players):
-            self.em.set_button_mask(np.zeros([self.num_buttons], np.uint8), p)
-        self.em.step()
+        ob = self._reset_emulator(
+            screen=not self.frames and not self.reuse_obs_buffer)
+        if self.frames:
+            ob = self._stacked(self.frames.reset()[0])
+        elif ob is None:
+            ob = self.get_screen()
+        self.img = ob
+        return ob
+
+    def _reset_emulator(self, screen=False):
+        # Everything reset does apart from building the observation, which
+        # VecRetroEnv does itself when it stacks frames for all environments
+        if self.statenames:
+            index = self.np_random.randint(len(self.statenames))
+            self.statename = self.statenames[index]
+            self.initial_state = self.initial_states[index]
+        # Restoring the state, releasing the buttons, stepping once and
+        # resetting the game data all happen in one native call
+        ob = self.em.reset_to(
+            self.initial_state or None,
+            self.data,
+            screen=screen,
+            **self._screen_kwargs())
         if self.movie_path is not None:
             rel_statename = os.path.splitext(os.path.basename(
                 self.statename))[0]
@@ -234,9 +373,6 @@ class RetroEnv(gym.Env):
             self.movie_id += 1
         if self.movie:
             self.movie.step()
-        self.img = ob = self.get_screen()
-        self.data.reset()
-        self.data.update_ram()
         return ob
 
     def seed(self, seed=None):
@@ -252,17 +388,26 @@ class RetroEnv(gym.Env):
             if self.viewer:
                 self.viewer.close()
             return
+        if self.obs_mode == 'rgb' and not self.frames:
+            img = self.get_screen() if self.img is None else self.img
+        else:
+            img = self.em.get_screen(crop=self.get_crop())
         if mode == "rgb_array":
-            return self.get_screen() if self.img is None else self.img
+            return img
         elif mode == "human":
             if self.viewer is None:
                 from gym.envs.classic_control.rendering import SimpleImageViewer
                 self.viewer = SimpleImageViewer()
-            self.viewer.imshow(self.img)
+            self.viewer.imshow(img)
             return self.viewer.isopen
 
     def close(self):
+        self.frames = None
         if hasattr(self, 'em'):
+            # Movies are written out in the background, so make sure the one
+            # being recorded is on disk before the environment goes away
+            self.stop_record()
+            retro.Movie.wait_for_writes()
             del self.em
 
     def get_action_meaning(self, act):
@@ -276,28 +421,49 @@ class RetroEnv(gym.Env):
             return actions[0]
         return actions
 
+    def get_crop(self, player=0):
+        if self.crop is not None:
+            return tuple(self.crop)
+        return self.data.crop_info(player)
+
     def get_screen(self, player=0):
-        img = self.em.get_screen()
-        x, y, w, h = self.data.crop_info(player)
-        if not w or x + w > img.shape[1]:
-            w = img.shape[1]
-        else:
-            w += x
-        if not h or y + h > img.shape[0]:
-            h = img.shape[0]
-        else:
-            h += y
-        if x == 0 and y == 0 and w == img.shape[1] and h == img.shape[0]:
-            return img
-        return img[y:h, x:w]
+        # Cropping, grayscale conversion and downscaling all happen natively
+        # in a single pass over the frame
+        kwargs = self._screen_kwargs(player)
+        if not self.reuse_obs_buffer:
+            return self.em.get_screen(**kwargs)
+        # Every observation is the same buffer, which is overwritten in place
+        # on the next step or reset
+        if self._screen_buffer is not None:
+            try:
+                return self.em.get_screen(out=self._screen_buffer, **kwargs)
+            except ValueError:
+                # The core changed resolution
+                pass
+        self._screen_buffer = self.em.get_screen(**kwargs)
+        return self._screen_buffer
+
+    def _stacked(self, frames):
+        if self.frame_stack == 1:
+            # Max pooling on its own keeps the unstacked observation shape
+            frames = frames[0]
+        if self.reuse_obs_buffer:
+            return frames
+        return np.array(frames)
+
+    def _screen_kwargs(self, player=0):
+        return {
+            'crop': self.get_crop(player),
+            'gray': self.obs_mode == 'gray',
+            'downscale': self.downscale,
+        }
 
     def load_state(self, statename, inttype=retro.data.Integrations.DEFAULT):
         if not statename.endswith('.state'):
             statename += '.state'
 
-        with gzip.open(
-                retro.data.get_file_path(self.gamename, statename, inttype),
-                'rb') as fh:
-            self.initial_state = fh.read()
-
+        self.initial_state = retro.data.load_state(self.gamename, statename,
+                                                   inttype)
         self.statename = statename
+        self.statenames = None
+        self.initial_states = None
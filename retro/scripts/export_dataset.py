@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+import argparse
+import json
+import numpy as np
+import os
+import retro
+import sys
+from concurrent.futures import ProcessPoolExecutor as Executor
+from retro.scripts.playback_movie import load_movie
+
+COLUMNS = ['obs', 'actions', 'rewards', 'done', 'info']
+
+
+def export_movie(movie_file,
+                 out_dir,
+                 shard_frames=10000,
+                 gray=False,
+                 downscale=1,
+                 crop=None,
+                 info=True,
+                 name=None):
+    """
+    Replay a movie and write its frames into out_dir as shards of .npy
+    files, one per column, that can be opened with mmap_mode. obs holds the
+    screen each frame's buttons were pressed on, downscaled and grayscaled
+    natively if asked. The shards go in a directory called name, which
+    defaults to the movie's file name and must differ between movies
+    exported to the same out_dir. Returns a list of shard entries for the
+    index
+    """
+    emulator, movie, duration = load_movie(movie_file)
+    try:
+        em = emulator.em
+        lookup = None
+        if info:
+            names = sorted(emulator.data.lookup_all())
+            lookup = retro.data.InfoLookup(emulator.data, names)
+        screen = em.get_screen(crop=crop, gray=gray, downscale=downscale)
+        if name is None:
+            name = os.path.splitext(os.path.basename(movie_file))[0]
+        os.makedirs(os.path.join(out_dir, name), exist_ok=True)
+
+        shards = []
+        start = 0
+        while start < duration:
+            frames = min(shard_frames, duration - start)
+            prefix = os.path.join(name, '%05d' % len(shards))
+            obs_path = os.path.join(out_dir, prefix + '.obs.npy')
+            obs = np.lib.format.open_memmap(
+                obs_path,
+                mode='w+',
+                dtype=np.uint8,
+                shape=(frames, ) + screen.shape)
+            results = em.play_movie(
+                movie,
+                emulator.data,
+                lookup,
+                frames,
+                screens=obs,
+                crop=crop,
+                gray=gray,
+                downscale=downscale)
+            obs.flush()
+            del obs
+            played = len(results['actions'])
+            if played < frames:
+                # Playback stopped early, either because the episode ended
+                # or because the movie ran out of input, so cut the
+                # observations down to the frames that were actually played
+                if played and results['done'][-1]:
+                    reason = 'the episode ended'
+                else:
+                    reason = 'the movie ran out of input'
+                print(
+                    '%s: shard %s stopped after %i of %i frames because %s' %
+                    (movie_file, prefix, played, frames, reason),
+                    file=sys.stderr)
+                truncated = os.path.join(out_dir, prefix + '.obs.tmp.npy')
+                np.save(truncated, np.load(obs_path, mmap_mode='r')[:played])
+                os.replace(truncated, obs_path)
+            for column in COLUMNS[1:]:
+                if column in results:
+                    np.save(
+                        os.path.join(out_dir, prefix + '.%s.npy' % column),
+                        results[column])
+            shards.append({
+                'movie': movie_file,
+                'game': movie.get_game(),
+                'path': prefix,
+                'start': start,
+                'frames': played
+            })
+            if played < frames:
+                break
+            start += played
+        return shards
+    finally:
+        del emulator
+
+
+def load_dataset(out_dir, mmap_mode='r'):
+    """
+    Open every shard listed in an exported dataset's index, yielding a dict
+    of memory-mapped columns for each
+    """
+    with open(os.path.join(out_dir, 'index.json')) as f:
+        index = json.load(f)
+    for shard in index['shards']:
+        columns = dict(shard)
+        for column in COLUMNS:
+            path = os.path.join(out_dir, shard['path'] + '.%s.npy' % column)
+            if os.path.exists(path):
+                columns[column] = np.load(path, mmap_mode=mmap_mode)
+        yield columns
+
+
+def write_index(out_dir, shards):
+    """
+    Write the index of an exported dataset listing the given shards
+    """
+    with open(os.path.join(out_dir, 'index.json'), 'w') as f:
+        json.dump({'columns': COLUMNS, 'shards': shards}, f, indent=2)
+
+
+def _export(movie_file, name, args):
+    crop = tuple(args.crop) if args.crop else None
+    return export_movie(movie_file, args.out, args.shard_frames, args.gray,
+                        args.downscale, crop, not args.no_info, name)
+
+
+def main(argv=sys.argv[1:]):
+    parser = argparse.ArgumentParser(
+        description='Export movies as a dataset of memory-mappable shards')
+    parser.add_argument('movies', type=str, nargs='+')
+    parser.add_argument('--out', '-o', type=str, required=True)
+    parser.add_argument('--jobs', '-j', type=int, default=1)
+    parser.add_argument('--shard-frames', '-n', type=int, default=10000)
+    parser.add_argument('--gray', '-g', action='store_true')
+    parser.add_argument(
+        '--downscale', '-d', type=int, default=1, choices=[1, 2, 4])
+    parser.add_argument(
+        '--crop',
+        type=int,
+        nargs=4,
+        metavar=('X', 'Y', 'WIDTH', 'HEIGHT'))
+    parser.add_argument('--no-info', '-I', action='store_true')
+    args = parser.parse_args(argv)
+    if args.downscale != 1 and not args.gray:
+        parser.error('--downscale requires --gray')
+    if args.shard_frames < 1:
+        parser.error('--shard-frames must be at least 1')
+
+    retro.data.add_integrations(retro.data.Integrations.ALL)
+    os.makedirs(args.out, exist_ok=True)
+
+    # Movies from different directories can share a file name, so each one's
+    # shards are put under its position in the list as well
+    names = [
+        '%05d-%s' % (i, os.path.splitext(os.path.basename(movie))[0])
+        for i, movie in enumerate(args.movies)
+    ]
+    shards = []
+    with Executor(args.jobs or None) as pool:
+        # Shards are listed in the order the movies were given, whichever
+        # finishes first
+        for movie_shards in pool.map(_export, args.movies, names,
+                                     [args] * len(args.movies)):
+            shards.extend(movie_shards)
+    write_index(args.out, shards)
+
+
+if __name__ == '__main__':
+    main()
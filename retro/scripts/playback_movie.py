@@ -9,7 +9,6 @@ import signal
 import socket
 import subprocess
 import sys
-import time
 from concurrent.futures import ProcessPoolExecutor as Executor
 
 
@@ -23,36 +22,53 @@ def playback_movie(emulator,
                    video_delay=0,
                    lossless=None,
                    record_audio=True):
+    if not (viewer or video_file):
+        # Nothing needs the screen, so the whole movie can be played natively
+        results = analyze_movie(emulator, movie, info=bool(info_file))
+        if monitor_csv:
+            _write_monitor(monitor_csv, results, movie.players)
+        _write_results(results, info_file, npy_file)
+        return
+
     ffmpeg_proc = None
     viewer_proc = None
     info_steps = []
-    actions = np.empty(
-        shape=(0, emulator.num_buttons * movie.players), dtype=bool)
+    actions = []
+    video = None
+    audio = None
+    audio_listener = None
     if viewer or video_file:
-        video = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        video.bind(('127.0.0.1', 0))
-        vr = video.getsockname()[1]
+        # Video goes to ffmpeg's stdin and audio down a second pipe it
+        # inherits, so there is nothing to connect to or wait for
         input_vformat = [
             '-r',
             str(emulator.em.get_screen_rate()), '-s',
             '%dx%d' % emulator.observation_space.shape[1::-1], '-pix_fmt',
             'rgb24', '-f', 'rawvideo', '-probesize', '32',
-            '-thread_queue_size', '10000', '-i',
-            'tcp://127.0.0.1:%i?listen' % vr
+            '-thread_queue_size', '10000', '-i', 'pipe:0'
         ]
+        pass_fds = ()
         if record_audio:
-            audio = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            audio.bind(('127.0.0.1', 0))
-            ar = audio.getsockname()[1]
+            if os.name == 'nt':
+                # pass_fds is POSIX-only, so on Windows ffmpeg connects back
+                # for the audio instead once it has opened the video
+                audio_listener = socket.socket(socket.AF_INET,
+                                               socket.SOCK_STREAM)
+                audio_listener.bind(('127.0.0.1', 0))
+                audio_listener.listen(1)
+                audio_url = 'tcp://127.0.0.1:%i' % (
+                    audio_listener.getsockname()[1])
+            else:
+                audio_in, audio = os.pipe()
+                pass_fds = (audio_in, )
+                audio_url = 'pipe:%i' % audio_in
             input_aformat = [
                 '-ar',
                 '%i' % emulator.em.get_audio_rate(), '-ac', '2', '-f', 's16le',
                 '-probesize', '32', '-thread_queue_size', '60', '-i',
-                'tcp://127.0.0.1:%i?listen' % ar
+                audio_url
             ]
         else:
-            audio = None
-            ar = None
             input_aformat = ['-an']
         stdout = None
         output = []
@@ -96,23 +112,12 @@ def playback_movie(emulator,
                 *input_aformat,  # Input params (audio)
                 *output
             ],  # Output params
-            stdout=stdout)
-        video.close()
-        video = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        if audio:
-            audio.close()
-            audio = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        audio_connected = False
-
-        time.sleep(0.3)
-        try:
-            video.connect(('127.0.0.1', vr))
-        except ConnectionRefusedError:
-            video.close()
-            if audio:
-                audio.close()
-            ffmpeg_proc.terminate()
-            raise
+            stdin=subprocess.PIPE,
+            stdout=stdout,
+            pass_fds=pass_fds)
+        video = ffmpeg_proc.stdin.fileno()
+        if pass_fds:
+            os.close(audio_in)
         if viewer:
             viewer_proc = subprocess.Popen([viewer, '-'],
                                            stdin=ffmpeg_proc.stdout)
@@ -132,20 +137,21 @@ def playback_movie(emulator,
 
     def waitprocs():
         if ffmpeg_proc:
-            video.close()
-            if audio:
+            ffmpeg_proc.stdin.close()
+            if audio_listener is not None:
+                audio_listener.close()
+            if isinstance(audio, socket.socket):
                 audio.close()
+            elif audio is not None:
+                os.close(audio)
             if not viewer_proc or viewer_proc.poll() is None:
                 ffmpeg_proc.wait()
 
     while True:
         if movie.step():
-            keys = []
-            for p in range(movie.players):
-                for i in range(emulator.num_buttons):
-                    keys.append(movie.get_key(i, p))
+            keys = _movie_keys(emulator, movie)
             if npy_file:
-                actions = np.vstack((actions, (keys, )))
+                actions.append(keys)
         elif video_delay < 0 and frames < -video_delay:
             keys = [0] * emulator.num_buttons
         else:
@@ -165,15 +171,17 @@ def playback_movie(emulator,
             if viewer_proc and viewer_proc.poll() is not None:
                 break
             if ffmpeg_proc and frames > video_delay:
-                video.sendall(bytes(display))
-                if audio:
+                _write_all(video, display)
+                if audio is None and audio_listener is not None:
+                    # ffmpeg only opens the audio after it has read the
+                    # first video frame
+                    audio, _ = audio_listener.accept()
+                    audio_listener.close()
+                    audio_listener = None
+                if audio is not None:
                     sound = emulator.em.get_audio()
-                    if not audio_connected:
-                        time.sleep(0.2)
-                        audio.connect(('127.0.0.1', ar))
-                        audio_connected = True
                     if len(sound):
-                        audio.sendall(bytes(sound))
+                        _write_all(audio, sound)
         except BrokenPipeError:
             waitprocs()
             raise
@@ -198,29 +206,146 @@ def playback_movie(emulator,
             **dict(zip(reward_fields, score)), 'l': frames,
             't': frames / 60.0
         })
+    results = {
+        'actions':
+        np.array(actions, dtype=bool).reshape(
+            -1, emulator.num_buttons * movie.players)
+    }
+    if info_file:
+        names = info_steps[0].keys() if info_steps else []
+        results['info'] = {
+            name: np.array([step[name] for step in info_steps])
+            for name in names
+        }
+    _write_results(results, info_file, npy_file)
+    waitprocs()
+
+
+def analyze_movie(emulator, movie, info=True, frames=-1):
+    """
+    Play the rest of a movie, or the given number of frames of it, without
+    rendering anything. Returns a dict of per-frame columns: the buttons
+    held, the rewards, the done flags and, if info is set, a dict of every
+    game variable's values
+    """
+    lookup = None
+    if info:
+        names = sorted(emulator.data.lookup_all())
+        lookup = retro.data.InfoLookup(emulator.data, names)
+    results = emulator.em.play_movie(movie, emulator.data, lookup, frames)
+    masks = results['actions'].astype(np.int64)
+    shifts = np.arange(emulator.num_buttons)
+    results['actions'] = (masks[..., None] >> shifts & 1).astype(
+        bool).reshape(len(masks), -1)
+    if info:
+        results['info'] = {name: results['info'][name] for name in names}
+    return results
+
+
+def _write_monitor(monitor_csv, results, players):
+    reward_fields = ['r'] if players == 1 else [
+        'r%d' % i for i in range(players)
+    ]
+    done = results['done']
+    rewards = results['rewards'].astype(np.float64)
+    # An episode ends on the first frame of each run of done frames
+    ends = np.flatnonzero(done & ~np.concatenate(([False], done[:-1]))) + 1
+    if not len(ends) or ends[-1] != len(done):
+        ends = np.append(ends, len(done))
+    start = 0
+    for end in ends:
+        if end == start:
+            continue
+        monitor_csv.writerow({
+            **dict(zip(reward_fields, rewards[start:end].sum(axis=0))), 'l':
+            end - start,
+            't': (end - start) / 60.0
+        })
+        start = end
+
+
+def _write_results(results, info_file=None, npy_file=None):
     if npy_file:
-        kwargs = {'actions': actions}
+        # One array per column, so each can be loaded on its own
+        columns = {
+            name: value
+            for name, value in results.items() if name != 'info'
+        }
         if info_file:
-            kwargs['info'] = info_steps
+            for name, value in results['info'].items():
+                columns['info/' + name] = value
         try:
-            np.savez_compressed(npy_file, **kwargs)
+            np.savez_compressed(npy_file, **columns)
         except IOError:
             pass
     elif info_file:
+        info = results['info']
+        names = list(info)
+        rows = zip(*(info[name].tolist() for name in names))
         try:
             with open(info_file, 'w') as f:
-                json.dump(info_steps, f)
+                json.dump([dict(zip(names, row)) for row in rows], f)
         except IOError:
             pass
-    waitprocs()
+
+
+def _write_all(fd, array):
+    # Write straight out of the array's buffer rather than copying it into a
+    # bytes object first
+    view = memoryview(np.ascontiguousarray(array)).cast('B')
+    if isinstance(fd, socket.socket):
+        fd.sendall(view)
+        return
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def _movie_keys(emulator, movie):
+    keys = []
+    for p in range(movie.players):
+        for i in range(emulator.num_buttons):
+            keys.append(movie.get_key(i, p))
+    return keys
+
+
+def seek_movie(emulator, movie, frame):
+    """
+    Bring the emulator to the state just before the given frame of the movie
+    and position the movie so its next step plays that frame. The emulator is
+    restored from the nearest keyframe at or before the frame and the inputs
+    are replayed from there, unless playing on from the current position is
+    no further
+    """
+    keyframe, state = movie.get_keyframe(frame)
+    if keyframe <= movie.frame <= frame:
+        pass
+    elif movie.seek(keyframe):
+        emulator.em.set_state(state)
+        emulator.data.reset()
+    else:
+        raise ValueError('cannot seek back to frame %d of the movie' % frame)
+    n = emulator.num_buttons
+    while movie.frame < frame:
+        if not movie.step():
+            raise ValueError('frame %d is past the end of the movie' % frame)
+        keys = _movie_keys(emulator, movie)
+        for p in range(movie.players):
+            emulator.em.set_button_mask(
+                np.array(keys[p * n:(p + 1) * n], np.uint8), p)
+        emulator.em.step()
+    emulator.data.update_ram()
 
 
 def load_movie(movie_file):
     movie = retro.Movie(movie_file)
-    duration = -1
-    while movie.step():
-        duration += 1
-    movie = retro.Movie(movie_file)
+    duration = movie.frames
+    if duration is None:
+        # Movies that don't record their length have to be read through once
+        duration = 0
+        while movie.step():
+            duration += 1
+        movie = retro.Movie(movie_file)
+    duration -= 1
     movie.step()
     emulator = retro.make(
         game=movie.get_game(),
@@ -233,7 +358,15 @@ def load_movie(movie_file):
     return emulator, movie, duration
 
 
-def _play(movie, args, monitor_csv):
+class _MonitorRows(list):
+    # Stands in for the csv.DictWriter inside a worker process, so the rows
+    # can be handed back to the parent to write
+    def writerow(self, row):
+        self.append(row)
+
+
+def _play(movie, args, monitor=False):
+    monitor_csv = _MonitorRows() if monitor else None
     video_file = None
     info_file = None
     npy_file = None
@@ -249,37 +382,37 @@ def _play(movie, args, monitor_csv):
         info_file = basename + '.json'
     if args.npy_actions:
         npy_file = basename + '.npz'
-    while True:
-        emulator = None
-        try:
-            emulator, m, duration = load_movie(movie)
-            if args.ending is not None:
-                if args.ending < 0:
-                    delay = duration + args.ending
-                else:
-                    delay = -(duration + args.ending)
+    emulator = None
+    try:
+        emulator, m, duration = load_movie(movie)
+        if args.ending is not None:
+            if args.ending < 0:
+                delay = duration + args.ending
             else:
-                delay = 0
-            playback_movie(emulator, m, monitor_csv, video_file, info_file,
-                           npy_file, args.viewer, delay, args.lossless,
-                           not args.no_audio)
-            break
-        except ConnectionRefusedError:
-            pass
-        except RuntimeError:
-            if not os.path.exists(movie):
-                raise FileNotFoundError(movie)
-            raise
-        finally:
-            del emulator
+                delay = -(duration + args.ending)
+        else:
+            delay = 0
+        if delay > 0 and not (monitor or info_file or npy_file):
+            # Only the ending gets rendered, so skip straight to it
+            seek_movie(emulator, m, delay + 1)
+            delay = 0
+        playback_movie(emulator, m, monitor_csv, video_file, info_file,
+                       npy_file, args.viewer, delay, args.lossless,
+                       not args.no_audio)
+        return monitor_csv
+    except RuntimeError:
+        if not os.path.exists(movie):
+            raise FileNotFoundError(movie)
+        raise
+    finally:
+        del emulator
 
 
 def main(argv=sys.argv[1:]):
     parser = argparse.ArgumentParser()
     parser.add_argument('movies', type=str, nargs='+')
-    group = parser.add_mutually_exclusive_group()
-    group.add_argument('--jobs', '-j', type=int, default=1)
-    group.add_argument('--csv-out', '-c', type=str)
+    parser.add_argument('--jobs', '-j', type=int, default=1)
+    parser.add_argument('--csv-out', '-c', type=str)
     parser.add_argument('--ending', '-e', type=int)
     parser.add_argument('--viewer', '-v', type=str)
     parser.add_argument('--no-audio', '-A', action='store_true')
@@ -309,10 +442,15 @@ def main(argv=sys.argv[1:]):
         monitor_csv.writeheader()
 
     with Executor(args.jobs or None) as pool:
-        list(
-            pool.map(
-                _play,
-                *zip(*[(movie, args, monitor_csv) for movie in args.movies])))
+        # Results come back in the order the movies were given, each as soon
+        # as it and every movie before it have finished
+        results = pool.map(
+            _play, *zip(*[(movie, args, bool(monitor_csv))
+                          for movie in args.movies]))
+        for rows in results:
+            if monitor_csv:
+                monitor_csv.writerows(rows)
+                monitor_file.flush()
     if monitor_file:
         monitor_file.close()
 
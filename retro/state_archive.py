@@ -0,0 +1,193 @@
+import mmap
+import numpy as np
+import os
+import struct
+import zlib
+
+__all__ = ['StateArchive']
+
+MAGIC = b'RSA1'
+HEADER = struct.Struct('<4sI')
+RECORD = struct.Struct('<QII')
+FOOTER = struct.Struct('<QQ4s')
+
+
+class StateArchive(object):
+    """
+    Append-only file of emulator savestates. Every keyframe_interval-th
+    state is stored whole and the ones in between as the XOR against their
+    keyframe, so consecutive states that barely differ compress to almost
+    nothing. Any state can be restored by index from just its keyframe and
+    its own record, and archives are read through mmap. Opening an existing
+    archive with mode='a' keeps its states and keyframe_interval and appends
+    after them.
+    """
+
+    def __init__(self, path, mode='r', keyframe_interval=64, level=6):
+        if mode not in ('r', 'w', 'a'):
+            raise ValueError("mode must be 'r', 'w' or 'a'")
+        if keyframe_interval < 1:
+            raise ValueError('keyframe_interval must be at least 1')
+        self.path = path
+        self.mode = mode
+        self.level = level
+        self._offsets = []
+        self._keyframes = []
+        self._keyframe = None
+        self._cached_keyframe = (None, None)
+        self._mmap = None
+        if mode == 'a' and os.path.exists(path) and os.path.getsize(path):
+            self._file = open(path, 'r+b')
+            self._reopen()
+        elif mode != 'r':
+            self.keyframe_interval = keyframe_interval
+            self._file = open(path, 'wb')
+            self._file.write(HEADER.pack(MAGIC, keyframe_interval))
+        else:
+            self._file = open(path, 'rb')
+            self._open()
+
+    def _open(self):
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.keyframe_interval = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError('%s is not a state archive' % self.path)
+
+        if len(self._mmap) >= HEADER.size + FOOTER.size:
+            index, count, magic = FOOTER.unpack_from(
+                self._mmap,
+                len(self._mmap) - FOOTER.size)
+            if magic == MAGIC:
+                index = np.frombuffer(
+                    self._mmap, np.uint64, count * 2, offset=index)
+                self._offsets = index[:count]
+                self._keyframes = index[count:]
+                return
+
+        # The archive wasn't closed cleanly, so rebuild the index from the
+        # record headers
+        offset = HEADER.size
+        while offset + RECORD.size <= len(self._mmap):
+            keyframe, _, size = RECORD.unpack_from(self._mmap, offset)
+            if offset + RECORD.size + size > len(self._mmap):
+                break
+            self._offsets.append(offset)
+            self._keyframes.append(keyframe)
+            offset += RECORD.size + size
+
+    def _reopen(self):
+        self._open()
+        self._offsets = [int(offset) for offset in self._offsets]
+        self._keyframes = [int(keyframe) for keyframe in self._keyframes]
+        end = HEADER.size
+        if self._offsets:
+            _, _, size = RECORD.unpack_from(self._mmap, self._offsets[-1])
+            end = self._offsets[-1] + RECORD.size + size
+            # Later states are stored against the last keyframe until the
+            # interval runs out, as if the archive had never been closed
+            keyframe = self._keyframes[-1]
+            self._keyframe = (keyframe,
+                              np.frombuffer(self._read(keyframe),
+                                            np.uint8).copy())
+        self._mmap.close()
+        self._mmap = None
+
+        # The footer is written again on close, after the new states
+        self._file.truncate(end)
+        self._file.seek(end)
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('state index out of range')
+        keyframe = int(self._keyframes[index])
+        if keyframe == index:
+            return self._read(index)
+        base = self._read_keyframe(keyframe)
+        delta = np.frombuffer(self._read(index), np.uint8)
+        if len(delta) != len(base):
+            raise ValueError('state %d does not match its keyframe' % index)
+        return np.bitwise_xor(base, delta).tobytes()
+
+    def _read(self, index):
+        if self._mmap is None:
+            raise ValueError('states can only be read from an archive opened '
+                             "with mode='r'")
+        offset = int(self._offsets[index])
+        _, length, size = RECORD.unpack_from(self._mmap, offset)
+        offset += RECORD.size
+        state = zlib.decompress(self._mmap[offset:offset + size])
+        if len(state) != length:
+            raise ValueError('state %d is corrupt' % index)
+        return state
+
+    def _read_keyframe(self, index):
+        if self._cached_keyframe[0] != index:
+            self._cached_keyframe = (index,
+                                     np.frombuffer(self._read(index),
+                                                   np.uint8))
+        return self._cached_keyframe[1]
+
+    def append(self, state):
+        """
+        Add a serialized state to the end of the archive and return its index
+        """
+        if self.mode == 'r':
+            raise ValueError(
+                "states can only be appended with mode='w' or 'a'")
+        index = len(self._offsets)
+        state = np.frombuffer(state, np.uint8)
+        if self._keyframe is None or len(state) != len(self._keyframe[1]) \
+                or index - self._keyframe[0] >= self.keyframe_interval:
+            self._keyframe = (index, state.copy())
+            payload = state.tobytes()
+        else:
+            payload = np.bitwise_xor(state, self._keyframe[1]).tobytes()
+
+        data = zlib.compress(payload, self.level)
+        self._offsets.append(self._file.tell())
+        self._keyframes.append(self._keyframe[0])
+        self._file.write(
+            RECORD.pack(self._keyframe[0], len(payload), len(data)))
+        self._file.write(data)
+        return index
+
+    def save(self, emulator):
+        """
+        Append the emulator's current state and return its index
+        """
+        return self.append(emulator.get_state())
+
+    def restore(self, index, emulator):
+        """
+        Load the state at index into the emulator
+        """
+        return emulator.set_state(self[index])
+
+    def close(self):
+        if self._file is None:
+            return
+        if self.mode != 'r':
+            index = self._file.tell()
+            self._file.write(np.asarray(self._offsets, np.uint64).tobytes())
+            self._file.write(np.asarray(self._keyframes, np.uint64).tobytes())
+            self._file.write(FOOTER.pack(index, len(self._offsets), MAGIC))
+        else:
+            # Views into the map have to go before it can be closed
+            self._offsets = []
+            self._keyframes = []
+            self._cached_keyframe = (None, None)
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+        self._file = None
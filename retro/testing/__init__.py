@@ -101,9 +101,9 @@ def testenv(request):
 
     yield create
 
-    if env_box:
-        env_box[0].close()
-        del env_box[0]
+    for env in env_box:
+        env.close()
+    del env_box[:]
 
     retro.data.get_file_path = get_file_path
     retro.data.get_romfile_path = get_romfile_path
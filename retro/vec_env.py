@@ -0,0 +1,119 @@
+import numpy as np
+import retro
+
+__all__ = ['VecRetroEnv']
+
+
+class VecRetroEnv(object):
+    """
+    Steps several RetroEnvs of the same game in lockstep with a single native
+    call per step. Environments that finish an episode are reset
+    automatically, and the first observation of their next episode is
+    returned in place of the last one.
+    """
+
+    def __init__(self, envs):
+        if not envs:
+            raise ValueError('VecRetroEnv needs at least one environment')
+        self.envs = list(envs)
+        env = self.envs[0]
+        for other in self.envs[1:]:
+            if other.gamename != env.gamename or other.players != env.players \
+                    or other.use_restricted_actions != env.use_restricted_actions \
+                    or other.frameskip != env.frameskip \
+                    or other.obs_mode != env.obs_mode \
+                    or other.downscale != env.downscale \
+                    or other.get_crop() != env.get_crop() \
+                    or other.frame_stack != env.frame_stack \
+                    or other.max_pool != env.max_pool \
+                    or other.info_mode != env.info_mode:
+                raise ValueError(
+                    'All environments must use the same game, players, actions '
+                    'and observation settings')
+        self.num_envs = len(self.envs)
+        self.players = env.players
+        self.num_buttons = env.num_buttons
+        self.use_restricted_actions = env.use_restricted_actions
+        self.frameskip = env.frameskip
+        self.action_space = env.action_space
+        self.observation_space = env.observation_space
+
+        self.reuse_obs_buffer = env.reuse_obs_buffer
+        self.frame_stack = env.frame_stack
+
+        self.frames = None
+        if env.frames:
+            # A single ring buffer shared by all environments takes over from
+            # their own until this is closed, so stacked observations come
+            # back as one strided view
+            self.frames = retro.FrameStack(
+                [e.em for e in self.envs],
+                env.frame_stack,
+                max_pool=env.max_pool,
+                crop=env.get_crop(),
+                gray=env.obs_mode == 'gray',
+                downscale=env.downscale)
+
+        self.batch = retro.RetroEmulatorBatch(
+            [e.em for e in self.envs], [e.data for e in self.envs],
+            players=self.players,
+            filter=self.use_restricted_actions == retro.Actions.FILTERED,
+            frameskip=self.frameskip,
+            crop=env.get_crop(),
+            gray=env.obs_mode == 'gray',
+            downscale=env.downscale,
+            frame_stack=self.frames,
+            info=env.info_mode == 'dict')
+
+    def action_to_array(self, actions):
+        if self.use_restricted_actions in (retro.Actions.DISCRETE,
+                                           retro.Actions.MULTI_DISCRETE):
+            return self.envs[0].batch_action_to_array(actions)
+        return np.asarray(actions, dtype=np.uint8).reshape(self.num_envs, -1)
+
+    def reset(self):
+        if self.frames:
+            # The shared stack is filled from the emulators directly, so the
+            # environments' own stacks are left alone
+            for env in self.envs:
+                env._reset_emulator()
+            return self._stacked(self.frames.reset())
+        return np.stack([env.reset() for env in self.envs])
+
+    def step(self, actions):
+        obs, rew, done, info = self.batch.step(self.action_to_array(actions))
+        if info is None:
+            info = [env.lookup_info() for env in self.envs]
+            if isinstance(self.envs[0].info_mode, list):
+                info = np.stack(info)
+        if self.players == 1:
+            rew = rew[:, 0]
+        for i in np.flatnonzero(done):
+            if isinstance(info[i], retro.data.LazyInfo):
+                # A lazy mapping reads whatever is in RAM when it's used, so
+                # the terminal step's values have to be read before resetting
+                info[i] = dict(info[i])
+            if self.frames:
+                self.envs[i]._reset_emulator()
+                self.frames.reset(i)
+            else:
+                obs[i] = self.envs[i].reset()
+        if self.frames:
+            obs = self._stacked(obs)
+        return obs, rew, done, info
+
+    def _stacked(self, obs):
+        # Stacked observations are views of the ring buffer, which the next
+        # step overwrites, so they're copied unless the environments asked to
+        # reuse their observation buffers
+        if self.frame_stack == 1:
+            obs = obs[:, 0]
+        if self.reuse_obs_buffer:
+            return obs
+        return np.array(obs)
+
+    def close(self):
+        self.batch = None
+        self.frames = None
+        for env in self.envs:
+            env.close()
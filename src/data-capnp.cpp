@@ -24,6 +24,7 @@ bool GameData::loadSearches(const std::string& filename) {
 	}
 
 	m_searches.clear();
+	++m_searchesGeneration;
 	m_searchOldMem.clear();
 
 	try {
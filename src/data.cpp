@@ -9,7 +9,11 @@
 
 #include "json.hpp"
 
+#include <algorithm>
 #include <fstream>
+#include <tuple>
+
+#include <sys/stat.h>
 
 using namespace Retro;
 using namespace std;
@@ -91,6 +95,7 @@ bool GameData::load(istream* file) {
 
 	unordered_map<std::string, Variable> oldVars;
 	oldVars.swap(m_vars);
+	++m_varsGeneration;
 	for (auto var = info->cbegin(); var != info->cend(); ++var) {
 		if (var->find("address") == var->cend() || var->find("type") == var->cend()) {
 			oldVars.swap(m_vars);
@@ -155,10 +160,12 @@ string GameData::dataPath(const string& hint) {
 
 void GameData::reset() {
 	restart();
-	m_lastMem.reset();
-	m_cloneMem.reset();
+	m_snapshots[0].reset();
+	m_snapshots[1].reset();
 	m_vars.clear();
+	++m_varsGeneration;
 	m_searches.clear();
+	++m_searchesGeneration;
 	m_searchOldMem.clear();
 }
 
@@ -167,8 +174,75 @@ void GameData::restart() {
 }
 
 void GameData::updateRam() {
-	m_lastMem = move(m_cloneMem);
-	m_cloneMem.clone(m_mem);
+	m_currentSnapshot ^= 1;
+	AddressSpace& snapshot = m_snapshots[m_currentSnapshot];
+	if (!m_sparseSnapshots) {
+		snapshot.clone(m_mem);
+		return;
+	}
+	uint64_t generation = m_varsGeneration + m_searchesGeneration + m_mem.generation();
+	if (generation != m_snapshotRangesGeneration) {
+		updateSnapshotRanges();
+		m_snapshotRangesGeneration = generation;
+	}
+	snapshot.clone(m_mem, m_snapshotRanges);
+}
+
+void GameData::setSparseSnapshots(bool sparse) {
+	m_sparseSnapshots = sparse;
+	m_snapshotRangesGeneration = UINT64_MAX;
+}
+
+void GameData::updateSnapshotRanges() {
+	// Only the bytes backing variables and search results are kept, merged
+	// into as few ranges as possible without crossing a block boundary or
+	// splitting an overlay word
+	size_t align = m_mem.overlay().width;
+	vector<tuple<size_t, size_t, size_t>> spans;
+	auto addSpan = [&](size_t address, size_t width) {
+		for (const auto& block : m_mem.blocks()) {
+			size_t blockEnd = block.first + block.second.size();
+			if (address < block.first || address >= blockEnd) {
+				continue;
+			}
+			size_t start = block.first + ((address - block.first) & ~(align - 1));
+			size_t end = block.first + ((address - block.first + width + align - 1) & ~(align - 1));
+			spans.emplace_back(start, min(end, blockEnd), blockEnd);
+			break;
+		}
+	};
+	for (const auto& var : m_vars) {
+		addSpan(var.second.address, var.second.type.width);
+	}
+	for (const auto& search : m_searches) {
+		for (const auto& result : search.second.typedResults()) {
+			addSpan(result.address, result.type.width);
+		}
+	}
+	sort(spans.begin(), spans.end());
+
+	m_snapshotRanges.clear();
+	size_t start = 0;
+	size_t end = 0;
+	size_t blockEnd = 0;
+	for (const auto& span : spans) {
+		if (end > start && get<0>(span) <= end && get<2>(span) == blockEnd) {
+			end = max(end, get<1>(span));
+			continue;
+		}
+		if (end > start) {
+			m_snapshotRanges[start] = end - start;
+		}
+		tie(start, end, blockEnd) = span;
+	}
+	if (end > start) {
+		m_snapshotRanges[start] = end - start;
+	}
+}
+
+uint64_t GameData::ramGeneration() const {
+	// Each counter only ever increases, so the sum changes whenever any of them does
+	return m_mem.generation() + m_snapshots[0].generation() + m_snapshots[1].generation();
 }
 
 void GameData::setTypes(const vector<DataType> types) {
@@ -232,12 +306,12 @@ int64_t GameData::lookupDelta(const string& name) const {
 	if (v == m_vars.end()) {
 		return 0;
 	}
-	int64_t newVal = m_cloneMem[v->second];
+	int64_t newVal = currentRam()[v->second];
 
-	if (!m_lastMem.ok()) {
+	if (!lastRam().ok()) {
 		return 0;
 	}
-	int64_t oldVal = m_lastMem[v->second];
+	int64_t oldVal = lastRam()[v->second];
 
 	return newVal - oldVal;
 }
@@ -298,6 +372,10 @@ void GameData::setValue(const std::string& name, const Variant& v) {
 	m_customVars.emplace(name, std::make_unique<Variant>(v));
 }
 
+bool GameData::isCustomVariable(const string& name) const {
+	return !m_customVars.empty() && m_customVars.count(name);
+}
+
 Variable GameData::getVariable(const string& name) const {
 	const auto& v = m_vars.find(name);
 	if (v == m_vars.end()) {
@@ -309,12 +387,14 @@ Variable GameData::getVariable(const string& name) const {
 void GameData::setVariable(const string& name, const Variable& var) {
 	removeVariable(name);
 	m_vars.emplace(name, var);
+	++m_varsGeneration;
 }
 
 void GameData::removeVariable(const string& name) {
 	auto iter = m_vars.find(name);
 	if (iter != m_vars.end()) {
 		m_vars.erase(iter);
+		++m_varsGeneration;
 	}
 }
 
@@ -336,6 +416,7 @@ void GameData::search(const std::string& name, int64_t value) {
 	}
 	Search* search = &m_searches[name];
 	search->search(m_mem, value);
+	++m_searchesGeneration;
 	m_searchOldMem[name].clone(m_mem);
 }
 
@@ -352,6 +433,7 @@ void GameData::deltaSearch(const std::string& name, Operation op, int64_t refere
 	}
 	Search* search = &m_searches[name];
 	search->delta(m_mem, m_searchOldMem[name], op, reference);
+	++m_searchesGeneration;
 	m_searchOldMem[name].clone(m_mem);
 }
 
@@ -370,6 +452,8 @@ vector<string> GameData::listSearches() const {
 Search* GameData::getSearch(const string& name) {
 	auto iter = m_searches.find(name);
 	if (iter != m_searches.end()) {
+		// The caller may change its results
+		++m_searchesGeneration;
 		return &iter->second;
 	}
 	return nullptr;
@@ -379,6 +463,7 @@ void GameData::removeSearch(const string& name) {
 	auto iter = m_searches.find(name);
 	if (iter != m_searches.end()) {
 		m_searches.erase(iter);
+		++m_searchesGeneration;
 	}
 }
 
@@ -563,6 +648,7 @@ bool Scenario::load(istream* file, const std::string& path) {
 		}
 	}
 
+	compile();
 	return true;
 }
 
@@ -781,10 +867,12 @@ void Scenario::reset() {
 	}
 	m_doneVars.clear();
 	m_doneCondition = DoneCondition::ANY;
+	m_compiled = false;
+	m_scriptContexts.clear();
 }
 
 bool Scenario::loadScript(const string& filename, const string& scope) {
-	auto context = ScriptContext::get(scope);
+	auto context = createScriptContext(scope);
 	if (!context) {
 		return false;
 	}
@@ -819,23 +907,90 @@ bool Scenario::loadScript(const string& filename, const string& scope) {
 }
 
 void Scenario::reloadScripts() {
-	ScriptContext::reset();
+	m_scriptContexts.clear();
 
 	for (const auto& script : m_scripts) {
-		auto context = ScriptContext::get(script.second);
+		auto context = createScriptContext(script.second);
 		if (!context) {
 			continue;
 		}
 		context->setData(&m_data);
 		context->setScenario(this);
-		context->load(m_base + "/" + script.first);
+		string path = m_base + "/" + script.first;
+		const string* source = scriptSource(path);
+		if (source) {
+			context->loadString(*source);
+		} else {
+			context->load(path);
+		}
 	}
 }
 
+const string* Scenario::scriptSource(const string& path) {
+	// Scripts are rerun on every reset, so keep their source around and only
+	// read them from disk again when they change
+	struct stat info;
+	if (stat(path.c_str(), &info) < 0) {
+		return nullptr;
+	}
+	auto& cached = m_scriptSources[path];
+	if (cached.second.empty() || cached.first != static_cast<int64_t>(info.st_mtime)) {
+		ifstream file(path, ios::binary);
+		if (!file) {
+			m_scriptSources.erase(path);
+			return nullptr;
+		}
+		cached.first = info.st_mtime;
+		cached.second.assign(istreambuf_iterator<char>(file), istreambuf_iterator<char>());
+		if (cached.second.size() && cached.second[0] == '#') {
+			// Lua skips a leading shebang line in files but not in strings
+			cached.second.erase(0, cached.second.find('\n'));
+		}
+		if (cached.second.empty()) {
+			m_scriptSources.erase(path);
+			return nullptr;
+		}
+	}
+	return &cached.second;
+}
+
 vector<pair<string, string>> Scenario::scripts() const {
 	return m_scripts;
 }
 
+shared_ptr<ScriptContext> Scenario::scriptContext(const string& type) const {
+	if (type.empty() && m_scriptContexts.size() == 1) {
+		return m_scriptContexts.begin()->second;
+	}
+	const auto& found = m_scriptContexts.find(type);
+	if (found == m_scriptContexts.end()) {
+		return nullptr;
+	}
+	return found->second;
+}
+
+vector<string> Scenario::listScriptContexts() const {
+	vector<string> contexts;
+	for (const auto& context : m_scriptContexts) {
+		contexts.emplace_back(context.first);
+	}
+	return contexts;
+}
+
+shared_ptr<ScriptContext> Scenario::createScriptContext(const string& type) {
+	// Each scenario keeps its own interpreters so that loading or reloading
+	// one never clobbers the scripts of another scenario in the process
+	auto context = scriptContext(type);
+	if (context) {
+		return context;
+	}
+	context = ScriptContext::create(type);
+	if (context) {
+		m_scriptContexts[type] = context;
+	}
+	return context;
+}
+
 void Scenario::restart() {
 	m_data.restart();
 	for (unsigned i = 0; i < MAX_PLAYERS; ++i) {
@@ -846,11 +1001,21 @@ void Scenario::restart() {
 	m_frame = 0;
 }
 
-void Scenario::update() {
+void Scenario::update(bool accumulate) {
+	if (!m_compiled || m_compiledVarsGeneration != m_data.variablesGeneration()) {
+		compile();
+	} else if (m_resolvedRamGeneration != m_data.ramGeneration()) {
+		resolve();
+	}
 	m_done = calculateDone();
 	for (unsigned i = 0; i < MAX_PLAYERS; ++i) {
-		m_reward[i] = calculateReward(i);
-		m_totalReward[i] += m_reward[i];
+		float reward = calculateReward(i);
+		if (accumulate) {
+			m_reward[i] += reward;
+		} else {
+			m_reward[i] = reward;
+		}
+		m_totalReward[i] += reward;
 	}
 	++m_frame;
 }
@@ -900,44 +1065,28 @@ void Scenario::getCrop(size_t* x, size_t* y, size_t* width, size_t* height, unsi
 
 float Scenario::calculateReward(unsigned player) const {
 	if (m_rewardFunc[player].first.size()) {
-		return ScriptContext::get(m_rewardFunc[player].second)->callFunction(m_rewardFunc[player].first);
+		return scriptContext(m_rewardFunc[player].second)->callFunction(m_rewardFunc[player].first);
 	}
 
 	float reward = m_rewardTime[player].calculate(1, 1);
-	for (auto var = m_rewardVars[player].cbegin(); var != m_rewardVars[player].cend(); ++var) {
-		reward += var->second.calculate(m_data.lookupValue(var->first), m_data.lookupDelta(var->first));
+	for (const auto& var : m_compiledRewards[player]) {
+		const auto& compiled = m_compiledVars[var.variable];
+		reward += var.spec.calculate(value(compiled), delta(compiled));
 	}
 	return reward;
 }
 
 bool Scenario::calculateDone() const {
 	if (m_doneFunc.first.size()) {
-		return ScriptContext::get(m_doneFunc.second)->callFunction(m_doneFunc.first);
+		return scriptContext(m_doneFunc.second)->callFunction(m_doneFunc.first);
 	}
-	for (auto var = m_doneVars.cbegin(); var != m_doneVars.cend(); ++var) {
-		int done = var->second.test(m_data.lookupValue(var->first), m_data.lookupDelta(var->first));
-		if (done > 0 && m_doneCondition == DoneCondition::ANY) {
-			return true;
-		}
-		if (done <= 0 && m_doneCondition == DoneCondition::ALL) {
-			return false;
-		}
-	}
-	for (auto node = m_doneNodes.cbegin(); node != m_doneNodes.cend(); ++node) {
-		int done = isDone(*node->second);
-		if (done > 0 && m_doneCondition == DoneCondition::ANY) {
-			return true;
-		}
-		if (done <= 0 && m_doneCondition == DoneCondition::ALL) {
-			return false;
-		}
-	}
-	return m_doneCondition == DoneCondition::ALL;
+	return isDone(m_compiledDone);
 }
 
-bool Scenario::isDone(const DoneNode& subnode) const {
-	for (auto var = subnode.vars.cbegin(); var != subnode.vars.cend(); ++var) {
-		int done = var->second.test(m_data.lookupValue(var->first), m_data.lookupDelta(var->first));
+bool Scenario::isDone(const CompiledNode& subnode) const {
+	for (const auto& var : subnode.vars) {
+		const auto& compiled = m_compiledVars[var.variable];
+		int done = var.spec.test(value(compiled), delta(compiled));
 		if (done > 0 && subnode.condition == DoneCondition::ANY) {
 			return true;
 		}
@@ -945,8 +1094,8 @@ bool Scenario::isDone(const DoneNode& subnode) const {
 			return false;
 		}
 	}
-	for (auto node = subnode.nodes.cbegin(); node != subnode.nodes.cend(); ++node) {
-		int done = isDone(*node->second);
+	for (const auto& node : subnode.nodes) {
+		int done = isDone(node);
 		if (done > 0 && subnode.condition == DoneCondition::ANY) {
 			return true;
 		}
@@ -957,6 +1106,94 @@ bool Scenario::isDone(const DoneNode& subnode) const {
 	return subnode.condition == DoneCondition::ALL;
 }
 
+void Scenario::compile() {
+	m_compiledVars.clear();
+	for (unsigned i = 0; i < MAX_PLAYERS; ++i) {
+		m_compiledRewards[i].clear();
+		for (const auto& var : m_rewardVars[i]) {
+			m_compiledRewards[i].emplace_back(CompiledReward{ compileVariable(var.first), var.second });
+		}
+	}
+
+	m_compiledDone = {};
+	m_compiledDone.condition = m_doneCondition;
+	for (const auto& var : m_doneVars) {
+		m_compiledDone.vars.emplace_back(CompiledDone{ compileVariable(var.first), var.second });
+	}
+	for (const auto& node : m_doneNodes) {
+		m_compiledDone.nodes.emplace_back();
+		compileNode(*node.second, &m_compiledDone.nodes.back());
+	}
+
+	m_compiled = true;
+	m_compiledVarsGeneration = m_data.variablesGeneration();
+	resolve();
+}
+
+size_t Scenario::compileVariable(const string& name) {
+	for (size_t i = 0; i < m_compiledVars.size(); ++i) {
+		if (m_compiledVars[i].name == name) {
+			return i;
+		}
+	}
+	try {
+		m_compiledVars.emplace_back(CompiledVariable{ name, true, m_data.getVariable(name), nullptr, { nullptr, nullptr } });
+	} catch (invalid_argument&) {
+		// Not in RAM, e.g. set from a script, so it has to be looked up by name
+		m_compiledVars.emplace_back(CompiledVariable{ name, false, Variable{ "|u1", 0 }, nullptr, { nullptr, nullptr } });
+	}
+	return m_compiledVars.size() - 1;
+}
+
+void Scenario::compileNode(const DoneNode& node, CompiledNode* compiled) {
+	compiled->condition = node.condition;
+	for (const auto& var : node.vars) {
+		compiled->vars.emplace_back(CompiledDone{ compileVariable(var.first), var.second });
+	}
+	for (const auto& subnode : node.nodes) {
+		compiled->nodes.emplace_back();
+		compileNode(*subnode.second, &compiled->nodes.back());
+	}
+}
+
+void Scenario::resolve() {
+	for (auto& var : m_compiledVars) {
+		if (!var.inRam) {
+			continue;
+		}
+		var.value = m_data.addressSpace().resolve(var.variable);
+		var.snapshot[0] = m_data.snapshot(0).resolve(var.variable);
+		var.snapshot[1] = m_data.snapshot(1).resolve(var.variable);
+	}
+	m_resolvedRamGeneration = m_data.ramGeneration();
+}
+
+int64_t Scenario::value(const CompiledVariable& var) const {
+	// A custom variable shadows a RAM variable of the same name, as it does in
+	// GameData::lookupValue
+	if (!var.inRam || m_data.isCustomVariable(var.name)) {
+		return m_data.lookupValue(var.name);
+	}
+	if (var.value) {
+		return var.variable.type.decode(var.value) & var.variable.mask;
+	}
+	return const_cast<const GameData&>(m_data).addressSpace()[var.variable];
+}
+
+int64_t Scenario::delta(const CompiledVariable& var) const {
+	if (!var.inRam) {
+		return 0;
+	}
+	const void* current = var.snapshot[m_data.currentSnapshot()];
+	const void* last = var.snapshot[m_data.currentSnapshot() ^ 1];
+	int64_t newVal = current ? var.variable.type.decode(current) & var.variable.mask : m_data.currentRam()[var.variable];
+	if (!m_data.lastRam().ok()) {
+		return 0;
+	}
+	int64_t oldVal = last ? var.variable.type.decode(last) & var.variable.mask : m_data.lastRam()[var.variable];
+	return newVal - oldVal;
+}
+
 void Scenario::setActions(const vector<vector<vector<string>>>& actions) {
 	::setActions(m_data.buttons(), actions, m_actions);
 }
@@ -1043,6 +1280,7 @@ string Scenario::name(Operation op) {
 
 void Scenario::setRewardVariable(const string& name, const RewardSpec& var, unsigned player) {
 	m_rewardVars[player].emplace(name, var);
+	m_compiled = false;
 }
 
 void Scenario::setRewardFunction(const string& name, const string& scope, unsigned player) {
@@ -1055,14 +1293,17 @@ void Scenario::setRewardTime(const RewardSpec& spec, unsigned player) {
 
 void Scenario::setDoneVariable(const string& name, const DoneSpec& var) {
 	m_doneVars.emplace(name, var);
+	m_compiled = false;
 }
 
 void Scenario::setDoneNode(const string& name, shared_ptr<DoneNode> node) {
 	m_doneNodes.emplace(name, move(node));
+	m_compiled = false;
 }
 
 void Scenario::setDoneCondition(Scenario::DoneCondition condition) {
 	m_doneCondition = condition;
+	m_compiled = false;
 }
 
 void Scenario::setDoneFunction(const string& name, const string& scope) {
@@ -16,6 +16,7 @@
 
 namespace Retro {
 
+class ScriptContext;
 class GameData {
 public:
 	bool load(const std::string& filename);
@@ -31,8 +32,18 @@ public:
 
 	AddressSpace& addressSpace() { return m_mem; }
 	const AddressSpace& addressSpace() const { return m_mem; }
+	const AddressSpace& currentRam() const { return m_snapshots[m_currentSnapshot]; }
+	const AddressSpace& lastRam() const { return m_snapshots[m_currentSnapshot ^ 1]; }
+	const AddressSpace& snapshot(unsigned index) const { return m_snapshots[index]; }
+	unsigned currentSnapshot() const { return m_currentSnapshot; }
 	void updateRam();
 
+	void setSparseSnapshots(bool);
+	bool sparseSnapshots() const { return m_sparseSnapshots; }
+
+	uint64_t variablesGeneration() const { return m_varsGeneration; }
+	uint64_t ramGeneration() const;
+
 	void setTypes(const std::vector<DataType> types);
 	void setButtons(const std::vector<std::string>& names);
 	std::vector<std::string> buttons() const;
@@ -52,6 +63,7 @@ public:
 	void setValue(const std::string& name, const Variant&);
 
 	int64_t lookupDelta(const std::string& name) const;
+	bool isCustomVariable(const std::string& name) const;
 
 	Variable getVariable(const std::string& name) const;
 	void setVariable(const std::string& name, const Variable&);
@@ -74,16 +86,26 @@ public:
 #endif
 
 private:
+	void updateSnapshotRanges();
+
 	AddressSpace m_mem;
-	AddressSpace m_cloneMem;
-	AddressSpace m_lastMem;
+
+	// Double-buffered RAM snapshots for deltas: updateRam flips which one is
+	// current and copies into it in place
+	AddressSpace m_snapshots[2];
+	unsigned m_currentSnapshot = 0;
+	bool m_sparseSnapshots = false;
+	std::map<size_t, size_t> m_snapshotRanges;
+	uint64_t m_snapshotRangesGeneration = UINT64_MAX;
 	std::vector<DataType> m_types;
 
 	std::map<int, std::set<int>> m_actions;
 	std::vector<std::string> m_buttons;
 
 	std::unordered_map<std::string, Variable> m_vars;
+	uint64_t m_varsGeneration = 0;
 	std::unordered_map<std::string, Search> m_searches;
+	uint64_t m_searchesGeneration = 0;
 	std::unordered_map<std::string, AddressSpace> m_searchOldMem;
 	std::unordered_map<std::string, std::unique_ptr<Variant>> m_customVars;
 };
@@ -103,10 +125,13 @@ public:
 	bool loadScript(const std::string& filename, const std::string& scope);
 	void reloadScripts();
 	std::vector<std::pair<std::string, std::string>> scripts() const;
+	bool hasScripts() const { return !m_scripts.empty(); }
+	std::shared_ptr<ScriptContext> scriptContext(const std::string& type) const;
+	std::vector<std::string> listScriptContexts() const;
 
 	const GameData* data() const { return &m_data; }
 
-	void update();
+	void update(bool accumulate = false);
 	void restart();
 
 	float currentReward(unsigned player = 0) const;
@@ -196,7 +221,40 @@ public:
 	DoneCondition doneCondition() const { return m_doneCondition; }
 
 private:
-	bool isDone(const DoneNode&) const;
+	struct CompiledVariable {
+		std::string name;
+		bool inRam;
+		Variable variable;
+		const void* value;
+		const void* snapshot[2];
+	};
+
+	struct CompiledReward {
+		size_t variable;
+		RewardSpec spec;
+	};
+
+	struct CompiledDone {
+		size_t variable;
+		DoneSpec spec;
+	};
+
+	struct CompiledNode {
+		std::vector<CompiledDone> vars;
+		std::vector<CompiledNode> nodes;
+		DoneCondition condition = DoneCondition::ANY;
+	};
+
+	const std::string* scriptSource(const std::string& path);
+
+	void compile();
+	size_t compileVariable(const std::string& name);
+	void compileNode(const DoneNode&, CompiledNode*);
+	void resolve();
+	int64_t value(const CompiledVariable&) const;
+	int64_t delta(const CompiledVariable&) const;
+
+	bool isDone(const CompiledNode&) const;
 
 	float calculateReward(unsigned player) const;
 	bool calculateDone() const;
@@ -204,7 +262,11 @@ private:
 	GameData& m_data;
 	std::string m_base;
 
+	std::shared_ptr<ScriptContext> createScriptContext(const std::string& type);
+
 	std::vector<std::pair<std::string, std::string>> m_scripts;
+	std::unordered_map<std::string, std::shared_ptr<ScriptContext>> m_scriptContexts;
+	std::unordered_map<std::string, std::pair<int64_t, std::string>> m_scriptSources;
 
 	std::unordered_map<std::string, RewardSpec> m_rewardVars[MAX_PLAYERS];
 	RewardSpec m_rewardTime[MAX_PLAYERS];
@@ -217,6 +279,15 @@ private:
 
 	std::map<int, std::set<int>> m_actions;
 
+	// Reward and done specs flattened into resolved accessors, so evaluating
+	// them each frame needs no name lookups
+	bool m_compiled = false;
+	uint64_t m_compiledVarsGeneration = 0;
+	uint64_t m_resolvedRamGeneration = 0;
+	std::vector<CompiledVariable> m_compiledVars;
+	std::vector<CompiledReward> m_compiledRewards[MAX_PLAYERS];
+	CompiledNode m_compiledDone;
+
 	float m_reward[MAX_PLAYERS] = { 0 };
 	float m_totalReward[MAX_PLAYERS] = { 0 };
 	bool m_done = false;
@@ -4,9 +4,14 @@
 #endif
 #include <fstream>
 #include <map>
+#include <mutex>
 #include <sstream>
 #include <unordered_map>
+#include <unordered_set>
 #include <vector>
+#ifndef _WIN32
+#include <unistd.h>
+#endif
 
 #include "coreinfo.h"
 #include "data.h"
@@ -23,7 +28,16 @@ using namespace std;
 
 namespace Retro {
 
-static Emulator* s_loadedEmulator = nullptr;
+// Libretro callbacks carry no context, so every call into a core first marks
+// which emulator is making it. This is per-thread so that separate emulators
+// can run on separate threads at the same time.
+static thread_local Emulator* s_currentEmulator = nullptr;
+
+// Original core libraries that are currently loaded by some emulator. Cores
+// keep their state in globals, so further emulators using the same core get a
+// private copy of the library instead.
+static mutex s_coreMutex;
+static unordered_set<string> s_openCores;
 
 static map<string, const char*> s_envVariables = {
 	{ "genesis_plus_gx_bram", "per game" },
@@ -31,28 +45,64 @@ static map<string, const char*> s_envVariables = {
 	{ "genesis_plus_gx_blargg_ntsc_filter", "disabled" }
 };
 
-static void (*retro_init)(void);
-static void (*retro_deinit)(void);
-static unsigned (*retro_api_version)(void);
-static void (*retro_get_system_info)(struct retro_system_info* info);
-static void (*retro_get_system_av_info)(struct retro_system_av_info* info);
-static void (*retro_reset)(void);
-static void (*retro_run)(void);
-static size_t (*retro_serialize_size)(void);
-static bool (*retro_serialize)(void* data, size_t size);
-static bool (*retro_unserialize)(const void* data, size_t size);
-static bool (*retro_load_game)(const struct retro_game_info* game);
-static void (*retro_unload_game)(void);
-static void* (*retro_get_memory_data)(unsigned id);
-static size_t (*retro_get_memory_size)(unsigned id);
-static void (*retro_cheat_reset)(void);
-static void (*retro_cheat_set)(unsigned index, bool enabled, const char* code);
-static void (*retro_set_environment)(retro_environment_t);
-static void (*retro_set_video_refresh)(retro_video_refresh_t);
-static void (*retro_set_audio_sample)(retro_audio_sample_t);
-static void (*retro_set_audio_sample_batch)(retro_audio_sample_batch_t);
-static void (*retro_set_input_poll)(retro_input_poll_t);
-static void (*retro_set_input_state)(retro_input_state_t);
+struct Emulator::CoreFunctions {
+	void (*retro_init)(void);
+	void (*retro_deinit)(void);
+	unsigned (*retro_api_version)(void);
+	void (*retro_get_system_info)(struct retro_system_info* info);
+	void (*retro_get_system_av_info)(struct retro_system_av_info* info);
+	void (*retro_reset)(void);
+	void (*retro_run)(void);
+	size_t (*retro_serialize_size)(void);
+	bool (*retro_serialize)(void* data, size_t size);
+	bool (*retro_unserialize)(const void* data, size_t size);
+	bool (*retro_load_game)(const struct retro_game_info* game);
+	void (*retro_unload_game)(void);
+	void* (*retro_get_memory_data)(unsigned id);
+	size_t (*retro_get_memory_size)(unsigned id);
+	void (*retro_cheat_reset)(void);
+	void (*retro_cheat_set)(unsigned index, bool enabled, const char* code);
+	void (*retro_set_environment)(retro_environment_t);
+	void (*retro_set_video_refresh)(retro_video_refresh_t);
+	void (*retro_set_audio_sample)(retro_audio_sample_t);
+	void (*retro_set_audio_sample_batch)(retro_audio_sample_batch_t);
+	void (*retro_set_input_poll)(retro_input_poll_t);
+	void (*retro_set_input_state)(retro_input_state_t);
+};
+
+static string copyCore(const string& corePath) {
+#ifdef _WIN32
+	char tmpDir[MAX_PATH];
+	char tmpPath[MAX_PATH];
+	if (!GetTempPath(MAX_PATH, tmpDir) || !GetTempFileName(tmpDir, "retro", 0, tmpPath)) {
+		return {};
+	}
+	if (!CopyFile(corePath.c_str(), tmpPath, false)) {
+		DeleteFile(tmpPath);
+		return {};
+	}
+	return tmpPath;
+#else
+	const char* tmpDir = getenv("TMPDIR");
+	string pattern = string(tmpDir ? tmpDir : "/tmp") + "/retro-core-XXXXXX";
+	vector<char> tmpPath(pattern.begin(), pattern.end());
+	tmpPath.push_back('\0');
+	int fd = mkstemp(tmpPath.data());
+	if (fd < 0) {
+		return {};
+	}
+	close(fd);
+	ifstream in(corePath, ios::binary);
+	ofstream out(tmpPath.data(), ios::binary | ios::trunc);
+	out << in.rdbuf();
+	out.close();
+	if (in.fail() || out.fail()) {
+		unlink(tmpPath.data());
+		return {};
+	}
+	return tmpPath.data();
+#endif
+}
 
 Emulator::Emulator() {
 }
@@ -66,10 +116,6 @@ Emulator::~Emulator() {
 	}
 }
 
-bool Emulator::isLoaded() {
-	return s_loadedEmulator;
-}
-
 bool Emulator::loadRom(const string& romPath) {
 	if (m_romLoaded) {
 		unloadRom();
@@ -119,12 +165,13 @@ bool Emulator::loadRom(const string& romPath) {
 	}
 	in.close();
 
-	auto res = retro_load_game(&gameInfo);
+	s_currentEmulator = this;
+	auto res = m_retro->retro_load_game(&gameInfo);
 	delete[] romData;
 	if (!res) {
 		return false;
 	}
-	retro_get_system_av_info(&m_avInfo);
+	m_retro->retro_get_system_av_info(&m_avInfo);
 	fixScreenSize(romPath);
 
 	m_romLoaded = true;
@@ -133,38 +180,34 @@ bool Emulator::loadRom(const string& romPath) {
 }
 
 void Emulator::run() {
-	assert(s_loadedEmulator == this);
+	assert(m_coreHandle);
+	s_currentEmulator = this;
 	m_audioData.clear();
-	retro_run();
+	m_retro->retro_run();
 }
 
 void Emulator::reset() {
-	assert(s_loadedEmulator == this);
+	assert(m_coreHandle);
+	s_currentEmulator = this;
 
 	memset(m_buttonMask, 0, sizeof(m_buttonMask));
 
 	retro_system_info systemInfo;
-	retro_get_system_info(&systemInfo);
+	m_retro->retro_get_system_info(&systemInfo);
 	if (!strcmp(systemInfo.library_name, "Stella")) {
 		// Stella does not properly clear everything when reseting or loading a savestate
 		string romPath = m_romPath;
 
-#ifdef _WIN32
-		FreeLibrary(m_coreHandle);
-#else
-		dlclose(m_coreHandle);
-#endif
-		m_coreHandle = nullptr;
-		s_loadedEmulator = nullptr;
+		closeCore();
 		m_romLoaded = false;
-		loadRom(m_romPath);
+		loadRom(romPath);
 		if (m_addressSpace) {
 			m_addressSpace->reset();
-			m_addressSpace->addBlock(Retro::ramBase(m_core), retro_get_memory_size(RETRO_MEMORY_SYSTEM_RAM), retro_get_memory_data(RETRO_MEMORY_SYSTEM_RAM));
+			m_addressSpace->addBlock(Retro::ramBase(m_core), m_retro->retro_get_memory_size(RETRO_MEMORY_SYSTEM_RAM), m_retro->retro_get_memory_data(RETRO_MEMORY_SYSTEM_RAM));
 		}
 	}
 
-	retro_reset();
+	m_retro->retro_reset();
 }
 
 void Emulator::unloadCore() {
@@ -174,21 +217,41 @@ void Emulator::unloadCore() {
 	if (m_romLoaded) {
 		unloadRom();
 	}
-	retro_deinit();
+	s_currentEmulator = this;
+	m_retro->retro_deinit();
+	closeCore();
+}
+
+void Emulator::closeCore() {
+	if (m_coreHandle) {
 #ifdef _WIN32
-	FreeLibrary(m_coreHandle);
+		FreeLibrary(m_coreHandle);
 #else
-	dlclose(m_coreHandle);
+		dlclose(m_coreHandle);
 #endif
-	m_coreHandle = nullptr;
-	s_loadedEmulator = nullptr;
+		m_coreHandle = nullptr;
+	}
+	m_retro.reset();
+	if (s_currentEmulator == this) {
+		s_currentEmulator = nullptr;
+	}
+	if (!m_coreCopy.empty()) {
+		remove(m_coreCopy.c_str());
+		m_coreCopy.clear();
+	}
+	if (!m_corePath.empty()) {
+		lock_guard<mutex> lock(s_coreMutex);
+		s_openCores.erase(m_corePath);
+		m_corePath.clear();
+	}
 }
 
 void Emulator::unloadRom() {
 	if (!m_romLoaded) {
 		return;
 	}
-	retro_unload_game();
+	s_currentEmulator = this;
+	m_retro->retro_unload_game();
 	m_romLoaded = false;
 	m_romPath.clear();
 	m_addressSpace = nullptr;
@@ -196,95 +259,124 @@ void Emulator::unloadRom() {
 }
 
 bool Emulator::serialize(void* data, size_t size) {
-	assert(s_loadedEmulator == this);
-	return retro_serialize(data, size);
+	assert(m_coreHandle);
+	s_currentEmulator = this;
+	return m_retro->retro_serialize(data, size);
 }
 
 bool Emulator::unserialize(const void* data, size_t size) {
-	assert(s_loadedEmulator == this);
+	assert(m_coreHandle);
+	s_currentEmulator = this;
 	try {
 		retro_system_info systemInfo;
-		retro_get_system_info(&systemInfo);
+		m_retro->retro_get_system_info(&systemInfo);
 		if (!strcmp(systemInfo.library_name, "Stella")) {
 			reset();
 		}
 
-		return retro_unserialize(data, size);
+		return m_retro->retro_unserialize(data, size);
 	} catch (...) {
 		return false;
 	}
 }
 
 size_t Emulator::serializeSize() {
-	assert(s_loadedEmulator == this);
-	return retro_serialize_size();
+	assert(m_coreHandle);
+	s_currentEmulator = this;
+	return m_retro->retro_serialize_size();
 }
 
 void Emulator::clearCheats() {
-	assert(s_loadedEmulator == this);
-	retro_cheat_reset();
+	assert(m_coreHandle);
+	s_currentEmulator = this;
+	m_retro->retro_cheat_reset();
 }
 
 void Emulator::setCheat(unsigned index, bool enabled, const char* code) {
-	assert(s_loadedEmulator == this);
-	retro_cheat_set(index, enabled, code);
+	assert(m_coreHandle);
+	s_currentEmulator = this;
+	m_retro->retro_cheat_set(index, enabled, code);
 }
 
 bool Emulator::loadCore(const string& corePath) {
-	if (s_loadedEmulator) {
-		return false;
+	string libPath = corePath;
+	bool shared;
+	{
+		lock_guard<mutex> lock(s_coreMutex);
+		shared = s_openCores.count(corePath);
+		if (!shared) {
+			s_openCores.insert(corePath);
+		}
+	}
+	if (shared) {
+		libPath = copyCore(corePath);
+		if (libPath.empty()) {
+			return false;
+		}
+		m_coreCopy = libPath;
+	} else {
+		m_corePath = corePath;
 	}
 
 #ifdef _WIN32
-	m_coreHandle = LoadLibrary(corePath.c_str());
+	m_coreHandle = LoadLibrary(libPath.c_str());
 #else
-	m_coreHandle = dlopen(corePath.c_str(), RTLD_LAZY);
+	m_coreHandle = dlopen(libPath.c_str(), RTLD_LAZY | RTLD_LOCAL);
+	if (!m_coreCopy.empty()) {
+		// The mapping stays valid after the file is gone
+		unlink(m_coreCopy.c_str());
+		m_coreCopy.clear();
+	}
 #endif
 	if (!m_coreHandle) {
+		closeCore();
 		return false;
 	}
 
-	retro_init = reinterpret_cast<void (*)()>(GETSYM(m_coreHandle, "retro_init"));
-	retro_deinit = reinterpret_cast<void (*)()>(GETSYM(m_coreHandle, "retro_deinit"));
-	retro_api_version = reinterpret_cast<unsigned int (*)()>(GETSYM(m_coreHandle, "retro_api_version"));
-	retro_get_system_info = reinterpret_cast<void (*)(struct retro_system_info*)>(GETSYM(m_coreHandle, "retro_get_system_info"));
-	retro_get_system_av_info = reinterpret_cast<void (*)(struct retro_system_av_info*)>(GETSYM(m_coreHandle, "retro_get_system_av_info"));
-	retro_reset = reinterpret_cast<void (*)()>(GETSYM(m_coreHandle, "retro_reset"));
-	retro_run = reinterpret_cast<void (*)()>(GETSYM(m_coreHandle, "retro_run"));
-	retro_serialize_size = reinterpret_cast<size_t (*)()>(GETSYM(m_coreHandle, "retro_serialize_size"));
-	retro_serialize = reinterpret_cast<bool (*)(void*, size_t)>(GETSYM(m_coreHandle, "retro_serialize"));
-	retro_unserialize = reinterpret_cast<bool (*)(const void*, size_t)>(GETSYM(m_coreHandle, "retro_unserialize"));
-	retro_load_game = reinterpret_cast<bool (*)(const struct retro_game_info*)>(GETSYM(m_coreHandle, "retro_load_game"));
-	retro_unload_game = reinterpret_cast<void (*)()>(GETSYM(m_coreHandle, "retro_unload_game"));
-	retro_get_memory_data = reinterpret_cast<void* (*) (unsigned int)>(GETSYM(m_coreHandle, "retro_get_memory_data"));
-	retro_get_memory_size = reinterpret_cast<size_t (*)(unsigned int)>(GETSYM(m_coreHandle, "retro_get_memory_size"));
-	retro_cheat_reset = reinterpret_cast<void (*)()>(GETSYM(m_coreHandle, "retro_cheat_reset"));
-	retro_cheat_set = reinterpret_cast<void (*)(unsigned int, bool, const char*)>(GETSYM(m_coreHandle, "retro_cheat_set"));
-	retro_set_environment = reinterpret_cast<void (*)(retro_environment_t)>(GETSYM(m_coreHandle, "retro_set_environment"));
-	retro_set_video_refresh = reinterpret_cast<void (*)(retro_video_refresh_t)>(GETSYM(m_coreHandle, "retro_set_video_refresh"));
-	retro_set_audio_sample = reinterpret_cast<void (*)(retro_audio_sample_t)>(GETSYM(m_coreHandle, "retro_set_audio_sample"));
-	retro_set_audio_sample_batch = reinterpret_cast<void (*)(retro_audio_sample_batch_t)>(GETSYM(m_coreHandle, "retro_set_audio_sample_batch"));
-	retro_set_input_poll = reinterpret_cast<void (*)(retro_input_poll_t)>(GETSYM(m_coreHandle, "retro_set_input_poll"));
-	retro_set_input_state = reinterpret_cast<void (*)(short (*)(unsigned int, unsigned int, unsigned int, unsigned int))>(GETSYM(m_coreHandle, "retro_set_input_state"));
+	m_retro = make_unique<CoreFunctions>();
+	CoreFunctions* retro = m_retro.get();
+
+	retro->retro_init = reinterpret_cast<void (*)()>(GETSYM(m_coreHandle, "retro_init"));
+	retro->retro_deinit = reinterpret_cast<void (*)()>(GETSYM(m_coreHandle, "retro_deinit"));
+	retro->retro_api_version = reinterpret_cast<unsigned int (*)()>(GETSYM(m_coreHandle, "retro_api_version"));
+	retro->retro_get_system_info = reinterpret_cast<void (*)(struct retro_system_info*)>(GETSYM(m_coreHandle, "retro_get_system_info"));
+	retro->retro_get_system_av_info = reinterpret_cast<void (*)(struct retro_system_av_info*)>(GETSYM(m_coreHandle, "retro_get_system_av_info"));
+	retro->retro_reset = reinterpret_cast<void (*)()>(GETSYM(m_coreHandle, "retro_reset"));
+	retro->retro_run = reinterpret_cast<void (*)()>(GETSYM(m_coreHandle, "retro_run"));
+	retro->retro_serialize_size = reinterpret_cast<size_t (*)()>(GETSYM(m_coreHandle, "retro_serialize_size"));
+	retro->retro_serialize = reinterpret_cast<bool (*)(void*, size_t)>(GETSYM(m_coreHandle, "retro_serialize"));
+	retro->retro_unserialize = reinterpret_cast<bool (*)(const void*, size_t)>(GETSYM(m_coreHandle, "retro_unserialize"));
+	retro->retro_load_game = reinterpret_cast<bool (*)(const struct retro_game_info*)>(GETSYM(m_coreHandle, "retro_load_game"));
+	retro->retro_unload_game = reinterpret_cast<void (*)()>(GETSYM(m_coreHandle, "retro_unload_game"));
+	retro->retro_get_memory_data = reinterpret_cast<void* (*) (unsigned int)>(GETSYM(m_coreHandle, "retro_get_memory_data"));
+	retro->retro_get_memory_size = reinterpret_cast<size_t (*)(unsigned int)>(GETSYM(m_coreHandle, "retro_get_memory_size"));
+	retro->retro_cheat_reset = reinterpret_cast<void (*)()>(GETSYM(m_coreHandle, "retro_cheat_reset"));
+	retro->retro_cheat_set = reinterpret_cast<void (*)(unsigned int, bool, const char*)>(GETSYM(m_coreHandle, "retro_cheat_set"));
+	retro->retro_set_environment = reinterpret_cast<void (*)(retro_environment_t)>(GETSYM(m_coreHandle, "retro_set_environment"));
+	retro->retro_set_video_refresh = reinterpret_cast<void (*)(retro_video_refresh_t)>(GETSYM(m_coreHandle, "retro_set_video_refresh"));
+	retro->retro_set_audio_sample = reinterpret_cast<void (*)(retro_audio_sample_t)>(GETSYM(m_coreHandle, "retro_set_audio_sample"));
+	retro->retro_set_audio_sample_batch = reinterpret_cast<void (*)(retro_audio_sample_batch_t)>(GETSYM(m_coreHandle, "retro_set_audio_sample_batch"));
+	retro->retro_set_input_poll = reinterpret_cast<void (*)(retro_input_poll_t)>(GETSYM(m_coreHandle, "retro_set_input_poll"));
+	retro->retro_set_input_state = reinterpret_cast<void (*)(short (*)(unsigned int, unsigned int, unsigned int, unsigned int))>(GETSYM(m_coreHandle, "retro_set_input_state"));
 
 	// The default according to the docs
 	m_imgDepth = 15;
-	s_loadedEmulator = this;
+	s_currentEmulator = this;
 
-	retro_set_environment(cbEnvironment);
-	retro_set_video_refresh(cbVideoRefresh);
-	retro_set_audio_sample(cbAudioSample);
-	retro_set_audio_sample_batch(cbAudioSampleBatch);
-	retro_set_input_poll(cbInputPoll);
-	retro_set_input_state(cbInputState);
-	retro_init();
+	retro->retro_set_environment(cbEnvironment);
+	retro->retro_set_video_refresh(cbVideoRefresh);
+	retro->retro_set_audio_sample(cbAudioSample);
+	retro->retro_set_audio_sample_batch(cbAudioSampleBatch);
+	retro->retro_set_input_poll(cbInputPoll);
+	retro->retro_set_input_state(cbInputState);
+	retro->retro_init();
 
 	return true;
 }
 
 void Emulator::fixScreenSize(const string& romName) {
 	retro_system_info systemInfo;
-	retro_get_system_info(&systemInfo);
+	m_retro->retro_get_system_info(&systemInfo);
 	if (!strcmp(systemInfo.library_name, "Genesis Plus GX")) {
 		switch (romName.back()) {
 		case 'd': // Mega Drive
@@ -330,21 +422,21 @@ void Emulator::reconfigureAddressSpace() {
 }
 
 bool Emulator::cbEnvironment(unsigned cmd, void* data) {
-	assert(s_loadedEmulator);
+	assert(s_currentEmulator);
 	switch (cmd) {
 	case RETRO_ENVIRONMENT_SET_PIXEL_FORMAT:
 		switch (*reinterpret_cast<retro_pixel_format*>(data)) {
 		case RETRO_PIXEL_FORMAT_XRGB8888:
-			s_loadedEmulator->m_imgDepth = 32;
+			s_currentEmulator->m_imgDepth = 32;
 			break;
 		case RETRO_PIXEL_FORMAT_RGB565:
-			s_loadedEmulator->m_imgDepth = 16;
+			s_currentEmulator->m_imgDepth = 16;
 			break;
 		case RETRO_PIXEL_FORMAT_0RGB1555:
-			s_loadedEmulator->m_imgDepth = 15;
+			s_currentEmulator->m_imgDepth = 15;
 			break;
 		default:
-			s_loadedEmulator->m_imgDepth = 0;
+			s_currentEmulator->m_imgDepth = 0;
 			break;
 		}
 		return true;
@@ -363,11 +455,11 @@ bool Emulator::cbEnvironment(unsigned cmd, void* data) {
 		*reinterpret_cast<bool*>(data) = true;
 		return true;
 	case RETRO_ENVIRONMENT_SET_MEMORY_MAPS:
-		s_loadedEmulator->m_map.clear();
+		s_currentEmulator->m_map.clear();
 		for (size_t i = 0; i < static_cast<const retro_memory_map*>(data)->num_descriptors; ++i) {
-			s_loadedEmulator->m_map.emplace_back(static_cast<const retro_memory_map*>(data)->descriptors[i]);
+			s_currentEmulator->m_map.emplace_back(static_cast<const retro_memory_map*>(data)->descriptors[i]);
 		}
-		s_loadedEmulator->reconfigureAddressSpace();
+		s_currentEmulator->reconfigureAddressSpace();
 		return true;
 	default:
 		return false;
@@ -376,34 +468,34 @@ bool Emulator::cbEnvironment(unsigned cmd, void* data) {
 }
 
 void Emulator::cbVideoRefresh(const void* data, unsigned, unsigned, size_t pitch) {
-	assert(s_loadedEmulator);
+	assert(s_currentEmulator);
 	if (data) {
-		s_loadedEmulator->m_imgData = data;
+		s_currentEmulator->m_imgData = data;
 	}
 	if (pitch) {
-		s_loadedEmulator->m_imgPitch = pitch;
+		s_currentEmulator->m_imgPitch = pitch;
 	}
 }
 
 void Emulator::cbAudioSample(int16_t left, int16_t right) {
-	assert(s_loadedEmulator);
-	s_loadedEmulator->m_audioData.push_back(left);
-	s_loadedEmulator->m_audioData.push_back(right);
+	assert(s_currentEmulator);
+	s_currentEmulator->m_audioData.push_back(left);
+	s_currentEmulator->m_audioData.push_back(right);
 }
 
 size_t Emulator::cbAudioSampleBatch(const int16_t* data, size_t frames) {
-	assert(s_loadedEmulator);
-	s_loadedEmulator->m_audioData.insert(s_loadedEmulator->m_audioData.end(), data, &data[frames * 2]);
+	assert(s_currentEmulator);
+	s_currentEmulator->m_audioData.insert(s_currentEmulator->m_audioData.end(), data, &data[frames * 2]);
 	return frames;
 }
 
 void Emulator::cbInputPoll() {
-	assert(s_loadedEmulator);
+	assert(s_currentEmulator);
 }
 
 int16_t Emulator::cbInputState(unsigned port, unsigned, unsigned, unsigned id) {
-	assert(s_loadedEmulator);
-	return s_loadedEmulator->m_buttonMask[port][id];
+	assert(s_currentEmulator);
+	return s_currentEmulator->m_buttonMask[port][id];
 }
 
 void Emulator::configureData(GameData* data) {
@@ -411,8 +503,9 @@ void Emulator::configureData(GameData* data) {
 	m_addressSpace->reset();
 	Retro::configureData(data, m_core);
 	reconfigureAddressSpace();
-	if (m_addressSpace->blocks().empty() && retro_get_memory_size(RETRO_MEMORY_SYSTEM_RAM)) {
-		m_addressSpace->addBlock(Retro::ramBase(m_core), retro_get_memory_size(RETRO_MEMORY_SYSTEM_RAM), retro_get_memory_data(RETRO_MEMORY_SYSTEM_RAM));
+	s_currentEmulator = this;
+	if (m_addressSpace->blocks().empty() && m_retro->retro_get_memory_size(RETRO_MEMORY_SYSTEM_RAM)) {
+		m_addressSpace->addBlock(Retro::ramBase(m_core), m_retro->retro_get_memory_size(RETRO_MEMORY_SYSTEM_RAM), m_retro->retro_get_memory_data(RETRO_MEMORY_SYSTEM_RAM));
 	}
 }
 
@@ -3,6 +3,7 @@
 #include "libretro.h"
 #include "memory.h"
 
+#include <memory>
 #include <string>
 #include <vector>
 #include <cstring>
@@ -23,8 +24,6 @@ public:
 	~Emulator();
 	Emulator(const Emulator&) = delete;
 
-	static bool isLoaded();
-
 	bool loadRom(const std::string& romPath);
 
 	void run();
@@ -58,7 +57,10 @@ public:
 	std::vector<std::string> keybinds() const;
 
 private:
+	struct CoreFunctions;
+
 	bool loadCore(const std::string& corePath);
+	void closeCore();
 	void fixScreenSize(const std::string& romName);
 	void reconfigureAddressSpace();
 
@@ -88,6 +90,9 @@ private:
 #else
 	void* m_coreHandle = nullptr;
 #endif
+	std::unique_ptr<CoreFunctions> m_retro;
+	std::string m_corePath;
+	std::string m_coreCopy;
 	bool m_romLoaded = false;
 	std::string m_core;
 	std::string m_romPath;
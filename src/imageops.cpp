@@ -15,11 +15,13 @@ static void imageHalve565ToGrayInterlace(const uint16_t* in, const uint16_t* old
 static void imageQuarter565ToGray(const uint16_t* in, uint8_t* out, size_t w, size_t h, size_t stride);
 static void imageQuarter565ToGrayInterlace(const uint16_t* in, const uint16_t* oldin, uint16_t* out, size_t w, size_t h, size_t stride);
 static void image565To888(const uint16_t* in, uint8_t* out, size_t w, size_t h, size_t stride);
+static void image565ToGray(const uint16_t* in, uint8_t* out, size_t w, size_t h, size_t stride);
 static void imageHalveX888ToGray(const uint32_t* in, uint8_t* out, size_t w, size_t h, size_t stride);
 static void imageHalveX888ToGrayInterlace(const uint32_t* in, const uint16_t* oldin, uint16_t* out, size_t w, size_t h, size_t stride);
 static void imageQuarterX888ToGray(const uint32_t* in, uint8_t* out, size_t w, size_t h, size_t stride);
 static void imageQuarterX888ToGrayInterlace(const uint32_t* in, const uint16_t* oldin, uint16_t* out, size_t w, size_t h, size_t stride);
 static void imageX888To888(const uint32_t* in, uint8_t* out, size_t w, size_t h, size_t stride);
+static void imageX888ToGray(const uint32_t* in, uint8_t* out, size_t w, size_t h, size_t stride);
 
 #ifdef __SSSE3__
 const static __m128i maskR16 = _mm_set1_epi16(0xF800);
@@ -28,6 +30,7 @@ const static __m128i maskB16 = _mm_set1_epi16(0x001F);
 const static __m128i maskR32 = _mm_set_epi8(0x80, 0x80, 0x80, 0x0E, 0x80, 0x80, 0x80, 0x0A, 0x80, 0x80, 0x80, 0x06, 0x80, 0x80, 0x80, 0x02);
 const static __m128i maskG32 = _mm_set_epi8(0x80, 0x80, 0x80, 0x0D, 0x80, 0x80, 0x80, 0x09, 0x80, 0x80, 0x80, 0x05, 0x80, 0x80, 0x80, 0x01);
 const static __m128i maskB32 = _mm_set_epi8(0x80, 0x80, 0x80, 0x0C, 0x80, 0x80, 0x80, 0x08, 0x80, 0x80, 0x80, 0x04, 0x80, 0x80, 0x80, 0x00);
+const static __m128i third16 = _mm_set1_epi16(0x5556);
 
 static inline __m128i _convert565ToGray(__m128i pix) {
 	/* Mask out channels */
@@ -67,25 +70,22 @@ static inline __m128i _convertX888ToGray(__m128i pix) {
 	/* Combine channels */
 	r = _mm_add_epi32(r, g);
 	r = _mm_add_epi32(r, b);
-	r = _mm_srli_epi16(r, 2);
+	/* Divide by 3 so that white maps to 255 */
+	r = _mm_mulhi_epu16(r, third16);
 	return r;
 }
 #endif
 
+static inline unsigned _convertX888ToGray(uint32_t pix) {
+	unsigned r = (pix >> 16) & 0xFF;
+	unsigned g = (pix >> 8) & 0xFF;
+	unsigned b = pix & 0xFF;
+	return (r + g + b) / 3;
+}
+
 static inline uint8_t _convertX888ToGray(uint32_t a, uint32_t b) {
-	uint32_t r0 = a & 0x00FF0000;
-	uint32_t g0 = a & 0x0000FF00;
-	uint32_t b0 = a & 0x000000FF;
-	uint32_t r1 = b & 0x00FF0000;
-	uint32_t g1 = b & 0x0000FF00;
-	uint32_t b1 = b & 0x000000FF;
-	r0 += r1;
-	g0 += g1;
-	b0 += b1;
-	r0 >>= 16;
-	g0 >>= 8;
-	r0 = r0 + g0 + b0;
-	return r0 / 8;
+	/* Rounds the same way as _mm_avg_epu16 */
+	return (_convertX888ToGray(a) + _convertX888ToGray(b) + 1) / 2;
 }
 
 #ifdef __SSSE3__
@@ -330,8 +330,8 @@ static inline void _convert565To888(const __m128i* in, __m128i* out) {
 	/* 00 B8 00 B9 00 BA 00 BB 00 BC 00 BD 00 BE 00 BF -> BA 00 00 BB 00 00 BC 00 00 BD 00 00 BE 00 00 BF */
 	const static __m128i bblend21 = _mm_set_epi8(0x0E, 0x80, 0x80, 0x0C, 0x80, 0x80, 0x0A, 0x80, 0x80, 0x08, 0x80, 0x80, 0x06, 0x80, 0x80, 0x04);
 
-	__m128i pix0 = _mm_load_si128(&in[0]);
-	__m128i pix1 = _mm_load_si128(&in[1]);
+	__m128i pix0 = _mm_loadu_si128(&in[0]);
+	__m128i pix1 = _mm_loadu_si128(&in[1]);
 
 	// Mask out channels
 	__m128i r0 = _mm_and_si128(pix0, maskR16);
@@ -365,9 +365,9 @@ static inline void _convert565To888(const __m128i* in, __m128i* out) {
 	out2 = _mm_or_si128(out2, _mm_shuffle_epi8(g1, gblend21));
 	out2 = _mm_or_si128(out2, _mm_shuffle_epi8(b1, bblend21));
 
-	_mm_store_si128(&out[0], out0);
-	_mm_store_si128(&out[1], out1);
-	_mm_store_si128(&out[2], out2);
+	_mm_storeu_si128(&out[0], out0);
+	_mm_storeu_si128(&out[1], out1);
+	_mm_storeu_si128(&out[2], out2);
 }
 #endif
 
@@ -375,7 +375,7 @@ void image565To888(const uint16_t* in, uint8_t* out, size_t w, size_t h, size_t
 	for (size_t y = 0; y < h; ++y) {
 		size_t x = 0;
 #ifdef __SSSE3__
-		for (; x < w; x += 16) {
+		for (; x + 15 < w; x += 16) {
 			_convert565To888(reinterpret_cast<const __m128i*>(&in[x]), reinterpret_cast<__m128i*>(out));
 			out += 16 * 3;
 		}
@@ -391,6 +391,16 @@ void image565To888(const uint16_t* in, uint8_t* out, size_t w, size_t h, size_t
 	}
 }
 
+void image565ToGray(const uint16_t* in, uint8_t* out, size_t w, size_t h, size_t stride) {
+	for (size_t y = 0; y < h; ++y) {
+		for (size_t x = 0; x < w; ++x) {
+			*out = _convert565ToGray(in[x], in[x]);
+			++out;
+		}
+		in += stride / 2;
+	}
+}
+
 void imageHalveX888ToGray(const uint32_t* in, uint8_t* out, size_t w, size_t h, size_t stride) {
 	for (size_t y = 0; y + 1 < h; y += 2) {
 		size_t x = 0;
@@ -403,8 +413,8 @@ void imageHalveX888ToGray(const uint32_t* in, uint8_t* out, size_t w, size_t h,
 			gray1 = _convertX888ToGray(_mm_loadu_si128(reinterpret_cast<const __m128i*>(&in[x + 4])));
 			__m128i out0 = _halveW32(gray0, gray1);
 
-			gray0 = _convertX888ToGray(_mm_loadu_si128(reinterpret_cast<const __m128i*>(&in[x + stride / 2])));
-			gray1 = _convertX888ToGray(_mm_loadu_si128(reinterpret_cast<const __m128i*>(&in[x + 4 + stride / 2])));
+			gray0 = _convertX888ToGray(_mm_loadu_si128(reinterpret_cast<const __m128i*>(&in[x + stride / 4])));
+			gray1 = _convertX888ToGray(_mm_loadu_si128(reinterpret_cast<const __m128i*>(&in[x + 4 + stride / 4])));
 			__m128i out1 = _halveW32(gray0, gray1);
 
 			// Halve height
@@ -417,7 +427,9 @@ void imageHalveX888ToGray(const uint32_t* in, uint8_t* out, size_t w, size_t h,
 		}
 #endif
 		for (; x + 1 < w; x += 2) {
-			*out = _convertX888ToGray(in[x], in[x + 1]);
+			unsigned gray0 = _convertX888ToGray(in[x], in[x + 1]);
+			unsigned gray1 = _convertX888ToGray(in[x + stride / 4], in[x + stride / 4 + 1]);
+			*out = (gray0 + gray1 + 1) / 2;
 			++out;
 		}
 		in += stride / 2;
@@ -436,8 +448,8 @@ void imageHalveX888ToGrayInterlace(const uint32_t* in, const uint16_t* oldin, ui
 			gray1 = _convertX888ToGray(_mm_loadu_si128(reinterpret_cast<const __m128i*>(&in[x + 4])));
 			__m128i out0 = _halveW32(gray0, gray1);
 
-			gray0 = _convertX888ToGray(_mm_loadu_si128(reinterpret_cast<const __m128i*>(&in[x + stride / 2])));
-			gray1 = _convertX888ToGray(_mm_loadu_si128(reinterpret_cast<const __m128i*>(&in[x + 4 + stride / 2])));
+			gray0 = _convertX888ToGray(_mm_loadu_si128(reinterpret_cast<const __m128i*>(&in[x + stride / 4])));
+			gray1 = _convertX888ToGray(_mm_loadu_si128(reinterpret_cast<const __m128i*>(&in[x + 4 + stride / 4])));
 			__m128i out1 = _halveW32(gray0, gray1);
 
 			// Halve height
@@ -455,6 +467,8 @@ void imageHalveX888ToGrayInterlace(const uint32_t* in, const uint16_t* oldin, ui
 #endif
 		for (; x + 1 < w; x += 2) {
 			unsigned gray0 = _convertX888ToGray(in[x], in[x + 1]);
+			unsigned gray1 = _convertX888ToGray(in[x + stride / 4], in[x + stride / 4 + 1]);
+			gray0 = (gray0 + gray1 + 1) / 2;
 			gray0 |= *oldin << 8;
 			*out = gray0;
 			++oldin;
@@ -572,10 +586,10 @@ void imageX888To888(const uint32_t* in, uint8_t* out, size_t w, size_t h, size_t
 			/* BC GC RC XC BD GD RD XD BE GE RE XE BF GF RF XF -> 00 00 00 00 RC GC BC RD GD BD RE GE BE RF GF DF */
 			const static __m128i blend23 = _mm_set_epi8(0x0C, 0x0D, 0x0E, 0x08, 0x09, 0x0A, 0x04, 0x05, 0x06, 0x00, 0x01, 0x02, 0x80, 0x80, 0x80, 0x80);
 
-			__m128i pix0 = _mm_load_si128(reinterpret_cast<const __m128i*>(&in[x]));
-			__m128i pix1 = _mm_load_si128(reinterpret_cast<const __m128i*>(&in[x + 4]));
-			__m128i pix2 = _mm_load_si128(reinterpret_cast<const __m128i*>(&in[x + 8]));
-			__m128i pix3 = _mm_load_si128(reinterpret_cast<const __m128i*>(&in[x + 12]));
+			__m128i pix0 = _mm_loadu_si128(reinterpret_cast<const __m128i*>(&in[x]));
+			__m128i pix1 = _mm_loadu_si128(reinterpret_cast<const __m128i*>(&in[x + 4]));
+			__m128i pix2 = _mm_loadu_si128(reinterpret_cast<const __m128i*>(&in[x + 8]));
+			__m128i pix3 = _mm_loadu_si128(reinterpret_cast<const __m128i*>(&in[x + 12]));
 
 			__m128i out0 = _mm_shuffle_epi8(pix0, blend00);
 			out0 = _mm_or_si128(out0, _mm_shuffle_epi8(pix1, blend01));
@@ -603,6 +617,16 @@ void imageX888To888(const uint32_t* in, uint8_t* out, size_t w, size_t h, size_t
 	}
 }
 
+void imageX888ToGray(const uint32_t* in, uint8_t* out, size_t w, size_t h, size_t stride) {
+	for (size_t y = 0; y < h; ++y) {
+		for (size_t x = 0; x < w; ++x) {
+			*out = _convertX888ToGray(in[x], in[x]);
+			++out;
+		}
+		in += stride / 4;
+	}
+}
+
 Image::Image(Format format, const void* in, size_t w, size_t h, size_t stride)
 	: m_constBuffer(in)
 	, m_w(w)
@@ -633,6 +657,9 @@ void Image::copyTo(Image* other) {
 		case Image::Format::RGB888:
 			image565To888(static_cast<const uint16_t*>(m_constBuffer), static_cast<uint8_t*>(other->m_buffer), m_w, m_h, m_stride);
 			break;
+		case Image::Format::G8:
+			image565ToGray(static_cast<const uint16_t*>(m_constBuffer), static_cast<uint8_t*>(other->m_buffer), m_w, m_h, m_stride);
+			break;
 		default:
 			throw logic_error("unimplemented conversion");
 		}
@@ -641,6 +668,7 @@ void Image::copyTo(Image* other) {
 		switch (other->m_format) {
 		case Image::Format::RGB888:
 			copyDirectlyTo(other);
+			break;
 		default:
 			throw logic_error("unimplemented conversion");
 		}
@@ -653,6 +681,9 @@ void Image::copyTo(Image* other) {
 		case Image::Format::RGB888:
 			imageX888To888(static_cast<const uint32_t*>(m_constBuffer), static_cast<uint8_t*>(other->m_buffer), m_w, m_h, m_stride);
 			break;
+		case Image::Format::G8:
+			imageX888ToGray(static_cast<const uint32_t*>(m_constBuffer), static_cast<uint8_t*>(other->m_buffer), m_w, m_h, m_stride);
+			break;
 		default:
 			throw logic_error("unimplemented conversion");
 		}
@@ -661,6 +692,7 @@ void Image::copyTo(Image* other) {
 		switch (other->m_format) {
 		case Image::Format::G8:
 			copyDirectlyTo(other);
+			break;
 		default:
 			throw logic_error("unimplemented conversion");
 		}
@@ -855,7 +887,7 @@ void Image::copyDirectlyTo(Image* other) {
 		const uint8_t* in = static_cast<const uint8_t*>(m_constBuffer);
 		uint8_t* out = static_cast<uint8_t*>(other->m_buffer);
 		for (size_t y = 0; y < m_h; ++y) {
-			memcpy(&out[other->m_stride * y], &in[m_stride * y], depth * y * m_w);
+			memcpy(&out[other->m_stride * y], &in[m_stride * y], depth * m_w);
 		}
 	}
 }
@@ -1,6 +1,8 @@
 #include "memory.h"
 
+#include <algorithm>
 #include <cstdlib>
+#include <tuple>
 #include <unordered_map>
 
 using namespace Retro;
@@ -324,6 +326,7 @@ int64_t DynamicMemoryView::operator[](size_t offset) const {
 const DataType AddressSpace::s_type{ "|u1" };
 
 void AddressSpace::addBlock(size_t offset, size_t size, void* data) {
+	++m_generation;
 	if (data) {
 		m_blocks[offset].open(data, size);
 	} else {
@@ -332,6 +335,7 @@ void AddressSpace::addBlock(size_t offset, size_t size, void* data) {
 }
 
 void AddressSpace::addBlock(size_t offset, size_t size, const void* data) {
+	++m_generation;
 	if (data) {
 		m_blocks[offset].clone(data, size);
 	} else {
@@ -340,18 +344,22 @@ void AddressSpace::addBlock(size_t offset, size_t size, const void* data) {
 }
 
 void AddressSpace::addBlock(size_t offset, const MemoryView<>& base) {
+	++m_generation;
 	m_blocks[offset].clone(base);
 }
 
 void AddressSpace::updateBlock(size_t offset, void* data) {
+	++m_generation;
 	m_blocks[offset].open(data, m_blocks[offset].size());
 }
 
 void AddressSpace::updateBlock(size_t offset, const void* data) {
+	++m_generation;
 	m_blocks[offset].clone(data, m_blocks[offset].size());
 }
 
 void AddressSpace::updateBlock(size_t offset, const MemoryView<>& base) {
+	++m_generation;
 	m_blocks[offset].clone(base);
 }
 
@@ -396,27 +404,81 @@ bool AddressSpace::ok() const {
 }
 
 void AddressSpace::reset() {
+	++m_generation;
 	m_blocks.clear();
 }
 
 void AddressSpace::clone(const AddressSpace& as) {
-	m_blocks.clear();
 	m_overlay = make_unique<MemoryOverlay>(*as.m_overlay);
+	bool sameLayout = m_blocks.size() == as.m_blocks.size() && equal(m_blocks.begin(), m_blocks.end(), as.m_blocks.begin(), [](const pair<const size_t, MemoryView<>>& a, const pair<const size_t, MemoryView<>>& b) {
+		return a.first == b.first && a.second.size() == b.second.size();
+	});
+	if (!sameLayout) {
+		++m_generation;
+		m_blocks.clear();
+	}
+	// Blocks that already have the right size are copied into in place, so
+	// pointers into them stay valid
 	for (auto& kv : as.m_blocks) {
 		m_blocks[kv.first].clone(kv.second);
 	}
 }
 
+void AddressSpace::clone(const AddressSpace& as, const map<size_t, size_t>& ranges) {
+	m_overlay = make_unique<MemoryOverlay>(*as.m_overlay);
+	// Ranges missing from the source are left out, so they don't count as a
+	// layout change on every call
+	vector<tuple<size_t, size_t, const void*>> sources;
+	for (const auto& range : ranges) {
+		const void* source = as.find(range.first);
+		if (source) {
+			sources.emplace_back(range.first, range.second, source);
+		}
+	}
+	bool sameLayout = m_blocks.size() == sources.size() && equal(m_blocks.begin(), m_blocks.end(), sources.begin(), [](const pair<const size_t, MemoryView<>>& a, const tuple<size_t, size_t, const void*>& b) {
+		return a.first == get<0>(b) && a.second.size() == get<1>(b);
+	});
+	if (!sameLayout) {
+		++m_generation;
+		m_blocks.clear();
+	}
+	for (const auto& source : sources) {
+		m_blocks[get<0>(source)].clone(get<2>(source), get<1>(source));
+	}
+}
+
 void AddressSpace::clone() {
+	++m_generation;
 	for (auto& kv : m_blocks) {
 		kv.second.clone();
 	}
 }
 
 void AddressSpace::setOverlay(const MemoryOverlay& overlay) {
+	++m_generation;
 	m_overlay = make_unique<MemoryOverlay>(overlay);
 }
 
+const void* AddressSpace::resolve(const Variable& var) const {
+	if (m_overlay->width > 1) {
+		return nullptr;
+	}
+	return find(var.address);
+}
+
+const void* AddressSpace::find(size_t address) const {
+	for (const auto& kv : m_blocks) {
+		if (address < kv.first) {
+			return nullptr;
+		}
+		if (address - kv.first >= kv.second.size()) {
+			continue;
+		}
+		return kv.second.offset(address - kv.first);
+	}
+	return nullptr;
+}
+
 Datum AddressSpace::operator[](size_t offset) {
 	for (auto& kv : m_blocks) {
 		if (offset < kv.first) {
@@ -479,6 +541,8 @@ int64_t AddressSpace::operator[](const Variable& var) const {
 }
 
 AddressSpace& AddressSpace::operator=(AddressSpace&& as) {
+	++m_generation;
+	++as.m_generation;
 	m_blocks.clear();
 	m_overlay = move(as.m_overlay);
 	for (auto& kv : as.m_blocks) {
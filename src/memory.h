@@ -432,11 +432,15 @@ public:
 	bool ok() const;
 	void reset();
 	void clone(const AddressSpace&);
+	void clone(const AddressSpace&, const std::map<size_t, size_t>& ranges);
 	void clone();
 
 	void setOverlay(const MemoryOverlay& overlay);
 	const MemoryOverlay& overlay() const { return *m_overlay; };
 
+	const void* resolve(const Variable&) const;
+	uint64_t generation() const { return m_generation; }
+
 	Datum operator[](size_t);
 	Datum operator[](const Variable&);
 	uint8_t operator[](size_t) const;
@@ -445,10 +449,13 @@ public:
 	AddressSpace& operator=(AddressSpace&&);
 
 private:
+	const void* find(size_t address) const;
+
 	static const DataType s_type;
 	;
 	std::map<size_t, MemoryView<>> m_blocks;
 	std::unique_ptr<MemoryOverlay> m_overlay = std::make_unique<MemoryOverlay>();
+	uint64_t m_generation = 0;
 };
 
 int64_t toBcd(int64_t);
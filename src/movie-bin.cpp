@@ -0,0 +1,318 @@
+#include "movie-bin.h"
+
+#include <algorithm>
+#include <cstring>
+
+using namespace std;
+using namespace Retro;
+
+static const char MAGIC[4] = { 'R', 'M', 'V', '1' };
+
+// The frame count follows the magic and player count, and stays at this value
+// until the recording is closed
+static const streamoff FRAME_COUNT_OFFSET = 8;
+static const uint64_t UNKNOWN_FRAMES = UINT64_MAX;
+
+template<typename T>
+static void writeInt(fstream* file, T value) {
+	uint8_t bytes[sizeof(T)];
+	for (size_t i = 0; i < sizeof(T); ++i) {
+		bytes[i] = value >> (i * 8);
+	}
+	file->write(reinterpret_cast<const char*>(bytes), sizeof(bytes));
+}
+
+template<typename T>
+static bool readInt(fstream* file, T* value) {
+	uint8_t bytes[sizeof(T)];
+	if (!file->read(reinterpret_cast<char*>(bytes), sizeof(bytes))) {
+		return false;
+	}
+	*value = 0;
+	for (size_t i = 0; i < sizeof(T); ++i) {
+		*value |= static_cast<T>(bytes[i]) << (i * 8);
+	}
+	return true;
+}
+
+static void writeU32(fstream* file, uint32_t value) {
+	writeInt(file, value);
+}
+
+static bool readU32(fstream* file, uint32_t* value) {
+	return readInt(file, value);
+}
+
+static void writeString(fstream* file, const string& value) {
+	writeU32(file, value.size());
+	file->write(value.data(), value.size());
+}
+
+static bool readBlob(fstream* file, uint32_t size, string* value) {
+	value->resize(size);
+	return size == 0 || file->read(&(*value)[0], size);
+}
+
+unique_ptr<Movie> MovieBinary::load(const string& path) {
+	unique_ptr<MovieBinary> movie = make_unique<MovieBinary>(path);
+	if (!movie->good()) {
+		return nullptr;
+	}
+	return movie;
+}
+
+bool MovieBinary::detect(const string& path) {
+	ifstream file(path, ios::binary);
+	char magic[sizeof(MAGIC)];
+	if (!file.read(magic, sizeof(magic))) {
+		return false;
+	}
+	return memcmp(magic, MAGIC, sizeof(MAGIC)) == 0;
+}
+
+MovieBinary::MovieBinary(const string& path, bool write, unsigned players)
+	: m_path(path)
+	, m_write(write) {
+	if (write) {
+		if (players < 1 || players > MAX_PLAYERS) {
+			return;
+		}
+		m_players = players;
+		m_file.open(path, ios::out | ios::binary | ios::trunc);
+		m_good = m_file.good();
+		m_input.resize(players * 2);
+	} else {
+		m_file.open(path, ios::in | ios::binary);
+		m_good = m_file.good() && readHeader();
+		if (m_keyframes.empty()) {
+			m_file.close();
+		}
+	}
+}
+
+MovieBinary::~MovieBinary() {
+	close();
+}
+
+bool MovieBinary::readHeader() {
+	char magic[sizeof(MAGIC)];
+	if (!m_file.read(magic, sizeof(magic)) || memcmp(magic, MAGIC, sizeof(MAGIC)) != 0) {
+		return false;
+	}
+	uint32_t players;
+	if (!readU32(&m_file, &players) || players < 1 || players > MAX_PLAYERS) {
+		return false;
+	}
+	m_players = players;
+	if (!readInt(&m_file, &m_frameCount)) {
+		return false;
+	}
+
+	uint32_t size;
+	string state;
+	if (!readU32(&m_file, &size) || !readBlob(&m_file, size, &m_gameName)) {
+		return false;
+	}
+	if (!readU32(&m_file, &size) || !readBlob(&m_file, size, &m_platform)) {
+		return false;
+	}
+	if (!readU32(&m_file, &size) || !readBlob(&m_file, size, &state)) {
+		return false;
+	}
+	m_state.assign(state.begin(), state.end());
+
+	// The input log is small enough to take in one read, which makes stepping
+	// through it nothing more than decoding a few bytes
+	streampos start = m_file.tellg();
+	m_file.seekg(0, ios::end);
+	uint64_t length = m_file.tellg() - start;
+	m_file.seekg(start);
+	if (m_frameCount == UNKNOWN_FRAMES) {
+		// The recording never got closed, so take whatever frames made it out
+		// and do without keyframes
+		m_frameCount = length / (m_players * 2);
+		length = m_frameCount * m_players * 2;
+	} else if (m_frameCount > length / (m_players * 2)) {
+		return false;
+	}
+	m_input.resize(m_frameCount * m_players * 2);
+	if (!m_input.empty() && !m_file.read(reinterpret_cast<char*>(m_input.data()), m_input.size())) {
+		return false;
+	}
+	if (m_input.size() == length) {
+		return true;
+	}
+
+	uint32_t keyframes;
+	if (!readU32(&m_file, &keyframes)) {
+		return false;
+	}
+	for (uint32_t i = 0; i < keyframes; ++i) {
+		Keyframe keyframe;
+		if (!readInt(&m_file, &keyframe.frame) || !readU32(&m_file, &size)) {
+			return false;
+		}
+		keyframe.offset = m_file.tellg();
+		keyframe.size = size;
+		if (!m_file.seekg(size, ios::cur)) {
+			return false;
+		}
+		m_keyframes.emplace_back(move(keyframe));
+	}
+	return true;
+}
+
+void MovieBinary::writeHeader() {
+	if (m_headerWritten) {
+		return;
+	}
+	m_file.write(MAGIC, sizeof(MAGIC));
+	writeU32(&m_file, m_players);
+	writeInt(&m_file, UNKNOWN_FRAMES);
+	writeString(&m_file, m_gameName);
+	writeString(&m_file, m_platform);
+	writeU32(&m_file, m_state.size());
+	m_file.write(reinterpret_cast<const char*>(m_state.data()), m_state.size());
+	m_headerWritten = true;
+}
+
+bool MovieBinary::step() {
+	if (!m_good) {
+		return false;
+	}
+	if (m_write) {
+		writeHeader();
+		for (unsigned i = 0; i < m_players; ++i) {
+			m_input[i * 2] = m_keys[i];
+			m_input[i * 2 + 1] = m_keys[i] >> 8;
+			m_keys[i] = 0;
+		}
+		m_file.write(reinterpret_cast<const char*>(m_input.data()), m_input.size());
+		++m_frame;
+		return true;
+	}
+	if (m_position + m_players * 2 > m_input.size()) {
+		return false;
+	}
+	for (unsigned i = 0; i < m_players; ++i) {
+		m_keys[i] = m_input[m_position] | (m_input[m_position + 1] << 8);
+		m_position += 2;
+	}
+	++m_frame;
+	return true;
+}
+
+bool MovieBinary::seek(size_t frame) {
+	if (m_write || frame > m_frameCount) {
+		return false;
+	}
+	m_frame = frame;
+	m_position = frame * m_players * 2;
+	return true;
+}
+
+void MovieBinary::writeKeyframes() {
+	if (m_keyframeFile) {
+		fflush(m_keyframeFile);
+	}
+	writeU32(&m_file, m_keyframes.size());
+	vector<uint8_t> state;
+	for (const auto& keyframe : m_keyframes) {
+		state.resize(keyframe.size);
+		if (keyframe.size && (fseek(m_keyframeFile, keyframe.offset, SEEK_SET) != 0 || fread(state.data(), 1, keyframe.size, m_keyframeFile) != keyframe.size)) {
+			// Keep the layout intact, leaving an empty state that won't load
+			state.clear();
+		}
+		writeInt(&m_file, keyframe.frame);
+		writeU32(&m_file, state.size());
+		m_file.write(reinterpret_cast<const char*>(state.data()), state.size());
+	}
+	m_keyframes.clear();
+	m_file.seekp(FRAME_COUNT_OFFSET);
+	writeInt(&m_file, static_cast<uint64_t>(m_frame));
+}
+
+void MovieBinary::close() {
+	if (m_write && m_good) {
+		writeHeader();
+		writeKeyframes();
+	}
+	m_good = false;
+	if (m_file.is_open()) {
+		m_file.close();
+	}
+	if (m_keyframeFile) {
+		fclose(m_keyframeFile);
+		m_keyframeFile = nullptr;
+	}
+}
+
+bool MovieBinary::getState(vector<uint8_t>* state) const {
+	if (m_state.empty()) {
+		return false;
+	}
+	*state = m_state;
+	return true;
+}
+
+void MovieBinary::setState(const uint8_t* state, size_t size) {
+	m_state.assign(state, state + size);
+}
+
+int64_t MovieBinary::frameCount() const {
+	if (m_write) {
+		return m_frame;
+	}
+	return m_frameCount;
+}
+
+bool MovieBinary::getKeyframe(size_t frame, size_t* keyframe, vector<uint8_t>* state) const {
+	if (m_write) {
+		return Movie::getKeyframe(frame, keyframe, state);
+	}
+	auto found = upper_bound(m_keyframes.begin(), m_keyframes.end(), frame, [](size_t frame, const Keyframe& keyframe) {
+		return frame < keyframe.frame;
+	});
+	if (found == m_keyframes.begin()) {
+		return Movie::getKeyframe(frame, keyframe, state);
+	}
+	--found;
+	state->resize(found->size);
+	m_file.clear();
+	m_file.seekg(found->offset);
+	if (!m_file.read(reinterpret_cast<char*>(state->data()), state->size())) {
+		return false;
+	}
+	*keyframe = found->frame;
+	return true;
+}
+
+vector<size_t> MovieBinary::keyframes() const {
+	vector<size_t> frames;
+	for (const auto& keyframe : m_keyframes) {
+		frames.emplace_back(keyframe.frame);
+	}
+	return frames;
+}
+
+bool MovieBinary::addKeyframe(const uint8_t* state, size_t size) {
+	if (!m_write || !m_good) {
+		return false;
+	}
+	if (!m_keyframeFile) {
+		// Removed automatically once it's closed
+		m_keyframeFile = tmpfile();
+		if (!m_keyframeFile) {
+			return false;
+		}
+	}
+	if (fseek(m_keyframeFile, 0, SEEK_END) != 0) {
+		return false;
+	}
+	long offset = ftell(m_keyframeFile);
+	if (offset < 0 || fwrite(state, 1, size, m_keyframeFile) != size) {
+		return false;
+	}
+	m_keyframes.push_back({ m_frame, offset, size });
+	return true;
+}
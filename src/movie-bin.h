@@ -0,0 +1,76 @@
+#pragma once
+
+#include <cstdio>
+#include <fstream>
+#include <vector>
+
+#include "movie.h"
+
+namespace Retro {
+
+// Compact binary movie: a short header with the frame count, game, platform and
+// initial state, followed by one little-endian uint16 button mask per player
+// per frame and finally any keyframe states
+class MovieBinary final : public Movie {
+public:
+	MovieBinary(const std::string& path, bool write = false, unsigned players = 1);
+	~MovieBinary();
+
+	static std::unique_ptr<Movie> load(const std::string& path);
+	static bool detect(const std::string& path);
+
+	virtual std::string getGameName() const override { return m_gameName; }
+	virtual void setGameName(const std::string& name) override { m_gameName = name; }
+	virtual std::string getPlatform() const override { return m_platform; }
+	virtual void setPlatform(const std::string& platform) override { m_platform = platform; }
+
+	virtual bool step() override;
+	virtual bool seek(size_t frame) override;
+
+	virtual void close() override;
+
+	virtual bool getState(std::vector<uint8_t>*) const override;
+	virtual void setState(const uint8_t*, size_t) override;
+
+	virtual int64_t frameCount() const override;
+	virtual bool getKeyframe(size_t frame, size_t* keyframe, std::vector<uint8_t>* state) const override;
+	virtual bool addKeyframe(const uint8_t*, size_t) override;
+	virtual std::vector<size_t> keyframes() const override;
+
+	bool good() const { return m_good; }
+
+private:
+	struct Keyframe {
+		uint64_t frame;
+		std::streamoff offset;
+		size_t size;
+	};
+
+	bool readHeader();
+	void writeHeader();
+	void writeKeyframes();
+
+	std::string m_path;
+	mutable std::fstream m_file;
+	bool m_write = false;
+	bool m_good = false;
+	bool m_headerWritten = false;
+
+	std::vector<uint8_t> m_state;
+	std::string m_gameName{ "?" };
+	std::string m_platform;
+
+	// Read mode keeps the whole input log in memory; write mode reuses it as
+	// the buffer for a single frame
+	std::vector<uint8_t> m_input;
+	size_t m_position = 0;
+	uint64_t m_frameCount = 0;
+
+	// When recording, the states go into a temporary file as they're taken
+	// and are copied to the end of the movie at close; when playing back,
+	// they're read from the movie on demand. Either way only their offsets
+	// are kept in memory
+	std::vector<Keyframe> m_keyframes;
+	std::FILE* m_keyframeFile = nullptr;
+};
+}
@@ -1,7 +1,15 @@
 #include "movie-bk2.h"
 
+#include <condition_variable>
 #include <cstring>
+#include <deque>
+#include <mutex>
 #include <sstream>
+#include <thread>
+
+#ifndef _WIN32
+#include <pthread.h>
+#endif
 
 #include "coreinfo.h"
 
@@ -51,7 +59,134 @@ static const unordered_map<string, unordered_map<char, string>> s_platformButton
 																}),
 };
 
+namespace {
+// Compressing and writing out a finished movie happens on a background
+// thread, so closing a movie doesn't stall whoever is stepping the emulator
+class ZipWriter {
+public:
+	ZipWriter() {
+		// The writer thread doesn't survive a fork, so hold the lock across it
+		// to keep the queue consistent and start over in the child
+#ifndef _WIN32
+		pthread_atfork(&ZipWriter::prepareFork, &ZipWriter::parentFork, &ZipWriter::childFork);
+#endif
+	}
+
+	~ZipWriter() {
+		{
+			lock_guard<mutex> lock(m_mutex);
+			m_stop = true;
+			if (!m_thread) {
+				return;
+			}
+		}
+		m_work->notify_one();
+		m_thread->join();
+	}
+
+	void push(unique_ptr<Zip> zip) {
+		unique_lock<mutex> lock(m_mutex);
+		if (m_stop) {
+			// Shutting down, so there's no thread left to hand this to
+			lock.unlock();
+			zip->close();
+			return;
+		}
+		if (!m_thread) {
+			m_thread = make_unique<thread>(&ZipWriter::run, this);
+		}
+		m_space->wait(lock, [this]() { return m_queue.size() < MAX_PENDING; });
+		m_queue.emplace_back(move(zip));
+		m_work->notify_one();
+	}
+
+	void wait() {
+		unique_lock<mutex> lock(m_mutex);
+		if (!m_thread) {
+			return;
+		}
+		m_idle->wait(lock, [this]() { return m_queue.empty() && !m_busy; });
+	}
+
+private:
+	static const size_t MAX_PENDING = 8;
+
+	static void prepareFork();
+	static void parentFork();
+	static void childFork();
+
+	void forget() {
+		// The thread didn't come along, and the parent still owns anything
+		// that was queued. Its condition variables may still count the
+		// thread as a waiter, so they're replaced rather than destroyed
+		m_thread.release();
+		for (auto& zip : m_queue) {
+			zip.release();
+		}
+		m_queue.clear();
+		m_busy = false;
+		m_work.release();
+		m_space.release();
+		m_idle.release();
+		m_work = make_unique<condition_variable>();
+		m_space = make_unique<condition_variable>();
+		m_idle = make_unique<condition_variable>();
+	}
+
+	void run() {
+		unique_lock<mutex> lock(m_mutex);
+		while (true) {
+			m_work->wait(lock, [this]() { return m_stop || !m_queue.empty(); });
+			if (m_queue.empty()) {
+				return;
+			}
+			unique_ptr<Zip> zip = move(m_queue.front());
+			m_queue.pop_front();
+			m_busy = true;
+			m_space->notify_one();
+			lock.unlock();
+			zip->close();
+			zip.reset();
+			lock.lock();
+			m_busy = false;
+			m_idle->notify_all();
+		}
+	}
+
+	mutex m_mutex;
+	unique_ptr<condition_variable> m_work = make_unique<condition_variable>();
+	unique_ptr<condition_variable> m_space = make_unique<condition_variable>();
+	unique_ptr<condition_variable> m_idle = make_unique<condition_variable>();
+	deque<unique_ptr<Zip>> m_queue;
+	unique_ptr<thread> m_thread;
+	bool m_busy = false;
+	bool m_stop = false;
+};
+
+ZipWriter s_writer;
+
+void ZipWriter::prepareFork() {
+	s_writer.m_mutex.lock();
+}
+
+void ZipWriter::parentFork() {
+	s_writer.m_mutex.unlock();
+}
+
+void ZipWriter::childFork() {
+	s_writer.m_mutex.unlock();
+	if (s_writer.m_thread) {
+		s_writer.forget();
+	}
+}
+}
+
+void MovieBK2::waitForWrites() {
+	s_writer.wait();
+}
+
 unique_ptr<Movie> MovieBK2::load(const string& path) {
+	waitForWrites();
 	unique_ptr<Zip> zip = make_unique<Zip>(path);
 	if (!zip->open()) {
 		return nullptr;
@@ -89,6 +224,9 @@ MovieBK2::MovieBK2(unique_ptr<Zip> zip)
 		if (headerLine.compare(0, 8, "GameName") == 0) {
 			m_gameName = headerLine.substr(9);
 		}
+		if (headerLine.compare(0, 7, "Frames ") == 0) {
+			m_frameCount = stoll(headerLine.substr(7));
+		}
 	}
 
 	string tmp = m_log->readline();
@@ -112,6 +250,9 @@ MovieBK2::MovieBK2(const std::string& path, bool write, unsigned players)
 	: m_zip(make_unique<Zip>(path))
 	, m_write(write) {
 	m_players = players;
+	if (!write) {
+		waitForWrites();
+	}
 	m_zip->open(write);
 	m_log = m_zip->openFile("Input Log.txt", write);
 	if (write) {
@@ -140,6 +281,7 @@ void MovieBK2::loadKeymap(const string& platform) {
 			m_buttonmap[i] = button->second;
 		}
 	}
+	m_coreName = platform;
 	if (m_write) {
 		string realPlatform = platform;
 		if (platform == "Genesis") {
@@ -151,7 +293,6 @@ void MovieBK2::loadKeymap(const string& platform) {
 		} else if (platform == "Atari2600") {
 			realPlatform = "A26";
 		}
-		m_coreName = platform;
 		m_platform = realPlatform;
 	}
 }
@@ -164,21 +305,11 @@ void MovieBK2::writeHeader() {
 	if (m_headerWritten) {
 		return;
 	}
-	Zip::File* header = m_zip->openFile("Header.txt", true);
 	stringstream headerText;
-	headerText << "MovieVersion Retro" << endl;
-	headerText << "Author ?" << endl;
-	headerText << "emuVersion ?" << endl;
-	headerText << "Platform " << m_platform << endl;
-	headerText << "GameName " << m_gameName << endl;
-	headerText << "SHA1 ?" << endl;
-	headerText << "Core ?" << endl;
-	headerText << "rerecordCount 1" << endl;
-	header->write(static_cast<const void*>(headerText.str().c_str()), headerText.str().size());
-
-	headerText.str("LogKey:#Reset|Power|#");
+	m_logKeys.assign(m_buttonmap.begin(), m_buttonmap.end());
+	headerText << "LogKey:#Reset|Power|#";
 	for (unsigned p = 1; p < m_players + 1; ++p) {
-		for (const auto& key : m_buttonmap) {
+		for (const auto& key : m_logKeys) {
 			if (s_platformButtonNames.find(m_coreName) != s_platformButtonNames.end()) {
 				const auto& platformButtons = s_platformButtonNames.at(m_coreName);
 				if (platformButtons.find(key.second) != platformButtons.end()) {
@@ -194,6 +325,22 @@ void MovieBK2::writeHeader() {
 	m_log->write(static_cast<const void*>(headerText.str().c_str()), headerText.str().size());
 }
 
+void MovieBK2::writeInfo() {
+	// Written last so it can carry the length of the movie
+	Zip::File* header = m_zip->openFile("Header.txt", true);
+	stringstream headerText;
+	headerText << "MovieVersion Retro" << endl;
+	headerText << "Author ?" << endl;
+	headerText << "emuVersion ?" << endl;
+	headerText << "Platform " << m_platform << endl;
+	headerText << "GameName " << m_gameName << endl;
+	headerText << "SHA1 ?" << endl;
+	headerText << "Core ?" << endl;
+	headerText << "rerecordCount 1" << endl;
+	headerText << "Frames " << m_frame << endl;
+	header->write(static_cast<const void*>(headerText.str().c_str()), headerText.str().size());
+}
+
 bool MovieBK2::step() {
 	if (!m_log) {
 		return false;
@@ -202,21 +349,17 @@ bool MovieBK2::step() {
 		if (!m_headerWritten) {
 			writeHeader();
 		}
-		stringstream line;
-		line << "|..|";
+		m_line.assign("|..|");
 		for (unsigned i = 0; i < m_players; ++i) {
-			for (const auto& key : m_buttonmap) {
-				if (m_keys[i] & (1 << key.first)) {
-					line << key.second;
-				} else {
-					line << '.';
-				}
+			for (const auto& key : m_logKeys) {
+				m_line.push_back(m_keys[i] & (1 << key.first) ? key.second : '.');
 			}
 			m_keys[i] = 0;
-			line << '|';
+			m_line.push_back('|');
 		}
-		line << endl;
-		m_log->write(static_cast<const void*>(line.str().c_str()), line.str().size());
+		m_line.push_back('\n');
+		m_log->write(static_cast<const void*>(m_line.data()), m_line.size());
+		++m_frame;
 		return true;
 	} else {
 		string tmp = m_log->readline();
@@ -251,26 +394,46 @@ bool MovieBK2::step() {
 					++iter;
 				}
 			}
+			++m_frame;
 			return true;
 		}
 	}
 	return false;
 }
 
+bool MovieBK2::seek(size_t frame) {
+	if (m_write) {
+		return false;
+	}
+	return Movie::seek(frame);
+}
+
+int64_t MovieBK2::frameCount() const {
+	if (m_write) {
+		return m_frame;
+	}
+	return m_frameCount;
+}
+
 void MovieBK2::close() {
 	if (!m_zip) {
 		return;
 	}
 	if (m_write) {
+		writeHeader();
+		writeInfo();
 		const char* footerText = "[/Input]";
 		m_log->write(static_cast<const void*>(footerText), strlen(footerText));
 		if (!m_state.empty()) {
 			auto state = m_zip->openFile("Core.bin", true);
 			state->write(m_state.data(), m_state.size());
 		}
+		s_writer.push(move(m_zip));
+	} else {
+		m_zip->close();
 	}
-	m_zip->close();
 	m_zip.reset();
+	m_log = nullptr;
 }
 
 bool MovieBK2::getState(vector<uint8_t>* state) const {
@@ -15,22 +15,29 @@ public:
 	~MovieBK2();
 
 	virtual std::string getGameName() const override;
+	virtual void setGameName(const std::string& name) override;
+	virtual std::string getPlatform() const override { return m_coreName; }
+	virtual void setPlatform(const std::string& platform) override { loadKeymap(platform); }
 
 	void loadKeymap(const std::string& platform);
-	void setGameName(const std::string& name);
 	void writeHeader();
 
 	static std::unique_ptr<Movie> load(const std::string& path);
+	static void waitForWrites();
 
 	virtual bool step() override;
+	virtual bool seek(size_t frame) override;
 
 	virtual void close() override;
 
+	virtual int64_t frameCount() const override;
+
 	virtual bool getState(std::vector<uint8_t>*) const override;
 	virtual void setState(const uint8_t*, size_t) override;
 
 private:
 	void loadState();
+	void writeInfo();
 
 	std::unique_ptr<Zip> m_zip;
 	Zip::File* m_log;
@@ -38,11 +45,14 @@ private:
 
 	std::unordered_map<char, int> m_keymap;
 	std::unordered_map<int, char> m_buttonmap;
+	std::vector<std::pair<int, char>> m_logKeys;
+	std::string m_line;
 	bool m_write = false;
 
 	bool m_headerWritten = false;
 	std::string m_coreName;
 	std::string m_platform;
 	std::string m_gameName{ "?" };
+	int64_t m_frameCount = -1;
 };
 }
@@ -89,6 +89,7 @@ bool MovieFM2::step() {
 				++iter;
 			}
 		}
+		++m_frame;
 		return true;
 	}
 	return false;
@@ -12,6 +12,8 @@ public:
 
 	static std::unique_ptr<Movie> load(const std::string& path);
 
+	virtual std::string getPlatform() const override { return "Nes"; }
+
 	virtual bool step() override;
 
 private:
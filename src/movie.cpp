@@ -1,8 +1,10 @@
 #include "movie.h"
 
+#include "movie-bin.h"
 #include "movie-bk2.h"
 #include "movie-fm2.h"
 
+#include <algorithm>
 #include <functional>
 #include <unordered_map>
 
@@ -12,21 +14,99 @@ using namespace Retro;
 static unordered_map<string, function<unique_ptr<Movie>(const string&)>> s_movieTypes{
 	make_pair("bk2", MovieBK2::load),
 	make_pair("fm2", MovieFM2::load),
+	make_pair("rmv", MovieBinary::load),
 };
 
-std::unique_ptr<Movie> Movie::load(const string& path) {
+static string extension(const string& path) {
 	size_t dot = path.find_last_of('.');
 	if (dot == string::npos) {
-		return nullptr;
+		return {};
 	}
 	string extName = path.substr(dot + 1);
-	const auto& found = s_movieTypes.find(extName);
+	transform(extName.begin(), extName.end(), extName.begin(), ::tolower);
+	return extName;
+}
+
+std::unique_ptr<Movie> Movie::load(const string& path) {
+	// Binary movies are recognized by their contents, whatever they're named
+	if (MovieBinary::detect(path)) {
+		return MovieBinary::load(path);
+	}
+	const auto& found = s_movieTypes.find(extension(path));
 	if (found == s_movieTypes.end()) {
 		return nullptr;
 	}
 	return found->second(path);
 }
 
+std::unique_ptr<Movie> Movie::create(const string& path, unsigned players) {
+	if (extension(path) == "rmv") {
+		unique_ptr<MovieBinary> movie = make_unique<MovieBinary>(path, true, players);
+		if (!movie->good()) {
+			return nullptr;
+		}
+		return movie;
+	}
+	return make_unique<MovieBK2>(path, true, players);
+}
+
+bool Movie::convert(const string& source, const string& dest) {
+	unique_ptr<Movie> in = load(source);
+	if (!in || in->getPlatform().empty()) {
+		return false;
+	}
+	unique_ptr<Movie> out = create(dest, in->players());
+	if (!out) {
+		return false;
+	}
+	out->setGameName(in->getGameName());
+	out->setPlatform(in->getPlatform());
+	vector<uint8_t> state;
+	if (in->getState(&state)) {
+		out->setState(state.data(), state.size());
+	}
+	vector<size_t> keyframes = in->keyframes();
+	auto nextKeyframe = keyframes.begin();
+	while (true) {
+		// A keyframe is the state just before its frame's input, so one can
+		// also follow the last frame
+		size_t keyframe;
+		if (nextKeyframe != keyframes.end() && *nextKeyframe == out->frame()) {
+			if (in->getKeyframe(*nextKeyframe, &keyframe, &state)) {
+				out->addKeyframe(state.data(), state.size());
+			}
+			++nextKeyframe;
+		}
+		if (!in->step()) {
+			break;
+		}
+		for (unsigned player = 0; player < in->players(); ++player) {
+			out->setKeys(in->getKeys(player), player);
+		}
+		out->step();
+	}
+	out->close();
+	return true;
+}
+
+bool Movie::seek(size_t frame) {
+	// Without any random access, the best that can be done is stepping forward
+	if (frame < m_frame) {
+		return false;
+	}
+	while (m_frame < frame) {
+		if (!step()) {
+			return false;
+		}
+	}
+	return true;
+}
+
+bool Movie::getKeyframe(size_t, size_t* keyframe, vector<uint8_t>* state) const {
+	*keyframe = 0;
+	return getState(state);
+}
+
 bool Movie::getKey(int key, unsigned player) {
 	return (m_keys[player] >> key) & 1;
 }
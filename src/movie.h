@@ -11,24 +11,52 @@ namespace Retro {
 class Movie {
 public:
 	static std::unique_ptr<Movie> load(const std::string& path);
+	// Picks the format from the extension, case-insensitively, and records BK2
+	// for anything that isn't .rmv
+	static std::unique_ptr<Movie> create(const std::string& path, unsigned players = 1);
+	// Keyframes are carried over if the destination format can hold them;
+	// BK2 can't, so they're lost converting to it
+	static bool convert(const std::string& source, const std::string& dest);
 	virtual ~Movie() {}
 
 	virtual std::string getGameName() const { return {}; }
+	virtual void setGameName(const std::string&) {}
+	virtual std::string getPlatform() const { return {}; }
+	virtual void setPlatform(const std::string&) {}
 
 	virtual bool step() = 0;
+	virtual bool seek(size_t frame);
 
 	virtual void close() {}
 
 	virtual bool getState(std::vector<uint8_t>*) const { return false; }
 	virtual void setState(const uint8_t*, size_t) {}
 
+	// Frames stepped so far, and the length of the whole movie if it is known
+	// without reading through it (-1 otherwise)
+	size_t frame() const { return m_frame; }
+	virtual int64_t frameCount() const { return -1; }
+
+	// Keyframes are savestates embedded every so often while recording; the
+	// one for frame N is the state just before frame N's input is applied.
+	// Movies without them fall back to the initial state at frame 0
+	virtual bool getKeyframe(size_t frame, size_t* keyframe, std::vector<uint8_t>* state) const;
+	virtual bool addKeyframe(const uint8_t*, size_t) { return false; }
+	virtual std::vector<size_t> keyframes() const { return {}; }
+	unsigned keyframeInterval() const { return m_keyframeInterval; }
+	void setKeyframeInterval(unsigned interval) { m_keyframeInterval = interval; }
+
 	bool getKey(int, unsigned player = 0);
 	void setKey(int key, bool, unsigned player = 0);
+	uint16_t getKeys(unsigned player = 0) const { return m_keys[player]; }
+	void setKeys(uint16_t keys, unsigned player = 0) { m_keys[player] = keys; }
 
 	unsigned players() const { return m_players; }
 
 protected:
 	uint16_t m_keys[MAX_PLAYERS] = { 0 };
 	unsigned m_players = 1;
+	size_t m_frame = 0;
+	unsigned m_keyframeInterval = 0;
 };
 }
@@ -21,7 +21,9 @@ static inline T _hypot(T x, T y) {
 #include "movie.h"
 #include "movie-bk2.h"
 
+#include <list>
 #include <map>
+#include <tuple>
 #include <unordered_map>
 #include <unordered_set>
 
@@ -30,14 +32,58 @@ namespace py = pybind11;
 using std::string;
 using namespace Retro;
 
+// Start and length of [start:stop] on an axis of the given size, as NumPy
+// slicing would resolve them
+static std::pair<long, long> sliceSpan(long start, long stop, long size) {
+	auto clip = [size](long i) {
+		if (i < 0) {
+			i += size;
+		}
+		return std::min(std::max(i, 0L), size);
+	};
+	start = clip(start);
+	stop = clip(stop);
+	return { start, std::max(stop - start, 0L) };
+}
+
+struct ScreenFormat {
+	long x = 0;
+	long y = 0;
+	long width = 0;
+	long height = 0;
+	bool gray = false;
+	unsigned downscale = 1;
+
+	long outWidth() const { return width / downscale; }
+	long outHeight() const { return height / downscale; }
+	long channels() const { return gray ? 1 : 3; }
+};
+
+// Script interpreters aren't safe to enter from several threads at once, so
+// the GIL is taken back around scenario updates of scenarios with scripts
+// while frames run with it released
+struct ScriptLock {
+	std::unique_ptr<py::gil_scoped_acquire> m_gil;
+	ScriptLock(const Scenario& scen) {
+		if (scen.hasScripts()) {
+			m_gil = std::make_unique<py::gil_scoped_acquire>();
+		}
+	}
+};
+
 struct PyGameData;
+struct PyFrameStack;
+struct PyInfoLookup;
+struct PyMovie;
 struct PyRetroEmulator {
 	Retro::Emulator m_re;
 	int m_cheats = 0;
+	PyFrameStack* m_frameStack = nullptr;
+	size_t m_frameStackSlot = 0;
+	Retro::Movie* m_movie = nullptr;
+	py::object m_movieObject;
+	std::vector<uint8_t> m_keyframe;
 	PyRetroEmulator(const string& rom_path) {
-		if (Emulator::isLoaded()) {
-			throw std::runtime_error("Cannot create multiple emulator instances per process");
-		}
 		if (!m_re.loadRom(rom_path.c_str())) {
 			throw std::runtime_error("Could not load ROM");
 		}
@@ -45,9 +91,21 @@ struct PyRetroEmulator {
 	}
 
 	void step() {
+		py::gil_scoped_release release;
 		m_re.run();
 	}
 
+	unsigned stepN(unsigned frames, PyGameData* data) {
+		py::gil_scoped_release release;
+		return runFrames(frames, data);
+	}
+
+	unsigned runFrames(unsigned frames, PyGameData* data);
+	void recordFrame();
+	void setMovie(py::object movie);
+	py::dict playMovie(PyMovie& movie, PyGameData* data, PyInfoLookup* info, int64_t limit, py::object screens, py::object crop, bool gray, unsigned downscale);
+	py::object resetTo(py::object state, PyGameData* data, bool screen, py::object out, py::object crop, bool gray, unsigned downscale);
+
 	py::bytes getState() {
 		size_t size = m_re.serializeSize();
 		py::bytes bytes(NULL, size);
@@ -59,20 +117,74 @@ struct PyRetroEmulator {
 		return m_re.unserialize(PyBytes_AsString(o.ptr()), PyBytes_Size(o.ptr()));
 	}
 
-	py::array_t<uint8_t> getScreen() {
-		long w = m_re.getImageWidth();
-		long h = m_re.getImageHeight();
-		py::array_t<uint8_t> arr({ { h, w, 3 } });
+	ScreenFormat screenFormat(py::object crop, bool gray, unsigned downscale) {
+		if (downscale != 1 && downscale != 2 && downscale != 4) {
+			throw std::invalid_argument("downscale must be 1, 2 or 4");
+		}
+		if (downscale != 1 && !gray) {
+			throw std::invalid_argument("downscale is only supported for grayscale screens");
+		}
+		ScreenFormat format;
+		format.gray = gray;
+		format.downscale = downscale;
+		if (!crop.is_none()) {
+			std::tie(format.x, format.y, format.width, format.height) = crop.cast<std::tuple<long, long, long, long>>();
+		}
+		long width = m_re.getImageWidth();
+		long height = m_re.getImageHeight();
+		// Crops reaching past the screen are clipped the way slicing the whole
+		// screen in NumPy would, down to nothing if they're entirely outside
+		long right = format.width <= 0 || format.x + format.width > width ? width : format.x + format.width;
+		long bottom = format.height <= 0 || format.y + format.height > height ? height : format.y + format.height;
+		std::tie(format.x, format.width) = sliceSpan(format.x, right, width);
+		std::tie(format.y, format.height) = sliceSpan(format.y, bottom, height);
+		format.width -= format.width % downscale;
+		format.height -= format.height % downscale;
+		return format;
+	}
+
+	py::array_t<uint8_t> getScreen(py::object out, py::object crop, bool gray, unsigned downscale) {
+		ScreenFormat format = screenFormat(crop, gray, downscale);
+		long h = format.outHeight();
+		long w = format.outWidth();
+		long c = format.channels();
+		py::array_t<uint8_t> arr;
+		if (out.is_none()) {
+			arr = py::array_t<uint8_t>(py::array::ShapeContainer{ h, w, c });
+		} else {
+			if (!py::array_t<uint8_t>::check_(out)) {
+				throw std::invalid_argument("out must be a uint8 array");
+			}
+			arr = out.cast<py::array_t<uint8_t>>();
+			if (arr.ndim() != 3 || arr.shape(0) != h || arr.shape(1) != w || arr.shape(2) != c) {
+				throw std::invalid_argument("out does not match the shape of the screen");
+			}
+			if (!(arr.flags() & py::array::c_style)) {
+				throw std::invalid_argument("out must be C-contiguous");
+			}
+		}
 		uint8_t* data = arr.mutable_data();
-		Image out(Image::Format::RGB888, data, w, h, w);
+		{
+			py::gil_scoped_release release;
+			writeScreen(data, format);
+		}
+		return arr;
+	}
+
+	void writeScreen(uint8_t* data, const ScreenFormat& format) {
+		if (!format.width || !format.height) {
+			return;
+		}
+		size_t pitch = m_re.getImagePitch();
+		const uint8_t* pixels = static_cast<const uint8_t*>(m_re.getImageData()) + format.y * pitch;
 		Image in;
 		if (m_re.getImageDepth() == 16) {
-			in = Image(Image::Format::RGB565, m_re.getImageData(), w, h, m_re.getImagePitch());
+			in = Image(Image::Format::RGB565, &pixels[format.x * 2], format.width, format.height, pitch);
 		} else if (m_re.getImageDepth() == 32) {
-			in = Image(Image::Format::RGBX888, m_re.getImageData(), w, h, m_re.getImagePitch());
+			in = Image(Image::Format::RGBX888, &pixels[format.x * 4], format.width, format.height, pitch);
 		}
-		in.copyTo(&out);
-		return arr;
+		Image out(format.gray ? Image::Format::G8 : Image::Format::RGB888, data, format.outWidth(), format.outHeight(), format.outWidth() * format.channels());
+		in.divideTo(format.downscale, &out);
 	}
 
 	double getScreenRate() {
@@ -122,6 +234,163 @@ struct PyRetroEmulator {
 	}
 };
 
+struct PyFrameStack {
+	std::vector<PyRetroEmulator*> m_emulators;
+	unsigned m_frames;
+	bool m_maxPool;
+	ScreenFormat m_format;
+	size_t m_frameSize;
+	size_t m_index = 0;
+	py::array_t<uint8_t> m_buffer;
+	std::vector<uint8_t> m_last;
+	// The stack and slot each emulator was capturing into before this one
+	// took over, handed back when this one goes away
+	std::vector<std::pair<PyFrameStack*, size_t>> m_previous;
+
+	PyFrameStack(py::list emulators, unsigned frames, bool maxPool, py::object crop, bool gray, unsigned downscale)
+		: m_frames(frames)
+		, m_maxPool(maxPool) {
+		if (!emulators.size()) {
+			throw std::invalid_argument("Need at least one emulator");
+		}
+		if (!frames) {
+			throw std::invalid_argument("frames must be at least 1");
+		}
+		for (auto emulator : emulators) {
+			m_emulators.emplace_back(emulator.cast<PyRetroEmulator*>());
+		}
+		m_format = m_emulators[0]->screenFormat(crop, gray, downscale);
+		m_frameSize = m_format.outHeight() * m_format.outWidth() * m_format.channels();
+		for (auto* emulator : m_emulators) {
+			if (emulator->m_re.getImageWidth() != m_emulators[0]->m_re.getImageWidth() || emulator->m_re.getImageHeight() != m_emulators[0]->m_re.getImageHeight()) {
+				throw std::invalid_argument("All emulators must have the same resolution");
+			}
+		}
+		for (size_t n = 0; n < m_emulators.size(); ++n) {
+			PyRetroEmulator* emulator = m_emulators[n];
+			m_previous.emplace_back(emulator->m_frameStack, emulator->m_frameStackSlot);
+			emulator->m_frameStack = this;
+			emulator->m_frameStackSlot = n;
+		}
+
+		// Every frame is stored twice, k slots apart, so that the last k frames
+		// are always a contiguous run of slots starting at m_index
+		m_buffer = py::array_t<uint8_t>(py::array::ShapeContainer{ 2L * frames, static_cast<long>(m_emulators.size()), m_format.outHeight(), m_format.outWidth(), m_format.channels() });
+		if (maxPool) {
+			m_last.resize(m_frameSize * m_emulators.size());
+		}
+		py::gil_scoped_release release;
+		for (size_t n = 0; n < m_emulators.size(); ++n) {
+			resetFrames(n);
+		}
+	}
+
+	~PyFrameStack() {
+		for (size_t n = 0; n < m_emulators.size(); ++n) {
+			PyRetroEmulator* emulator = m_emulators[n];
+			if (emulator->m_frameStack == this) {
+				std::tie(emulator->m_frameStack, emulator->m_frameStackSlot) = m_previous[n];
+				continue;
+			}
+			// Another stack took over since, so unlink this one from the chain
+			PyFrameStack* stack = emulator->m_frameStack;
+			size_t slot = emulator->m_frameStackSlot;
+			while (stack) {
+				auto& previous = stack->m_previous[slot];
+				if (previous.first == this) {
+					previous = m_previous[n];
+					break;
+				}
+				std::tie(stack, slot) = previous;
+			}
+		}
+	}
+
+	size_t size() const {
+		return m_emulators.size();
+	}
+
+	uint8_t* frame(size_t n, size_t slot) {
+		return &m_buffer.mutable_data()[(slot * m_emulators.size() + n) * m_frameSize];
+	}
+
+	void capture(size_t n) {
+		if (m_maxPool) {
+			m_emulators[n]->writeScreen(&m_last[n * m_frameSize], m_format);
+		}
+	}
+
+	void writeFrame(size_t n) {
+		uint8_t* slot = frame(n, m_index);
+		m_emulators[n]->writeScreen(slot, m_format);
+		if (m_maxPool) {
+			// Pool against the frame before this one to hide sprite flicker
+			uint8_t* last = &m_last[n * m_frameSize];
+			for (size_t i = 0; i < m_frameSize; ++i) {
+				uint8_t current = slot[i];
+				slot[i] = std::max(current, last[i]);
+				last[i] = current;
+			}
+		}
+		memcpy(frame(n, m_index + m_frames), slot, m_frameSize);
+	}
+
+	void advance() {
+		m_index = (m_index + 1) % m_frames;
+	}
+
+	void resetFrames(size_t n) {
+		uint8_t* first = frame(n, 0);
+		m_emulators[n]->writeScreen(first, m_format);
+		for (size_t slot = 1; slot < 2 * m_frames; ++slot) {
+			memcpy(frame(n, slot), first, m_frameSize);
+		}
+		if (m_maxPool) {
+			memcpy(&m_last[n * m_frameSize], first, m_frameSize);
+		}
+	}
+
+	py::array_t<uint8_t> view() {
+		long n = m_emulators.size();
+		long frameSize = m_frameSize;
+		py::array_t<uint8_t> arr(
+			py::array::ShapeContainer{ n, static_cast<long>(m_frames), m_format.outHeight(), m_format.outWidth(), m_format.channels() },
+			py::array::StridesContainer{ frameSize, n * frameSize, m_format.outWidth() * m_format.channels(), m_format.channels(), 1L },
+			frame(0, m_index), m_buffer);
+		arr.attr("setflags")(py::arg("write") = false);
+		return arr;
+	}
+
+	py::array_t<uint8_t> push() {
+		{
+			py::gil_scoped_release release;
+			for (size_t n = 0; n < m_emulators.size(); ++n) {
+				writeFrame(n);
+			}
+			advance();
+		}
+		return view();
+	}
+
+	py::array_t<uint8_t> reset(py::object index) {
+		{
+			py::gil_scoped_release release;
+			if (index.is_none()) {
+				for (size_t n = 0; n < m_emulators.size(); ++n) {
+					resetFrames(n);
+				}
+			} else {
+				size_t n = index.cast<size_t>();
+				if (n >= m_emulators.size()) {
+					throw std::out_of_range("index out of range");
+				}
+				resetFrames(n);
+			}
+		}
+		return view();
+	}
+};
+
 struct PyMemoryView {
 	Retro::AddressSpace& m_mem;
 	PyMemoryView(Retro::AddressSpace& mem)
@@ -221,8 +490,6 @@ struct PyGameData {
 	Retro::Scenario m_scen{ m_data };
 
 	bool load(py::handle data = py::none(), py::handle scen = py::none()) {
-		ScriptContext::reset();
-
 		bool success = true;
 		if (!data.is_none()) {
 			success = success && m_data.load(py::str(data));
@@ -253,6 +520,16 @@ struct PyGameData {
 		return m_scen.filterAction(action);
 	}
 
+	py::array_t<int64_t> filterActions(py::array_t<int64_t, py::array::c_style | py::array::forcecast> actions) const {
+		py::array_t<int64_t> filtered(std::vector<ssize_t>(actions.shape(), actions.shape() + actions.ndim()));
+		const int64_t* in = actions.data();
+		int64_t* out = filtered.mutable_data();
+		for (ssize_t i = 0; i < actions.size(); ++i) {
+			out[i] = m_scen.filterAction(in[i]);
+		}
+		return filtered;
+	}
+
 	py::list validActions() const {
 		py::list outer;
 		for (const auto& action : m_scen.validActions()) {
@@ -270,6 +547,14 @@ struct PyGameData {
 		m_scen.update();
 	}
 
+	bool sparseSnapshots() const {
+		return m_data.sparseSnapshots();
+	}
+
+	void setSparseSnapshots(bool sparse) {
+		m_data.setSparseSnapshots(sparse);
+	}
+
 	py::object lookupValue(py::str name) const {
 		try {
 			Variant data = m_data.lookupValue(name);
@@ -390,29 +675,150 @@ struct PyGameData {
 	}
 };
 
+struct PyInfoLookup {
+	PyGameData* m_data;
+	std::vector<Retro::Variable> m_vars;
+	std::vector<size_t> m_varSlots;
+	// Names that aren't memory variables, such as ones set by scripts, are
+	// looked up by name on every read instead, and read as 0 until they exist
+	std::vector<std::pair<size_t, string>> m_custom;
+	size_t m_size;
+	py::dtype m_dtype;
+
+	PyInfoLookup(PyGameData& data, py::list names)
+		: m_data(&data)
+		, m_size(names.size())
+		, m_dtype(py::dtype::of<int64_t>()) {
+		// Resolve the names once, so every lookup is a straight walk over (address, type) pairs
+		py::list formats;
+		py::list offsets;
+		for (size_t i = 0; i < names.size(); ++i) {
+			string name = py::str(names[i]);
+			try {
+				m_vars.emplace_back(data.m_data.getVariable(name));
+				m_varSlots.emplace_back(i);
+			} catch (std::invalid_argument&) {
+				m_custom.emplace_back(i, name);
+			}
+			formats.append(py::str("<i8"));
+			offsets.append(i * sizeof(int64_t));
+		}
+		m_dtype = py::dtype(names, formats, offsets, m_size * sizeof(int64_t));
+	}
+
+	size_t size() const {
+		return m_size;
+	}
+
+	void read(int64_t* values) const {
+		const AddressSpace& mem = m_data->m_data.addressSpace();
+		for (size_t i = 0; i < m_vars.size(); ++i) {
+			try {
+				values[m_varSlots[i]] = mem[m_vars[i]];
+			} catch (std::out_of_range&) {
+				values[m_varSlots[i]] = 0;
+			}
+		}
+		const GameData& data = m_data->m_data;
+		for (const auto& custom : m_custom) {
+			try {
+				values[custom.first] = data.lookupValue(custom.second);
+			} catch (std::invalid_argument&) {
+				values[custom.first] = 0;
+			}
+		}
+	}
+
+	py::array lookup() const {
+		py::array arr(m_dtype, py::array::ShapeContainer{});
+		read(static_cast<int64_t*>(arr.mutable_data()));
+		return arr;
+	}
+};
+
 void PyRetroEmulator::configureData(PyGameData& data) {
 	m_re.configureData(&data.m_data);
 }
 
+unsigned PyRetroEmulator::runFrames(unsigned frames, PyGameData* data) {
+	unsigned frame;
+	for (frame = 0; frame < frames; ++frame) {
+		m_re.run();
+		if (m_movie) {
+			recordFrame();
+		}
+		// Max pooling needs the frame before the last one. With a single frame
+		// per step that's the previous step's last frame, which the stack
+		// already kept when it was pushed, so there's nothing to capture
+		if (m_frameStack && frame + 2 == frames) {
+			m_frameStack->capture(m_frameStackSlot);
+		}
+		if (!data) {
+			continue;
+		}
+		// Rewards of every frame after the first are summed into the current reward
+		data->m_data.updateRam();
+		{
+			ScriptLock lock(data->m_scen);
+			data->m_scen.update(frame > 0);
+		}
+		if (data->m_scen.isDone()) {
+			++frame;
+			break;
+		}
+	}
+	return frame;
+}
+
+py::object PyRetroEmulator::resetTo(py::object state, PyGameData* data, bool screen, py::object out, py::object crop, bool gray, unsigned downscale) {
+	if (!state.is_none()) {
+		py::bytes bytes = state;
+		if (!m_re.unserialize(PyBytes_AsString(bytes.ptr()), PyBytes_Size(bytes.ptr()))) {
+			throw std::invalid_argument("Could not load state");
+		}
+	}
+	{
+		py::gil_scoped_release release;
+		for (int player = 0; player < MAX_PLAYERS; ++player) {
+			for (int key = 0; key < N_BUTTONS; ++key) {
+				m_re.setKey(player, key, false);
+			}
+		}
+		m_re.run();
+		if (data) {
+			ScriptLock lock(data->m_scen);
+			data->m_scen.restart();
+			data->m_scen.reloadScripts();
+			data->m_data.updateRam();
+			data->m_scen.update();
+		}
+	}
+	if (!screen) {
+		return py::none();
+	}
+	return getScreen(out, crop, gray, downscale);
+}
+
 struct PyMovie {
 	std::unique_ptr<Retro::Movie> m_movie;
 	bool recording = false;
-	PyMovie(py::str name, bool record, unsigned players) {
+	PyMovie(py::str name, bool record, unsigned players, unsigned keyframeInterval) {
 		recording = record;
 		if (record) {
-			m_movie = std::make_unique<MovieBK2>(name, true, players);
+			m_movie = Movie::create(name, players);
 		} else {
 			m_movie = Movie::load(name);
 		}
 		if (!m_movie) {
 			throw std::runtime_error("Could not load movie");
 		}
+		m_movie->setKeyframeInterval(keyframeInterval);
 	}
 
 	void configure(py::str name, const PyRetroEmulator& emu) {
 		if (recording) {
-			static_cast<MovieBK2*>(m_movie.get())->setGameName(name);
-			static_cast<MovieBK2*>(m_movie.get())->loadKeymap(emu.m_re.core());
+			m_movie->setGameName(name);
+			m_movie->setPlatform(emu.m_re.core());
 		}
 	}
 
@@ -424,7 +830,33 @@ struct PyMovie {
 		return m_movie->step();
 	}
 
+	bool seek(size_t frame) {
+		return m_movie->seek(frame);
+	}
+
+	size_t frame() const {
+		return m_movie->frame();
+	}
+
+	py::object frameCount() const {
+		int64_t frames = m_movie->frameCount();
+		if (frames < 0) {
+			return py::none();
+		}
+		return py::int_(frames);
+	}
+
+	py::tuple getKeyframe(size_t frame) {
+		size_t keyframe = 0;
+		std::vector<uint8_t> data;
+		if (!m_movie->getKeyframe(frame, &keyframe, &data)) {
+			throw std::runtime_error("Movie has no state to start from");
+		}
+		return py::make_tuple(keyframe, py::bytes(reinterpret_cast<const char*>(data.data()), data.size()));
+	}
+
 	void close() {
+		py::gil_scoped_release release;
 		m_movie->close();
 	}
 
@@ -440,6 +872,32 @@ struct PyMovie {
 		return m_movie->setKey(key, set, player);
 	}
 
+	void setKeys(py::array_t<uint8_t> mask, unsigned player) {
+		if (mask.size() > N_BUTTONS) {
+			throw std::runtime_error("mask.size() > N_BUTTONS");
+		}
+		if (player >= MAX_PLAYERS) {
+			throw std::runtime_error("player >= MAX_PLAYERS");
+		}
+		uint16_t keys = 0;
+		for (int key = 0; key < mask.size(); ++key) {
+			keys |= (mask.data()[key] != 0) << key;
+		}
+		m_movie->setKeys(keys, player);
+	}
+
+	static void waitForWrites() {
+		py::gil_scoped_release release;
+		MovieBK2::waitForWrites();
+	}
+
+	static bool convert(py::str source, py::str dest) {
+		std::string sourcePath = source;
+		std::string destPath = dest;
+		py::gil_scoped_release release;
+		return Movie::convert(sourcePath, destPath);
+	}
+
 	py::bytes getState() {
 		std::vector<uint8_t> data;
 		m_movie->getState(&data);
@@ -451,6 +909,403 @@ struct PyMovie {
 	}
 };
 
+void PyRetroEmulator::recordFrame() {
+	for (unsigned player = 0; player < m_movie->players(); ++player) {
+		uint16_t keys = 0;
+		for (int key = 0; key < N_BUTTONS; ++key) {
+			keys |= m_re.getKey(player, key) << key;
+		}
+		m_movie->setKeys(keys, player);
+	}
+	m_movie->step();
+	unsigned interval = m_movie->keyframeInterval();
+	if (interval && m_movie->frame() % interval == 0) {
+		m_keyframe.resize(m_re.serializeSize());
+		if (m_re.serialize(m_keyframe.data(), m_keyframe.size())) {
+			m_movie->addKeyframe(m_keyframe.data(), m_keyframe.size());
+		}
+	}
+}
+
+void PyRetroEmulator::setMovie(py::object movie) {
+	if (movie.is_none()) {
+		m_movie = nullptr;
+		m_movieObject = py::none();
+		return;
+	}
+	PyMovie* pyMovie = movie.cast<PyMovie*>();
+	if (!pyMovie->recording) {
+		throw std::invalid_argument("Only a movie that is being recorded can be attached");
+	}
+	// Holding a reference keeps the movie open for as long as it is attached
+	m_movieObject = movie;
+	m_movie = pyMovie->m_movie.get();
+}
+
+py::dict PyRetroEmulator::playMovie(PyMovie& pyMovie, PyGameData* data, PyInfoLookup* info, int64_t limit, py::object screens, py::object crop, bool gray, unsigned downscale) {
+	if (pyMovie.recording) {
+		throw std::invalid_argument("Only a movie that is being played back can be played");
+	}
+	if (info && info->m_data != data) {
+		throw std::invalid_argument("info must look up variables in data");
+	}
+	ScreenFormat format;
+	uint8_t* screenData = nullptr;
+	size_t screenSize = 0;
+	if (!screens.is_none()) {
+		// Screens go straight into the caller's array, which can be a memory
+		// map, one row per frame
+		format = screenFormat(crop, gray, downscale);
+		if (!py::array_t<uint8_t>::check_(screens)) {
+			throw std::invalid_argument("screens must be a uint8 array");
+		}
+		py::array_t<uint8_t> arr = screens.cast<py::array_t<uint8_t>>();
+		if (arr.ndim() != 4 || arr.shape(1) != format.outHeight() || arr.shape(2) != format.outWidth() || arr.shape(3) != format.channels()) {
+			throw std::invalid_argument("screens does not match the shape of the screen");
+		}
+		if (!(arr.flags() & py::array::c_style)) {
+			throw std::invalid_argument("screens must be C-contiguous");
+		}
+		if (limit < 0 || limit > arr.shape(0)) {
+			limit = arr.shape(0);
+		}
+		screenData = arr.mutable_data();
+		screenSize = format.outHeight() * format.outWidth() * format.channels();
+	}
+	Movie* movie = pyMovie.m_movie.get();
+	size_t players = movie->players();
+	size_t capacity = 0;
+	if (limit >= 0) {
+		capacity = limit;
+	} else if (movie->frameCount() > static_cast<int64_t>(movie->frame())) {
+		capacity = movie->frameCount() - movie->frame();
+	}
+
+	// Everything is collected a column at a time, sized up front from the
+	// movie's length when it is known
+	std::vector<uint16_t> actions;
+	std::vector<float> rewards;
+	std::vector<uint8_t> done;
+	std::vector<int64_t> values;
+	actions.reserve(capacity * players);
+	if (data) {
+		rewards.reserve(capacity * players);
+		done.reserve(capacity);
+	}
+	if (info) {
+		values.reserve(capacity * info->size());
+	}
+
+	size_t frames = 0;
+	{
+		py::gil_scoped_release release;
+		while ((limit < 0 || frames < static_cast<size_t>(limit)) && movie->step()) {
+			for (unsigned player = 0; player < players; ++player) {
+				uint16_t keys = movie->getKeys(player);
+				actions.push_back(keys);
+				for (int key = 0; key < N_BUTTONS; ++key) {
+					m_re.setKey(player, key, (keys >> key) & 1);
+				}
+			}
+			if (screenData) {
+				// The screen the input was given on, not the one it led to
+				writeScreen(&screenData[frames * screenSize], format);
+			}
+			runFrames(1, data);
+			if (data) {
+				for (unsigned player = 0; player < players; ++player) {
+					rewards.push_back(data->m_scen.currentReward(player));
+				}
+				done.push_back(data->m_scen.isDone());
+			}
+			if (info) {
+				values.resize(values.size() + info->size());
+				info->read(&values[values.size() - info->size()]);
+			}
+			++frames;
+		}
+	}
+
+	py::dict result;
+	py::array_t<uint16_t> actionArray({ static_cast<long>(frames), static_cast<long>(players) });
+	memcpy(actionArray.mutable_data(), actions.data(), actions.size() * sizeof(uint16_t));
+	result["actions"] = actionArray;
+	if (data) {
+		py::array_t<float> rewardArray({ static_cast<long>(frames), static_cast<long>(players) });
+		memcpy(rewardArray.mutable_data(), rewards.data(), rewards.size() * sizeof(float));
+		py::array_t<bool> doneArray(static_cast<long>(frames));
+		memcpy(doneArray.mutable_data(), done.data(), done.size());
+		result["rewards"] = rewardArray;
+		result["done"] = doneArray;
+	}
+	if (info) {
+		py::array infoArray(info->m_dtype, py::array::ShapeContainer{ static_cast<long>(frames) });
+		memcpy(infoArray.mutable_data(), values.data(), values.size() * sizeof(int64_t));
+		result["info"] = infoArray;
+	}
+	return result;
+}
+
+struct PyRetroEmulatorBatch {
+	std::vector<PyRetroEmulator*> m_emulators;
+	std::vector<PyGameData*> m_data;
+	unsigned m_players;
+	bool m_filter;
+	unsigned m_frameskip;
+	ScreenFormat m_format;
+	PyFrameStack* m_frameStack;
+	bool m_info;
+
+	PyRetroEmulatorBatch(py::list emulators, py::list data, unsigned players, bool filter, unsigned frameskip, py::object crop, bool gray, unsigned downscale, PyFrameStack* frameStack, bool info)
+		: m_players(players)
+		, m_filter(filter)
+		, m_frameskip(frameskip)
+		, m_frameStack(frameStack)
+		, m_info(info) {
+		if (emulators.size() != data.size() || !emulators.size()) {
+			throw std::invalid_argument("Need one GameData per emulator");
+		}
+		if (!players || players > MAX_PLAYERS) {
+			throw std::invalid_argument("players > MAX_PLAYERS");
+		}
+		if (!frameskip) {
+			throw std::invalid_argument("frameskip must be at least 1");
+		}
+		for (size_t i = 0; i < emulators.size(); ++i) {
+			m_emulators.emplace_back(emulators[i].cast<PyRetroEmulator*>());
+			m_data.emplace_back(data[i].cast<PyGameData*>());
+		}
+		long width = m_emulators[0]->m_re.getImageWidth();
+		long height = m_emulators[0]->m_re.getImageHeight();
+		for (auto* emulator : m_emulators) {
+			if (emulator->m_re.getImageWidth() != width || emulator->m_re.getImageHeight() != height) {
+				throw std::invalid_argument("All emulators must have the same resolution");
+			}
+		}
+		m_format = m_emulators[0]->screenFormat(crop, gray, downscale);
+		if (frameStack && frameStack->m_emulators != m_emulators) {
+			throw std::invalid_argument("frame_stack must stack the same emulators");
+		}
+	}
+
+	size_t size() const {
+		return m_emulators.size();
+	}
+
+	py::tuple step(py::array_t<uint8_t, py::array::c_style | py::array::forcecast> actions) {
+		size_t n = m_emulators.size();
+		if (actions.ndim() != 2 || static_cast<size_t>(actions.shape(0)) != n) {
+			throw std::invalid_argument("actions must have shape (N, buttons)");
+		}
+		size_t width = actions.shape(1);
+		if (width % m_players || width / m_players > N_BUTTONS) {
+			throw std::invalid_argument("actions.shape[1] must be players * buttons");
+		}
+		size_t buttons = width / m_players;
+
+		py::array_t<uint8_t> obs;
+		uint8_t* obsData = nullptr;
+		if (!m_frameStack) {
+			obs = py::array_t<uint8_t>(py::array::ShapeContainer{ static_cast<long>(n), m_format.outHeight(), m_format.outWidth(), m_format.channels() });
+			obsData = obs.mutable_data();
+		}
+		py::array_t<float> rew({ static_cast<long>(n), static_cast<long>(m_players) });
+		py::array_t<bool> done(n);
+		const uint8_t* actionData = actions.data();
+		float* rewData = rew.mutable_data();
+		bool* doneData = done.mutable_data();
+		size_t frameSize = m_format.outHeight() * m_format.outWidth() * m_format.channels();
+
+		{
+			py::gil_scoped_release release;
+			for (size_t i = 0; i < n; ++i) {
+				Emulator& re = m_emulators[i]->m_re;
+				PyGameData& data = *m_data[i];
+				for (unsigned p = 0; p < m_players; ++p) {
+					const uint8_t* mask = &actionData[i * width + p * buttons];
+					uint16_t action = 0;
+					for (size_t key = 0; key < buttons; ++key) {
+						action |= (mask[key] ? 1 : 0) << key;
+					}
+					if (m_filter) {
+						ScriptLock lock(data.m_scen);
+						action = data.m_scen.filterAction(action);
+					}
+					for (size_t key = 0; key < buttons; ++key) {
+						re.setKey(p, key, (action >> key) & 1);
+					}
+				}
+				// runFrames takes the ScriptLock itself around scenario updates
+				m_emulators[i]->runFrames(m_frameskip, &data);
+				if (m_frameStack) {
+					m_frameStack->writeFrame(i);
+				} else {
+					m_emulators[i]->writeScreen(&obsData[i * frameSize], m_format);
+				}
+				ScriptLock lock(data.m_scen);
+				for (unsigned p = 0; p < m_players; ++p) {
+					rewData[i * m_players + p] = data.m_scen.currentReward(p);
+				}
+				doneData[i] = data.m_scen.isDone();
+			}
+		}
+
+		if (m_frameStack) {
+			m_frameStack->advance();
+			obs = m_frameStack->view();
+		}
+
+		if (!m_info) {
+			return py::make_tuple(obs, rew, done, py::none());
+		}
+		py::list info;
+		for (const auto* data : m_data) {
+			info.append(data->lookupAll());
+		}
+		return py::make_tuple(obs, rew, done, info);
+	}
+};
+
+struct PyStatePool {
+	PyRetroEmulator* m_emulator;
+	size_t m_slotSize;
+	size_t m_capacity;
+	std::vector<uint8_t> m_buffer;
+	std::vector<size_t> m_sizes;
+	std::vector<int64_t> m_keys;
+	std::vector<size_t> m_free;
+	std::unordered_map<int64_t, size_t> m_slots;
+	size_t m_spare;
+
+	// Slots in use, least recently used first
+	std::list<size_t> m_lru;
+	std::vector<std::list<size_t>::iterator> m_lruPos;
+
+	PyStatePool(PyRetroEmulator& emulator, size_t slots, size_t maxBytes)
+		: m_emulator(&emulator)
+		, m_slotSize(emulator.m_re.serializeSize()) {
+		if (!m_slotSize) {
+			throw std::runtime_error("Core does not support savestates");
+		}
+		if (!slots && !maxBytes) {
+			throw std::invalid_argument("Need slots or max_bytes");
+		}
+		// One slot more than the capacity is kept spare for saves to be written
+		// into, and it counts towards max_bytes
+		m_capacity = maxBytes ? maxBytes / m_slotSize : slots + 1;
+		if (m_capacity < 2) {
+			throw std::invalid_argument("max_bytes is too small to hold a single state");
+		}
+		--m_capacity;
+		if (slots && slots < m_capacity) {
+			m_capacity = slots;
+		}
+		m_spare = m_capacity;
+		m_buffer.resize((m_capacity + 1) * m_slotSize);
+		m_sizes.resize(m_capacity + 1);
+		m_keys.resize(m_capacity + 1);
+		m_lruPos.resize(m_capacity + 1);
+		m_slots.reserve(m_capacity);
+		for (size_t slot = m_capacity; slot--;) {
+			m_free.emplace_back(slot);
+		}
+	}
+
+	py::object save(int64_t key) {
+		size_t size = m_emulator->m_re.serializeSize();
+		if (size > m_slotSize) {
+			throw std::invalid_argument("State is larger than the pool's slots");
+		}
+		// Serialize into the spare slot first, so a failure leaves the pool as it was
+		size_t slot = m_spare;
+		bool success;
+		{
+			py::gil_scoped_release release;
+			success = m_emulator->m_re.serialize(&m_buffer[slot * m_slotSize], size);
+		}
+		if (!success) {
+			throw std::runtime_error("Could not save state");
+		}
+
+		// Whichever slot the new state replaces becomes the spare one
+		py::object evicted = py::none();
+		auto found = m_slots.find(key);
+		if (found != m_slots.end()) {
+			m_spare = found->second;
+			m_lru.erase(m_lruPos[m_spare]);
+			found->second = slot;
+		} else {
+			if (m_free.size()) {
+				m_spare = m_free.back();
+				m_free.pop_back();
+			} else {
+				m_spare = m_lru.front();
+				evicted = py::int_(m_keys[m_spare]);
+				m_slots.erase(m_keys[m_spare]);
+				m_lru.pop_front();
+			}
+			m_slots[key] = slot;
+		}
+		m_keys[slot] = key;
+		m_lruPos[slot] = m_lru.emplace(m_lru.end(), slot);
+		m_sizes[slot] = size;
+		return evicted;
+	}
+
+	bool restore(int64_t key) {
+		auto found = m_slots.find(key);
+		if (found == m_slots.end()) {
+			throw py::key_error(std::to_string(key));
+		}
+		size_t slot = found->second;
+		m_lru.splice(m_lru.end(), m_lru, m_lruPos[slot]);
+		py::gil_scoped_release release;
+		return m_emulator->m_re.unserialize(&m_buffer[slot * m_slotSize], m_sizes[slot]);
+	}
+
+	py::bytes get(int64_t key) const {
+		auto found = m_slots.find(key);
+		if (found == m_slots.end()) {
+			throw py::key_error(std::to_string(key));
+		}
+		return py::bytes(reinterpret_cast<const char*>(&m_buffer[found->second * m_slotSize]), m_sizes[found->second]);
+	}
+
+	bool discard(int64_t key) {
+		auto found = m_slots.find(key);
+		if (found == m_slots.end()) {
+			return false;
+		}
+		size_t slot = found->second;
+		m_lru.erase(m_lruPos[slot]);
+		m_slots.erase(found);
+		m_free.emplace_back(slot);
+		return true;
+	}
+
+	void clear() {
+		while (m_lru.size()) {
+			discard(m_keys[m_lru.front()]);
+		}
+	}
+
+	py::list keys() const {
+		py::list keys;
+		for (size_t slot : m_lru) {
+			keys.append(m_keys[slot]);
+		}
+		return keys;
+	}
+
+	bool contains(int64_t key) const {
+		return m_slots.count(key);
+	}
+
+	size_t size() const {
+		return m_slots.size();
+	}
+};
+
 py::str corePath(py::handle hint = py::none()) {
 	return Retro::corePath(py::str(hint));
 }
@@ -465,10 +1320,14 @@ PYBIND11_MODULE(_retro, m) {
 	py::class_<PyRetroEmulator>(m, "RetroEmulator")
 		.def(py::init<const string&>())
 		.def("step", &PyRetroEmulator::step)
+		.def("step_n", &PyRetroEmulator::stepN, py::arg("frames"), py::arg("data") = nullptr)
 		.def("set_button_mask", &PyRetroEmulator::setButtonMask, py::arg("mask"), py::arg("player") = 0)
 		.def("get_state", &PyRetroEmulator::getState)
 		.def("set_state", &PyRetroEmulator::setState)
-		.def("get_screen", &PyRetroEmulator::getScreen)
+		.def("set_movie", &PyRetroEmulator::setMovie, py::arg("movie"))
+		.def("play_movie", &PyRetroEmulator::playMovie, py::arg("movie"), py::arg("data") = nullptr, py::arg("info") = nullptr, py::arg("frames") = -1, py::arg("screens") = py::none(), py::arg("crop") = py::none(), py::arg("gray") = false, py::arg("downscale") = 1)
+		.def("reset_to", &PyRetroEmulator::resetTo, py::arg("state") = py::none(), py::arg("data") = nullptr, py::arg("screen") = true, py::arg("out") = py::none(), py::arg("crop") = py::none(), py::arg("gray") = false, py::arg("downscale") = 1)
+		.def("get_screen", &PyRetroEmulator::getScreen, py::arg("out") = py::none(), py::arg("crop") = py::none(), py::arg("gray") = false, py::arg("downscale") = 1)
 		.def("get_screen_rate", &PyRetroEmulator::getScreenRate)
 		.def("get_audio", &PyRetroEmulator::getAudio)
 		.def("get_audio_rate", &PyRetroEmulator::getAudioRate)
@@ -478,6 +1337,20 @@ PYBIND11_MODULE(_retro, m) {
 		.def("clear_cheats", &PyRetroEmulator::clearCheats)
 		.def_static("load_core_info", &PyRetroEmulator::loadCoreInfo);
 
+	py::class_<PyStatePool>(m, "StatePool")
+		.def(py::init<PyRetroEmulator&, size_t, size_t>(), py::arg("emulator"), py::arg("slots") = 0, py::arg("max_bytes") = 0, py::keep_alive<1, 2>())
+		.def("save", &PyStatePool::save, py::arg("key"))
+		.def("restore", &PyStatePool::restore, py::arg("key"))
+		.def("get", &PyStatePool::get, py::arg("key"))
+		.def("discard", &PyStatePool::discard, py::arg("key"))
+		.def("clear", &PyStatePool::clear)
+		.def("keys", &PyStatePool::keys)
+		.def("__contains__", &PyStatePool::contains)
+		.def("__len__", &PyStatePool::size)
+		.def_readonly("capacity", &PyStatePool::m_capacity)
+		.def_readonly("slot_size", &PyStatePool::m_slotSize)
+		.def_property_readonly("nbytes", [](const PyStatePool& pool) { return pool.m_buffer.size(); });
+
 	py::class_<PyMemoryView>(m, "Memory")
 		.def(py::init<Retro::AddressSpace&>())
 		.def("extract", &PyMemoryView::extract, py::arg("address"), py::arg("type"))
@@ -499,6 +1372,7 @@ PYBIND11_MODULE(_retro, m) {
 		.def("save", &PyGameData::save, py::arg("data") = py::none(), py::arg("scen") = py::none())
 		.def("reset", &PyGameData::reset)
 		.def("filter_action", &PyGameData::filterAction)
+		.def("filter_actions", &PyGameData::filterActions)
 		.def("valid_actions", &PyGameData::validActions)
 		.def("update_ram", &PyGameData::updateRam)
 		.def("lookup_value", &PyGameData::lookupValue)
@@ -517,19 +1391,44 @@ PYBIND11_MODULE(_retro, m) {
 		.def("total_reward", &PyGameData::totalReward, py::arg("player") = 0)
 		.def("is_done", &PyGameData::isDone)
 		.def("crop_info", &PyGameData::cropInfo, py::arg("player") = 0)
+		.def_property("sparse_snapshots", &PyGameData::sparseSnapshots, &PyGameData::setSparseSnapshots)
 		.def_property_readonly("memory", &PyGameData::memory);
 
+	py::class_<PyInfoLookup>(m, "InfoLookup")
+		.def(py::init<PyGameData&, py::list>(), py::arg("data"), py::arg("names"), py::keep_alive<1, 2>())
+		.def("__len__", &PyInfoLookup::size)
+		.def("__call__", &PyInfoLookup::lookup);
+
 	py::class_<PyMovie>(m, "Movie")
-		.def(py::init<py::str, bool, unsigned>(), py::arg("path"), py::arg("record") = false, py::arg("players") = 1)
+		.def(py::init<py::str, bool, unsigned, unsigned>(), py::arg("path"), py::arg("record") = false, py::arg("players") = 1, py::arg("keyframe_interval") = 0)
 		.def("configure", &PyMovie::configure)
 		.def("get_game", &PyMovie::getGameName)
 		.def("step", &PyMovie::step)
+		.def("seek", &PyMovie::seek, py::arg("frame"))
+		.def("get_keyframe", &PyMovie::getKeyframe, py::arg("frame"))
+		.def_property_readonly("frame", &PyMovie::frame)
+		.def_property_readonly("frames", &PyMovie::frameCount)
 		.def("close", &PyMovie::close)
 		.def_property_readonly("players", &PyMovie::players)
 		.def("get_key", &PyMovie::getKey)
 		.def("set_key", &PyMovie::setKey)
+		.def("set_keys", &PyMovie::setKeys, py::arg("mask"), py::arg("player") = 0)
 		.def("get_state", &PyMovie::getState)
-		.def("set_state", &PyMovie::setState);
+		.def("set_state", &PyMovie::setState)
+		.def_static("wait_for_writes", &PyMovie::waitForWrites)
+		.def_static("convert", &PyMovie::convert, py::arg("source"), py::arg("dest"));
+
+	py::class_<PyFrameStack>(m, "FrameStack")
+		.def(py::init<py::list, unsigned, bool, py::object, bool, unsigned>(), py::arg("emulators"), py::arg("frames"), py::arg("max_pool") = false, py::arg("crop") = py::none(), py::arg("gray") = false, py::arg("downscale") = 1, py::keep_alive<1, 2>())
+		.def("__len__", &PyFrameStack::size)
+		.def("push", &PyFrameStack::push)
+		.def("reset", &PyFrameStack::reset, py::arg("index") = py::none())
+		.def("view", &PyFrameStack::view);
+
+	py::class_<PyRetroEmulatorBatch>(m, "RetroEmulatorBatch")
+		.def(py::init<py::list, py::list, unsigned, bool, unsigned, py::object, bool, unsigned, PyFrameStack*, bool>(), py::arg("emulators"), py::arg("data"), py::arg("players") = 1, py::arg("filter") = false, py::arg("frameskip") = 1, py::arg("crop") = py::none(), py::arg("gray") = false, py::arg("downscale") = 1, py::arg("frame_stack") = nullptr, py::arg("info") = true, py::keep_alive<1, 2>(), py::keep_alive<1, 3>(), py::keep_alive<1, 10>())
+		.def("__len__", &PyRetroEmulatorBatch::size)
+		.def("step", &PyRetroEmulatorBatch::step, py::arg("actions"));
 
 	m.def("core_path", &::corePath, py::arg("hint") = py::none());
 	m.def("data_path", &::dataPath, py::arg("hint") = py::none());
@@ -11,17 +11,7 @@ static unordered_map<string, function<shared_ptr<ScriptContext>()>> s_scriptType
 	make_pair("lua", ScriptLua::create),
 };
 
-static unordered_map<string, shared_ptr<ScriptContext>> s_scriptContexts;
-
-shared_ptr<ScriptContext> ScriptContext::get(const string& type) {
-	if (type.empty() && s_scriptContexts.size() == 1) {
-		return s_scriptContexts.begin()->second;
-	}
-	const auto& foundContext = s_scriptContexts.find(type);
-	if (foundContext != s_scriptContexts.end()) {
-		return foundContext->second;
-	}
-
+shared_ptr<ScriptContext> ScriptContext::create(const string& type) {
 	const auto& found = s_scriptTypes.find(type);
 	if (found == s_scriptTypes.end()) {
 		return nullptr;
@@ -30,22 +20,9 @@ shared_ptr<ScriptContext> ScriptContext::get(const string& type) {
 	if (!context->init()) {
 		return nullptr;
 	}
-	s_scriptContexts[type] = context;
 	return context;
 }
 
-vector<string> ScriptContext::listContexts() {
-	vector<string> contexts;
-	for (const auto& context : s_scriptContexts) {
-		contexts.emplace_back(context.first);
-	}
-	return contexts;
-}
-
-void ScriptContext::reset() {
-	s_scriptContexts.clear();
-}
-
 void ScriptContext::setData(GameData* data) {
 	m_data = data;
 }
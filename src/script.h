@@ -13,9 +13,7 @@ class GameData;
 class Scenario;
 class ScriptContext {
 public:
-	static std::shared_ptr<ScriptContext> get(const std::string& type);
-	static std::vector<std::string> listContexts();
-	static void reset();
+	static std::shared_ptr<ScriptContext> create(const std::string& type);
 
 	virtual void setData(GameData*);
 	virtual void setScenario(const Scenario*);
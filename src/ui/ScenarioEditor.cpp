@@ -275,8 +275,8 @@ void ScenarioEditor::populateScriptLists() {
 	m_ui->doneFunc->clear();
 	m_ui->doneFunc->setEnabled(false);
 
-	for (const auto& contextName : Retro::ScriptContext::listContexts()) {
-		std::shared_ptr<Retro::ScriptContext> context = Retro::ScriptContext::get(contextName);
+	for (const auto& contextName : m_scenario->listScriptContexts()) {
+		std::shared_ptr<Retro::ScriptContext> context = m_scenario->scriptContext(contextName);
 		const auto& funcs = context->listFunctions();
 		if (!funcs.empty()) {
 			m_ui->rewardFuncUse->setEnabled(true);
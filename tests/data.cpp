@@ -123,6 +123,68 @@ TEST(GameData, Delta) {
 	EXPECT_EQI(data.lookupDelta("foo"), 1);
 }
 
+TEST(GameData, DeltaInPlace) {
+	GameData data;
+	uint8_t ram[] = { 1 };
+	data.addressSpace().addBlock(0, sizeof(ram), ram);
+	data.setVariable("foo", {"|u1", 0});
+	data.updateRam();
+	data.updateRam();
+	uint64_t generation = data.ramGeneration();
+
+	for (uint8_t i = 2; i < 6; ++i) {
+		ram[0] = i * i;
+		data.updateRam();
+		EXPECT_EQI(data.lookupDelta("foo"), 2 * i - 1);
+	}
+	EXPECT_EQ(data.ramGeneration(), generation);
+}
+
+TEST(GameData, SparseDelta) {
+	GameData data;
+	uint8_t ram[] = { 1, 2, 3, 4, 5, 6, 7, 8 };
+	data.addressSpace().addBlock(0x10, sizeof(ram), ram);
+	data.setVariable("foo", {"|u1", 0x11});
+	data.setVariable("bar", {"<u2", 0x12});
+	data.setVariable("baz", {"|u1", 0x16});
+	data.setSparseSnapshots(true);
+	data.updateRam();
+
+	EXPECT_EQ(data.currentRam().blocks().size(), 2);
+	EXPECT_TRUE(data.currentRam().hasBlock(0x11));
+	EXPECT_TRUE(data.currentRam().hasBlock(0x13));
+	EXPECT_FALSE(data.currentRam().hasBlock(0x14));
+	EXPECT_TRUE(data.currentRam().hasBlock(0x16));
+
+	ram[1] = 4;
+	ram[2] = 0;
+	ram[3] = 1;
+	ram[6] = 2;
+	data.updateRam();
+	EXPECT_EQI(data.lookupDelta("foo"), 2);
+	EXPECT_EQI(data.lookupDelta("bar"), 0x100 - 0x403);
+	EXPECT_EQI(data.lookupDelta("baz"), -5);
+}
+
+TEST(GameData, SparseSearch) {
+	GameData data;
+	uint8_t ram[] = { 1, 2, 3, 4, 5, 6, 7, 8 };
+	data.addressSpace().addBlock(0x10, sizeof(ram), ram);
+	data.setVariable("foo", {"|u1", 0x11});
+	data.setSparseSnapshots(true);
+	data.updateRam();
+	EXPECT_FALSE(data.currentRam().hasBlock(0x14));
+
+	data.search("five", 5);
+	data.updateRam();
+	EXPECT_TRUE(data.currentRam().hasBlock(0x11));
+	EXPECT_TRUE(data.currentRam().hasBlock(0x14));
+
+	data.removeSearch("five");
+	data.updateRam();
+	EXPECT_FALSE(data.currentRam().hasBlock(0x14));
+}
+
 TEST(Scenario, Measurement) {
 	EXPECT_EQ(Scenario::measurement("", M::ABSOLUTE), M::ABSOLUTE);
 	EXPECT_EQ(Scenario::measurement("", M::DELTA), M::DELTA);
@@ -371,6 +433,56 @@ TEST(Scenario, ManualDone) {
 	EXPECT_TRUE(scen.isDone());
 }
 
+TEST(Scenario, CustomShadowsRam) {
+	GameData data;
+	Scenario scen(data);
+
+	uint8_t ram[] = { 1 };
+	data.addressSpace().addBlock(0, sizeof(ram), ram);
+	data.setValue("foo", static_cast<int64_t>(5));
+	data.setVariable("foo", {"|u1", 0});
+
+	scen.setRewardVariable("foo", { M::ABSOLUTE, O::NOOP, 0, 1, 0 });
+
+	data.updateRam();
+	scen.update();
+	EXPECT_FLOAT_EQ(scen.currentReward(), 5);
+
+	data.restart();
+	data.updateRam();
+	scen.update();
+	EXPECT_FLOAT_EQ(scen.currentReward(), 1);
+}
+
+TEST(Scenario, Remap) {
+	GameData data;
+	Scenario scen(data);
+
+	uint8_t ram[] = { 1 };
+	uint8_t ram2[] = { 5 };
+	data.addressSpace().addBlock(0, sizeof(ram), ram);
+	data.setVariable("foo", {"|u1", 0});
+
+	scen.setRewardVariable("foo", { M::ABSOLUTE, O::NOOP, 0, 1, 0 });
+
+	data.updateRam();
+	scen.update();
+	EXPECT_FLOAT_EQ(scen.currentReward(), 1);
+
+	data.addressSpace().updateBlock(0, static_cast<void*>(ram2));
+	data.updateRam();
+	scen.update();
+	EXPECT_FLOAT_EQ(scen.currentReward(), 5);
+
+	data.setVariable("foo", {"|u1", 1});
+	data.removeVariable("foo");
+	data.setVariable("foo", {"|u1", 0});
+	ram2[0] = 3;
+	data.updateRam();
+	scen.update();
+	EXPECT_FLOAT_EQ(scen.currentReward(), 3);
+}
+
 TEST(Scenario, MultipleReward) {
 	GameData data;
 	Scenario scen(data);
@@ -129,6 +129,25 @@ TEST_P(EmulatorTest, States) {
 	e.run();
 }
 
+TEST_P(EmulatorTest, MultipleInstances) {
+	const auto& param = GetParam();
+	Emulator e;
+	ASSERT_TRUE(e.loadRom("roms/" + param.rom));
+	e.run();
+	{
+		Emulator f;
+		ASSERT_TRUE(f.loadRom("roms/" + param.rom));
+		f.run();
+		e.run();
+
+		vector<uint8_t> v(f.serializeSize());
+		EXPECT_TRUE(f.serialize(v.data(), v.size()));
+		EXPECT_TRUE(e.unserialize(v.data(), v.size()));
+	}
+	e.run();
+	EXPECT_THAT(e.getImageData(), NotNull());
+}
+
 vector<EmulatorTestParam> s_systems{
 	{ "Nes", "Dr88-FamiconIntro.nes" },
 	{ "Snes", "Anthrox-SineDotDemo.sfc" },
@@ -0,0 +1,53 @@
+#include "gtest/gtest.h"
+#include "gmock/gmock.h"
+
+#include "imageops.h"
+
+#include <cstdlib>
+#include <vector>
+
+using namespace std;
+using namespace ::testing;
+
+namespace Retro {
+
+static unsigned grayX888(uint32_t pix) {
+	return (((pix >> 16) & 0xFF) + ((pix >> 8) & 0xFF) + (pix & 0xFF)) / 3;
+}
+
+static unsigned average(unsigned a, unsigned b) {
+	return (a + b + 1) / 2;
+}
+
+TEST(ImageOps, HalveX888ToGray) {
+	const size_t w = 22;
+	const size_t h = 6;
+	// Pad each row so that rows can't be confused with each other
+	const size_t pitch = w + 10;
+	vector<uint32_t> in(pitch * h);
+	srand(1);
+	for (auto& pix : in) {
+		pix = (rand() & 0xFFFF) | (rand() << 16);
+	}
+	in[0] = 0xFFFFFFFF;
+	in[1] = 0x00FFFFFF;
+	in[pitch] = 0x00FFFFFF;
+	in[pitch + 1] = 0xFFFFFFFF;
+
+	vector<uint8_t> out(w / 2 * h / 2);
+	Image inImage(Image::Format::RGBX888, in.data(), w, h, pitch * sizeof(uint32_t));
+	Image outImage(Image::Format::G8, out.data(), w / 2, h / 2, w / 2);
+	inImage.halveTo(&outImage);
+
+	EXPECT_EQ(out[0], 255);
+	for (size_t y = 0; y < h / 2; ++y) {
+		for (size_t x = 0; x < w / 2; ++x) {
+			const uint32_t* row0 = &in[pitch * y * 2 + x * 2];
+			const uint32_t* row1 = &in[pitch * (y * 2 + 1) + x * 2];
+			unsigned gray0 = average(grayX888(row0[0]), grayX888(row0[1]));
+			unsigned gray1 = average(grayX888(row1[0]), grayX888(row1[1]));
+			EXPECT_EQ(out[y * w / 2 + x], average(gray0, gray1)) << "at " << x << ", " << y;
+		}
+	}
+}
+}
@@ -1487,4 +1487,24 @@ TEST(DataTypeEncode, x01020304) {
 	EXPECT_THAT(mem, ElementsAre(3, 4, 1, 2));
 }
 
+
+TEST(AddressSpace, CloneRanges) {
+	uint8_t data[16] {};
+	data[4] = 7;
+	AddressSpace mem;
+	mem.addBlock(0, sizeof(data), static_cast<void*>(data));
+
+	// The second range isn't backed by any block in mem
+	map<size_t, size_t> ranges{ { 4, 2 }, { 0x100, 4 } };
+	AddressSpace snapshot;
+	snapshot.clone(mem, ranges);
+	uint64_t generation = snapshot.generation();
+	EXPECT_EQ(snapshot[4], 7);
+
+	data[4] = 9;
+	snapshot.clone(mem, ranges);
+	EXPECT_EQ(snapshot.generation(), generation);
+	EXPECT_EQ(snapshot[4], 9);
+}
+
 }
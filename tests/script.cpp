@@ -5,7 +5,11 @@
 #include "script.h"
 #include "script-lua.h"
 
+#include <cstdio>
+#include <fstream>
 #include <sstream>
+#include <stdlib.h>
+#include <unistd.h>
 
 using namespace Retro;
 using namespace std;
@@ -104,3 +108,43 @@ TEST(ScriptLua, SetCustomData) {
 	context->callFunction("test");
 	EXPECT_EQ(data.lookupValue("foo"), 1);
 }
+
+TEST(ScriptLua, ScenarioContexts) {
+	char base[] = "/tmp/retro-script-XXXXXX";
+	ASSERT_NE(mkdtemp(base), nullptr);
+	string path = string(base) + "/script.lua";
+	{
+		ofstream script(path);
+		script << "function test()\n"
+				  "	return data.foo\n"
+				  "end\n";
+	}
+
+	GameData dataA;
+	GameData dataB;
+	uint8_t ramA[] = { 1 };
+	uint8_t ramB[] = { 2 };
+	dataA.addressSpace().addBlock(0, sizeof(ramA), ramA);
+	dataB.addressSpace().addBlock(0, sizeof(ramB), ramB);
+	dataA.setVariable("foo", {"|u1", 0});
+	dataB.setVariable("foo", {"|u1", 0});
+	dataA.updateRam();
+	dataB.updateRam();
+
+	Scenario scenA(dataA);
+	Scenario scenB(dataB);
+	scenA.setRewardFunction("test", "lua");
+	scenB.setRewardFunction("test", "lua");
+	ASSERT_TRUE(scenA.loadScript(path, "lua"));
+	ASSERT_TRUE(scenB.loadScript(path, "lua"));
+	EXPECT_NE(scenA.scriptContext("lua"), scenB.scriptContext("lua"));
+
+	scenA.reloadScripts();
+	scenA.update();
+	scenB.update();
+	EXPECT_EQ(scenA.currentReward(), 1);
+	EXPECT_EQ(scenB.currentReward(), 2);
+
+	remove(path.c_str());
+	rmdir(base);
+}
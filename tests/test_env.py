@@ -37,3 +37,572 @@ def test_env_data(testenv):
         assert a != 1
     except KeyError:
         pass
+
+
+def test_env_multiple(testenv):
+    json_path = os.path.join(os.path.dirname(__file__), 'dummy.json')
+    env1 = testenv(info=json_path, scenario=json_path)
+    env2 = testenv(info=json_path, scenario=json_path)
+    obs1 = env1.reset()
+    obs2 = env2.reset()
+    assert obs1.shape == obs2.shape
+    env1.step(env1.action_space.sample())
+    env2.step(env2.action_space.sample())
+    env2.close()
+    obs, _, _, _ = env1.step(env1.action_space.sample())
+    assert obs.shape == env1.observation_space.shape
+
+
+def test_vec_env(testenv):
+    import retro
+    import numpy as np
+    json_path = os.path.join(os.path.dirname(__file__), 'dummy.json')
+    envs = [testenv(info=json_path, scenario=json_path) for _ in range(3)]
+    venv = retro.VecRetroEnv(envs)
+    obs = venv.reset()
+    assert obs.shape == (3, ) + venv.observation_space.shape
+    actions = np.stack([venv.action_space.sample() for _ in range(3)])
+    obs, rew, done, info = venv.step(actions)
+    assert obs.shape == (3, ) + venv.observation_space.shape
+    assert obs.dtype == np.uint8
+    assert rew.shape == (3, )
+    assert done.shape == (3, )
+    assert not done.any()
+    assert len(info) == 3
+    assert all(isinstance(i, dict) for i in info)
+
+
+def test_vec_env_lazy_info(testenv, tmpdir):
+    import retro
+    import json
+    import numpy as np
+    json_path = os.path.join(os.path.dirname(__file__), 'dummy.json')
+    scenario_path = str(tmpdir.join('scenario.json'))
+    with open(scenario_path, 'w') as f:
+        json.dump({
+            'done': {
+                'variables': {
+                    'end': {
+                        'op': 'equal',
+                        'reference': 1
+                    }
+                }
+            }
+        }, f)
+    envs = [
+        testenv(info=json_path, scenario=scenario_path, info_mode='lazy')
+        for _ in range(2)
+    ]
+    venv = retro.VecRetroEnv(envs)
+    venv.reset()
+    envs[1].data['end'] = 1
+    actions = np.stack([venv.action_space.sample() for _ in range(2)])
+    _, _, done, info = venv.step(actions)
+    assert list(done) == [False, True]
+    # The finished environment has been reset, but its info still holds the
+    # values from the step that ended its episode
+    assert 'end' not in envs[1].data.lookup_all()
+    assert info[1]['end'] == 1
+    assert 'end' not in info[0]
+
+
+def test_env_frameskip(testenv):
+    json_path = os.path.join(os.path.dirname(__file__), 'dummy.json')
+    env = testenv(info=json_path, scenario=json_path, frameskip=4)
+    obs = env.reset()
+    assert obs.shape == env.observation_space.shape
+    obs, rew, done, info = env.step(env.action_space.sample())
+    assert obs.shape == env.observation_space.shape
+    assert rew == 0
+    assert not done
+    assert env.em.step_n(4, env.data) == 4
+    assert env.em.step_n(3) == 3
+
+
+def test_env_reuse_obs_buffer(testenv):
+    import numpy as np
+    json_path = os.path.join(os.path.dirname(__file__), 'dummy.json')
+    env = testenv(info=json_path, scenario=json_path, reuse_obs_buffer=True)
+    obs1 = env.reset()
+    assert obs1.shape == env.observation_space.shape
+    obs2, _, _, _ = env.step(env.action_space.sample())
+    assert obs2.shape == env.observation_space.shape
+    assert np.shares_memory(obs1, obs2)
+
+    width, height = env.em.get_resolution()
+    buf = np.zeros((height, width, 3), np.uint8)
+    screen = env.em.get_screen(out=buf)
+    assert screen is buf or np.shares_memory(screen, buf)
+    assert np.array_equal(buf, env.em.get_screen())
+
+
+def test_env_gray_downscale(testenv):
+    import numpy as np
+    json_path = os.path.join(os.path.dirname(__file__), 'dummy.json')
+    env = testenv(
+        info=json_path, scenario=json_path, obs_mode='gray', downscale=2)
+    width, height = env.em.get_resolution()
+    assert env.observation_space.shape == (height // 2, width // 2, 1)
+    obs = env.reset()
+    assert obs.shape == env.observation_space.shape
+    assert obs.dtype == np.uint8
+    obs, _, _, _ = env.step(env.action_space.sample())
+    assert obs.shape == env.observation_space.shape
+
+    screen = env.em.get_screen(crop=(8, 8, 32, 16), gray=True)
+    assert screen.shape == (16, 32, 1)
+    screen = env.em.get_screen(crop=(8, 8, 32, 16))
+    assert screen.shape == (16, 32, 3)
+    assert np.array_equal(screen, env.em.get_screen()[8:24, 8:40])
+
+    # Crops past the edge are clipped like slicing the full screen
+    full = env.em.get_screen()
+    screen = env.em.get_screen(crop=(width - 8, 8, 32, 16))
+    assert np.array_equal(screen, full[8:24, width - 8:])
+    screen = env.em.get_screen(crop=(width + 8, 8, 32, 16))
+    assert screen.shape == (16, 0, 3)
+
+
+def test_env_frame_stack(testenv):
+    import numpy as np
+    json_path = os.path.join(os.path.dirname(__file__), 'dummy.json')
+    env = testenv(
+        info=json_path,
+        scenario=json_path,
+        obs_mode='gray',
+        frame_stack=4,
+        max_pool=True)
+    width, height = env.em.get_resolution()
+    assert env.observation_space.shape == (4, height, width, 1)
+    obs = env.reset()
+    assert obs.shape == env.observation_space.shape
+    assert all(np.array_equal(obs[0], frame) for frame in obs)
+    for _ in range(5):
+        last = obs
+        saved = obs.copy()
+        obs, _, _, _ = env.step(env.action_space.sample())
+        # Earlier observations aren't overwritten by later steps
+        assert np.array_equal(last, saved)
+    assert obs.shape == env.observation_space.shape
+
+    env = testenv(
+        info=json_path,
+        scenario=json_path,
+        frame_stack=2,
+        reuse_obs_buffer=True)
+    obs = env.reset()
+    assert not obs.flags.writeable
+
+    # Max pooling without stacking keeps the unstacked shape
+    env = testenv(info=json_path, scenario=json_path, max_pool=True)
+    width, height = env.em.get_resolution()
+    assert env.observation_space.shape == (height, width, 3)
+    assert env.reset().shape == env.observation_space.shape
+    obs, _, _, _ = env.step(env.action_space.sample())
+    assert obs.shape == env.observation_space.shape
+
+
+def test_env_max_pool_frameskip(testenv):
+    import numpy as np
+    json_path = os.path.join(os.path.dirname(__file__), 'dummy.json')
+    for frameskip in (1, 3):
+        env = testenv(
+            info=json_path,
+            scenario=json_path,
+            frameskip=frameskip,
+            frame_stack=2,
+            max_pool=True)
+        # Steps one frame at a time with the same buttons, to see every frame
+        ref = testenv(info=json_path, scenario=json_path)
+        env.reset()
+        ref.reset()
+        screens = [ref.get_screen()]
+        for _ in range(3):
+            action = env.action_space.sample()
+            obs, _, _, _ = env.step(action)
+            for _ in range(frameskip):
+                ref.step(action)
+                screens.append(ref.get_screen())
+            # The last two emulated frames are pooled, including across the
+            # step boundary when every step is a single frame
+            assert np.array_equal(obs[-1],
+                                  np.maximum(screens[-2], screens[-1]))
+
+
+def test_vec_env_frame_stack(testenv):
+    import retro
+    import numpy as np
+    json_path = os.path.join(os.path.dirname(__file__), 'dummy.json')
+    envs = [
+        testenv(info=json_path, scenario=json_path, frame_stack=3)
+        for _ in range(2)
+    ]
+    venv = retro.VecRetroEnv(envs)
+    obs = venv.reset()
+    assert obs.shape == (2, ) + venv.observation_space.shape
+    actions = np.stack([venv.action_space.sample() for _ in range(2)])
+    obs, _, _, _ = venv.step(actions)
+    assert obs.shape == (2, ) + venv.observation_space.shape
+    assert np.array_equal(obs[0, -1], envs[0].get_screen())
+    # The environments passed in keep their own frame stacks
+    assert envs[0].frames
+    assert envs[0].observation_space.shape == venv.observation_space.shape
+
+    envs = [
+        testenv(info=json_path, scenario=json_path, max_pool=True)
+        for _ in range(2)
+    ]
+    venv = retro.VecRetroEnv(envs)
+    assert venv.reset().shape == (2, ) + venv.observation_space.shape
+    obs, _, _, _ = venv.step(actions)
+    assert obs.shape == (2, ) + venv.observation_space.shape
+
+
+def test_env_info_mode(testenv):
+    json_path = os.path.join(os.path.dirname(__file__), 'dummy.json')
+    env = testenv(info=json_path, scenario=json_path, info_mode='none')
+    env.reset()
+    _, _, _, info = env.step(env.action_space.sample())
+    assert info == {}
+
+    env = testenv(info=json_path, scenario=json_path, info_mode='lazy')
+    env.reset()
+    _, _, _, info = env.step(env.action_space.sample())
+    assert dict(info) == env.data.lookup_all()
+
+    names = [env.system]
+    env = testenv(info=json_path, scenario=json_path, info_mode=names)
+    env.reset()
+    _, _, _, info = env.step(env.action_space.sample())
+    assert info.dtype.names == tuple(names)
+    assert info[env.system] == env.data[env.system]
+
+
+def test_env_info_custom(testenv):
+    json_path = os.path.join(os.path.dirname(__file__), 'dummy.json')
+    names = ['custom']
+    env = testenv(info=json_path, scenario=json_path, info_mode=names)
+    env.reset()
+    _, _, _, info = env.step(env.action_space.sample())
+    assert info['custom'] == 0
+    env.data['custom'] = 5
+    _, _, _, info = env.step(env.action_space.sample())
+    assert info['custom'] == 5
+
+    env = testenv(info=json_path, scenario=json_path, info_mode='lazy')
+    env.reset()
+    env.data['custom'] = 5
+    _, _, _, info = env.step(env.action_space.sample())
+    assert info['custom'] == 5
+    assert 'custom' in list(info)
+
+
+def test_state_pool(testenv):
+    import retro
+    import pytest
+    json_path = os.path.join(os.path.dirname(__file__), 'dummy.json')
+    env = testenv(info=json_path, scenario=json_path)
+    env.reset()
+    pool = retro.StatePool(env.em, slots=2)
+    assert pool.capacity == 2
+    assert pool.slot_size == len(env.em.get_state())
+
+    assert pool.save(1) is None
+    state = env.em.get_state()
+    assert pool.get(1) == state
+    env.step(env.action_space.sample())
+    assert pool.save(2) is None
+    assert pool.restore(1)
+    assert env.em.get_state() == state
+
+    assert pool.save(3) == 2
+    assert pool.keys() == [1, 3]
+    assert 2 not in pool
+    with pytest.raises(KeyError):
+        pool.restore(2)
+    # Saving over a key replaces its state without evicting anything
+    assert pool.save(1) is None
+    assert pool.get(1) == env.em.get_state()
+    assert pool.keys() == [3, 1]
+    assert pool.discard(1)
+    assert len(pool) == 1
+
+    with pytest.raises(ValueError):
+        retro.StatePool(env.em, max_bytes=pool.slot_size - 1)
+    with pytest.raises(ValueError):
+        retro.StatePool(env.em, max_bytes=pool.slot_size)
+
+    # The spare slot saves are written into fits within max_bytes too
+    max_bytes = pool.slot_size * 3 + 1
+    pool = retro.StatePool(env.em, max_bytes=max_bytes)
+    assert pool.capacity == 2
+    assert pool.nbytes <= max_bytes
+
+
+def test_env_state_list(testenv, tmpdir):
+    import gzip
+    json_path = os.path.join(os.path.dirname(__file__), 'dummy.json')
+    env = testenv(info=json_path, scenario=json_path)
+    env.reset()
+    paths = []
+    states = []
+    for i in range(2):
+        env.step(env.action_space.sample())
+        paths.append(str(tmpdir.join('%d.state' % i)))
+        states.append(env.em.get_state())
+        with gzip.open(paths[-1], 'wb') as f:
+            f.write(states[-1])
+
+    env = testenv(paths, info=json_path, scenario=json_path)
+    env.seed(0)
+    seen = set()
+    for _ in range(20):
+        env.reset()
+        seen.add(env.statename)
+        assert env.initial_state == states[paths.index(env.statename)]
+    assert seen == set(paths)
+
+
+def test_env_reset_to(testenv):
+    import numpy as np
+    json_path = os.path.join(os.path.dirname(__file__), 'dummy.json')
+    env = testenv(info=json_path, scenario=json_path)
+    env.reset()
+    state = env.em.get_state()
+    for _ in range(5):
+        env.step(env.action_space.sample())
+
+    ob = env.em.reset_to(state, env.data)
+    assert np.array_equal(ob, env.em.get_screen())
+    after = env.em.get_state()
+    env.step(env.action_space.sample())
+    assert env.em.reset_to(state, env.data, screen=False) is None
+    assert env.em.get_state() == after
+    assert env.data.total_reward() == 0
+
+
+def test_env_batch_actions(testenv):
+    import retro
+    import numpy as np
+    json_path = os.path.join(os.path.dirname(__file__), 'dummy.json')
+    for actions in retro.Actions:
+        env = testenv(
+            info=json_path,
+            scenario=json_path,
+            use_restricted_actions=actions)
+        batch = [env.action_space.sample() for _ in range(8)]
+        expected = np.stack(
+            [np.concatenate(env.action_to_array(a)) for a in batch])
+        assert np.array_equal(
+            env.batch_action_to_array(np.array(batch)), expected)
+        if actions == retro.Actions.FILTERED:
+            for a in batch:
+                mask = sum(int(b) << i for i, b in enumerate(a))
+                mask = env.data.filter_action(mask)
+                bits = [(mask >> i) & 1 for i in range(env.num_buttons)]
+                assert list(env.action_to_array(a)[0]) == bits
+
+
+def test_env_record_movie(testenv, tmpdir):
+    import retro
+    json_path = os.path.join(os.path.dirname(__file__), 'dummy.json')
+    env = testenv(info=json_path, scenario=json_path, frameskip=2)
+    env.reset()
+    path = str(tmpdir.join('movie.bk2'))
+    env.record_movie(path)
+    actions = [env.action_space.sample() for _ in range(4)]
+    for a in actions:
+        env.step(a)
+    env.stop_record()
+
+    named = {
+        'A', 'B', 'C', 'X', 'Y', 'Z', 'START', 'SELECT', 'MODE', 'UP', 'DOWN',
+        'LEFT', 'RIGHT', 'L', 'R', 'BUTTON'
+    }
+    movie = retro.Movie(path)
+    for a in actions:
+        buttons = env.action_to_array(a)[0]
+        for _ in range(env.frameskip):
+            assert movie.step()
+            for i, name in enumerate(env.buttons):
+                if name in named:
+                    assert movie.get_key(i, 0) == bool(buttons[i])
+    assert not movie.step()
+
+
+def test_env_close_movie(testenv, tmpdir):
+    import zipfile
+    json_path = os.path.join(os.path.dirname(__file__), 'dummy.json')
+    env = testenv(info=json_path, scenario=json_path)
+    env.reset()
+    path = str(tmpdir.join('movie.bk2'))
+    env.record_movie(path)
+    for _ in range(4):
+        env.step(env.action_space.sample())
+    env.close()
+
+    # Read the archive directly rather than through retro.Movie, which
+    # would wait for the background writer itself
+    with zipfile.ZipFile(path) as archive:
+        assert archive.testzip() is None
+        header = archive.read('Header.txt').decode()
+        log = archive.read('Input Log.txt').decode()
+    assert 'Frames 4' in header.splitlines()
+    assert sum(line.startswith('|') for line in log.splitlines()) == 4
+
+
+def test_env_movie_convert(testenv, tmpdir):
+    import retro
+    json_path = os.path.join(os.path.dirname(__file__), 'dummy.json')
+    env = testenv(info=json_path, scenario=json_path)
+    env.reset()
+    path = str(tmpdir.join('movie.rmv'))
+    env.record_movie(path)
+    for _ in range(8):
+        env.step(env.action_space.sample())
+    env.stop_record()
+
+    bk2_path = str(tmpdir.join('movie.bk2'))
+    rmv_path = str(tmpdir.join('converted.rmv'))
+    assert retro.Movie.convert(path, bk2_path)
+    assert retro.Movie.convert(bk2_path, rmv_path)
+
+    movies = [retro.Movie(p) for p in (path, bk2_path, rmv_path)]
+    assert len(set(m.get_game() for m in movies)) == 1
+    assert len(set(m.get_state() for m in movies)) == 1
+    while movies[0].step():
+        assert movies[1].step()
+        assert movies[2].step()
+        for i in range(env.num_buttons):
+            assert len(set(m.get_key(i, 0) for m in movies)) == 1
+    assert not movies[1].step()
+    assert not movies[2].step()
+
+
+def test_env_movie_seek(testenv, tmpdir):
+    import retro
+    from retro.scripts.playback_movie import seek_movie
+    json_path = os.path.join(os.path.dirname(__file__), 'dummy.json')
+    env = testenv(info=json_path, scenario=json_path)
+    env.reset()
+    path = str(tmpdir.join('movie.rmv'))
+    env.record_movie(path, keyframe_interval=4)
+    env.movie.set_state(env.em.get_state())
+    states = [env.em.get_state()]
+    for _ in range(10):
+        env.step(env.action_space.sample())
+        states.append(env.em.get_state())
+    env.stop_record()
+
+    movie = retro.Movie(path)
+    assert movie.frames == 10
+    assert movie.get_keyframe(6)[0] == 4
+    assert movie.get_keyframe(3)[0] == 0
+    for frame in (7, 2, 10, 0, 9):
+        seek_movie(env, movie, frame)
+        assert movie.frame == frame
+        assert env.em.get_state() == states[frame]
+
+    # Converting keeps the keyframes, whatever case the extension is in
+    converted = str(tmpdir.join('converted.RMV'))
+    assert retro.Movie.convert(path, converted)
+    movie = retro.Movie(converted)
+    assert movie.get_keyframe(6) == retro.Movie(path).get_keyframe(6)
+
+
+def test_env_analyze_movie(testenv, tmpdir):
+    import retro
+    from retro.scripts.playback_movie import analyze_movie
+    json_path = os.path.join(os.path.dirname(__file__), 'dummy.json')
+    env = testenv(info=json_path, scenario=json_path)
+    env.reset()
+    path = str(tmpdir.join('movie.rmv'))
+    env.record_movie(path)
+    env.movie.set_state(env.em.get_state())
+    actions = [env.action_space.sample() for _ in range(6)]
+    rewards = []
+    for a in actions:
+        rewards.append(env.step(a)[1])
+    env.stop_record()
+
+    movie = retro.Movie(path)
+    env.em.set_state(movie.get_state())
+    env.data.reset()
+    results = analyze_movie(env, movie)
+    assert results['actions'].shape == (6, env.num_buttons)
+    for a, buttons in zip(actions, results['actions']):
+        assert list(env.action_to_array(a)[0]) == list(buttons)
+    assert list(results['rewards'][:, 0]) == rewards
+    assert len(results['done']) == 6
+    assert set(results['info']) == set(env.data.list_variables())
+
+
+def test_env_play_movie_screens(testenv, tmpdir):
+    import retro
+    import numpy as np
+    json_path = os.path.join(os.path.dirname(__file__), 'dummy.json')
+    env = testenv(info=json_path, scenario=json_path)
+    env.reset()
+    path = str(tmpdir.join('movie.rmv'))
+    env.record_movie(path)
+    env.movie.set_state(env.em.get_state())
+    screens = []
+    for _ in range(6):
+        env.step(env.action_space.sample())
+        screens.append(env.em.get_screen(gray=True))
+    env.stop_record()
+
+    movie = retro.Movie(path)
+    env.em.set_state(movie.get_state())
+    env.data.reset()
+    out = np.zeros((6, ) + screens[0].shape, dtype=np.uint8)
+    results = env.em.play_movie(
+        movie, env.data, None, 6, screens=out, gray=True)
+    assert len(results['actions']) == 6
+    # Each row is the screen the frame's buttons were pressed on, which is
+    # the one the previous frame led to
+    assert np.array_equal(out[1:], np.stack(screens[:-1]))
+
+
+def test_export_dataset(testenv, tmpdir, monkeypatch):
+    import retro
+    import numpy as np
+    from retro.scripts import export_dataset
+    json_path = os.path.join(os.path.dirname(__file__), 'dummy.json')
+    env = testenv(info=json_path, scenario=json_path)
+    env.reset()
+    path = str(tmpdir.join('movie.rmv'))
+    env.record_movie(path)
+    env.movie.set_state(env.em.get_state())
+    for _ in range(10):
+        env.step(env.action_space.sample())
+    env.stop_record()
+
+    # Movies are replayed through retro.make, which needs the dummy data
+    get_file_path = retro.data.get_file_path
+    monkeypatch.setattr(
+        retro.data, 'get_file_path', lambda game, file, *args, **kwargs:
+        json_path if file.endswith('.json') else get_file_path(game, file))
+
+    out = str(tmpdir.join('dataset'))
+    shards = export_dataset.export_movie(
+        path, out, shard_frames=4, gray=True, name='first')
+    # Movies sharing a file name go in separate directories
+    shards += export_dataset.export_movie(
+        path, out, shard_frames=4, gray=True, name='second')
+    export_dataset.write_index(out, shards)
+    assert len({shard['path'] for shard in shards}) == len(shards)
+
+    loaded = list(export_dataset.load_dataset(out))
+    assert len(loaded) == len(shards)
+    # The first frame of a movie is consumed restoring its state
+    assert sum(shard['frames'] for shard in loaded) == 2 * 9
+    for shard in loaded:
+        frames = shard['frames']
+        assert isinstance(shard['obs'], np.memmap)
+        assert shard['obs'].shape[0] == frames
+        assert shard['obs'].shape[1:] == env.em.get_screen(gray=True).shape
+        assert shard['actions'].shape[0] == frames
+        assert shard['rewards'].shape[0] == frames
+        assert shard['done'].shape == (frames, )
+        assert shard['info'].shape == (frames, )
@@ -83,3 +83,92 @@ def test_custom_path_relative(custom_cleanup):
         retro.data.Integrations.STABLE.paths[0])
     assert retro.data.get_file_path('Airstriker-Genesis', 'rom.md', inttype=retro.data.Integrations.CUSTOM_ONLY) == \
      retro.data.get_file_path('Airstriker-Genesis', 'rom.md', inttype=retro.data.Integrations.STABLE)
+
+
+def test_file_index(custom_cleanup, tmpdir, monkeypatch):
+    import time
+    game_dir = tmpdir.mkdir('Game')
+    game_dir.join('rom.sha').write('')
+    game_dir.join('Level1.state').write('')
+    # Backdate the directories so their listings are kept in the index
+    old = time.time() - 60
+    os.utime(str(tmpdir), (old, old))
+    os.utime(str(game_dir), (old, old))
+
+    retro.data.Integrations.add_custom_path(str(tmpdir))
+    inttype = retro.data.Integrations.CUSTOM_ONLY
+    assert retro.data.list_games(inttype) == ['Game']
+    assert retro.data.list_states('Game', inttype) == ['Level1']
+    assert retro.data.get_file_path('Game', 'rom.sha', inttype) == \
+        str(game_dir.join('rom.sha'))
+    assert not retro.data.get_file_path('Game', 'data.json', inttype)
+
+    game_dir.join('data.json').write('{}')
+    assert retro.data.get_file_path('Game', 'data.json', inttype) == \
+        str(game_dir.join('data.json'))
+    other_dir = tmpdir.mkdir('Other')
+    other_dir.join('rom.sha').write('')
+    assert retro.data.list_games(inttype) == ['Game', 'Other']
+
+    # A warm lookup only checks the root
+    os.utime(str(tmpdir), (old, old))
+    os.utime(str(other_dir), (old, old))
+    assert retro.data.list_games(inttype) == ['Game', 'Other']
+    stat = os.stat
+    stats = []
+
+    def counting_stat(path, *args, **kwargs):
+        stats.append(path)
+        return stat(path, *args, **kwargs)
+
+    monkeypatch.setattr(os, 'stat', counting_stat)
+    assert retro.data.list_games(inttype) == ['Game', 'Other']
+    assert len(stats) == 1
+    monkeypatch.setattr(os, 'stat', stat)
+
+    # Games coming and going inside an unchanged root are noticed once the
+    # cached result is older than the settle time
+    other_dir.join('rom.sha').remove()
+    os.utime(str(other_dir), (old - 60, old - 60))
+    monkeypatch.setattr(retro.data, '_DIR_INDEX_SETTLE_TIME', 0)
+    assert retro.data.list_games(inttype) == ['Game']
+
+
+def test_load_state_cache(custom_cleanup, tmpdir):
+    import gzip
+    game_dir = tmpdir.mkdir('Game')
+    state_path = str(game_dir.join('Level1.state'))
+    with gzip.open(state_path, 'wb') as f:
+        f.write(b'state1')
+
+    retro.data.Integrations.add_custom_path(str(tmpdir))
+    inttype = retro.data.Integrations.CUSTOM_ONLY
+    state = retro.data.load_state('Game', 'Level1', inttype)
+    assert state == b'state1'
+    assert retro.data.load_state('Game', 'Level1.state', inttype) is state
+
+    with gzip.open(state_path, 'wb') as f:
+        f.write(b'state2')
+    stat = os.stat(state_path)
+    os.utime(state_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    assert retro.data.load_state('Game', 'Level1', inttype) == b'state2'
+
+    cache_dir = str(tmpdir.join('cache'))
+    retro.data.set_state_cache(max_bytes=0, directory=cache_dir)
+    try:
+        assert retro.data.load_state('Game', 'Level1', inttype) == b'state2'
+        assert len(os.listdir(cache_dir)) == 1
+        assert retro.data.load_state('Game', 'Level1', inttype) == b'state2'
+
+        # Changing the state replaces its copy on disk
+        with gzip.open(state_path, 'wb') as f:
+            f.write(b'state3')
+        os.utime(
+            state_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2000000000))
+        assert retro.data.load_state('Game', 'Level1', inttype) == b'state3'
+        assert len(os.listdir(cache_dir)) == 1
+    finally:
+        retro.data.set_state_cache(max_bytes=256 * 1024 * 1024, directory='')
+
+    with pytest.raises(FileNotFoundError):
+        retro.data.load_state('Game', 'Level2', inttype)
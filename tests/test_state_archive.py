@@ -0,0 +1,73 @@
+from retro.state_archive import StateArchive
+import os
+import pytest
+
+
+def make_states(count, size=4096):
+    states = []
+    state = bytearray(os.urandom(size))
+    for i in range(count):
+        state[i % size] = (state[i % size] + 1) % 256
+        states.append(bytes(state))
+    return states
+
+
+def test_state_archive_roundtrip(tmpdir):
+    path = str(tmpdir.join('states.rsa'))
+    states = make_states(20)
+    with StateArchive(path, 'w', keyframe_interval=8) as archive:
+        for i, state in enumerate(states):
+            assert archive.append(state) == i
+
+    assert os.path.getsize(path) < len(states[0]) * 4
+    with StateArchive(path) as archive:
+        assert len(archive) == len(states)
+        assert archive.keyframe_interval == 8
+        for i in (19, 0, 7, 8, 9, 3, -1):
+            assert archive[i] == states[i]
+        with pytest.raises(IndexError):
+            archive[20]
+
+
+def test_state_archive_size_change(tmpdir):
+    path = str(tmpdir.join('states.rsa'))
+    states = make_states(3) + make_states(3, 1024)
+    with StateArchive(path, 'w') as archive:
+        for state in states:
+            archive.append(state)
+    with StateArchive(path) as archive:
+        assert [archive[i] for i in range(len(archive))] == states
+
+
+def test_state_archive_unclosed(tmpdir):
+    path = str(tmpdir.join('states.rsa'))
+    states = make_states(5)
+    archive = StateArchive(path, 'w', keyframe_interval=2)
+    for state in states:
+        archive.append(state)
+    archive._file.flush()
+
+    with StateArchive(path) as reader:
+        assert len(reader) == len(states)
+        assert reader[4] == states[4]
+    archive.close()
+
+
+def test_state_archive_append_mode(tmpdir):
+    path = str(tmpdir.join('states.rsa'))
+    states = make_states(12)
+    with StateArchive(path, 'a', keyframe_interval=4) as archive:
+        for state in states[:6]:
+            archive.append(state)
+    with StateArchive(path, 'a') as archive:
+        assert len(archive) == 6
+        assert archive.keyframe_interval == 4
+        for i, state in enumerate(states[6:], 6):
+            assert archive.append(state) == i
+
+    with StateArchive(path) as archive:
+        assert len(archive) == len(states)
+        # The reopened archive carries on from its last keyframe
+        keyframes = [int(keyframe) for keyframe in archive._keyframes]
+        assert keyframes == [0] * 4 + [4] * 4 + [8] * 4
+        assert [archive[i] for i in range(len(archive))] == states